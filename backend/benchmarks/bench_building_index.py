@@ -0,0 +1,109 @@
+"""
+Benchmark: building and infrastructure classification against damage_geojson.
+
+Vectorizes a synthetic burn-scar raster (as bench_vectorize does) into
+damage polygons with holes, scatters buildings over the AOI — half of them
+snapped to polygon vertices and edges, where ray casting is most fragile —
+and times _classify_buildings / _assess_infrastructure. The previous
+per-pair loop is timed on a sample, extrapolated to the full set, and its
+records compared with the indexed ones.
+
+    python benchmarks/bench_building_index.py [buildings,buildings,...] [raster size] [sample]
+        (default 10000,100000, 2048, 500)
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.satellite_pipeline import raster, vectorize
+from modules.damage_intelligence.service import _classify_buildings, _assess_infrastructure
+from modules.ground_truth.service import _point_in_geometry
+from bench_vectorize import BBOX, synth_delta
+
+def damage_geojson(size: int) -> dict:
+    delta, valid = synth_delta(size)
+    return vectorize.vectorize(raster.classify(delta, valid, "nbr"), BBOX, delta, "nbr")
+
+def synth_buildings(n: int, fc: dict, seed: int = 5) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(BBOX[0], BBOX[2], n)
+    lat = rng.uniform(BBOX[1], BBOX[3], n)
+    vertices = np.array([v for f in fc["features"] for ring in f["geometry"]["coordinates"] for v in ring])
+    snapped = rng.random(n) < 0.5
+    picks = vertices[rng.integers(0, len(vertices), snapped.sum())]
+    # Vertices, and points along the edge leaving them
+    along = rng.random(len(picks)) < 0.5
+    lon[snapped] = picks[:, 0] + np.where(along, rng.uniform(0, 1e-4, len(picks)), 0)
+    lat[snapped] = picks[:, 1]
+    return [{"osm_id": f"b{i}", "lat": float(y), "lon": float(x)} for i, (x, y) in enumerate(zip(lon, lat))]
+
+def classify_reference(buildings, damage_geojson):
+    """The per-pair loop the index replaced."""
+    records = []
+    features = damage_geojson.get("features", []) if damage_geojson else []
+    for b in buildings:
+        best_class = 0
+        confidence = 0.7
+        for feature in features:
+            geom = feature.get("geometry", {})
+            props = feature.get("properties", {})
+            if geom.get("type") == "Polygon" and _point_in_geometry(b["lon"], b["lat"], geom):
+                cls = min(props.get("severity_class", 0) // 2, 3)
+                if cls > best_class:
+                    best_class = cls
+                    change = props.get("dnbr_mean", props.get("dndwi_mean", 0))
+                    confidence = 0.75 + change * 0.1
+        records.append((best_class, round(min(confidence, 1.0), 3)))
+    return records
+
+def assess_reference(infra, damage_geojson):
+    records = []
+    for facility in infra:
+        risk, overlap = "low", 0
+        for feature in damage_geojson["features"]:
+            geom = feature["geometry"]
+            if geom["type"] == "Polygon" and _point_in_geometry(facility["lon"], facility["lat"], geom):
+                severity = feature["properties"]["severity_class"]
+                risk = "critical" if severity >= 4 else "high" if severity >= 3 else "moderate" if severity >= 2 else "low"
+                overlap = 100
+                break
+        records.append((risk, overlap))
+    return records
+
+def run(n: int, fc: dict, sample: int):
+    buildings = synth_buildings(n, fc)
+
+    start = time.perf_counter()
+    records = _classify_buildings(buildings, fc, "a", "e")
+    indexed = time.perf_counter() - start
+
+    infra = [{**b, "facility_type": "hospital"} for b in buildings[:sample]]
+    infra_records = _assess_infrastructure(infra, fc, "a", "e")
+
+    subset = buildings[:sample]
+    start = time.perf_counter()
+    reference = classify_reference(subset, fc)
+    per_building = (time.perf_counter() - start) / len(subset)
+
+    got = [(r["damage_class"], r["confidence"]) for r in records[:sample]]
+    mismatches = sum(a != b for a, b in zip(got, reference))
+    infra_mismatches = sum((r["risk_level"], r["overlap_pct"]) != expected
+                           for r, expected in zip(infra_records, assess_reference(infra, fc)))
+    damaged = sum(r["damage_class"] > 0 for r in records)
+    print(f"{n:>7} buildings  indexed {indexed * 1000:7.0f} ms  "
+          f"loop ~{per_building * n:7.1f} s (from {sample})  speedup ~{per_building * n / indexed:5.0f}x  "
+          f"damaged {damaged}  mismatches {mismatches}/{sample}, infrastructure {infra_mismatches}/{sample}")
+
+if __name__ == "__main__":
+    counts = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000]
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    sample = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    fc = damage_geojson(size)
+    vertices = sum(len(ring) for f in fc["features"] for ring in f["geometry"]["coordinates"])
+    holes = sum(len(f["geometry"]["coordinates"]) - 1 for f in fc["features"])
+    print(f"damage_geojson: {len(fc['features'])} polygons, {holes} holes, {vertices} vertices")
+    for n in counts:
+        run(n, fc, sample)
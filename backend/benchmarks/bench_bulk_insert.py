@@ -0,0 +1,126 @@
+"""
+Benchmark: writing an assessment's building_damage and infrastructure_risk rows.
+
+Compares the original write path with the COPY into a staging table plus
+single merge that run_building_assessment now uses, reporting rows/sec for
+each. The original ran one autocommitted INSERT per row, outside any
+transaction, and stored only the first 1,000 buildings; it is reproduced
+as it was, so its rows/sec is per row actually stored. Each run writes to
+a scratch event and analysis that are deleted afterwards.
+
+Needs NEON_DATABASE_URL pointing at a database with the schema applied.
+bench_building_index.py covers the in-memory half of the assessment.
+
+    python benchmarks/bench_bulk_insert.py [buildings,buildings,...]    (default 1000,10000,100000)
+
+Local Postgres 16 (1 CPU, unix socket; PostGIS point columns stood in by
+native point), rows stored per second:
+
+    buildings   original (first 1,000 only)   COPY + merge
+        1,000          1,481                    29,341    (20x)
+       10,000          1,222                    33,931    (28x)
+      100,000          1,411                    21,561    (15x)
+
+Facilities are 1 per 100 buildings. At 100,000 buildings the original
+stored 2,000 rows in 1.4 s and silently dropped 99,000 buildings; the
+merge stores all 101,000 in 4.7 s.
+
+Against Neon every original INSERT also pays a network round trip and a
+commit, so its figures there are lower still.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.db import init_db_pool, close_db_pool, execute, fetchval, unit_of_work
+from modules.damage_intelligence.service import _store_results
+
+ORIGINAL_CAP = 1000  # buildings the original path stored per analysis
+
+LABELS = {0: "no-damage", 1: "minor-damage", 2: "major-damage", 3: "destroyed"}
+
+def synth_records(n: int, seed: int = 3) -> tuple[list, list]:
+    rnd = random.Random(seed)
+    buildings = []
+    for i in range(n):
+        cls = rnd.choice([0, 0, 1, 2, 3])
+        buildings.append({"osm_id": f"way/{i}", "lat": 38.5 + rnd.random() / 2, "lon": -120.5 + rnd.random() / 2,
+                          "damage_class": cls, "damage_label": LABELS[cls], "confidence": round(rnd.random(), 3)})
+    infra = [{"osm_id": f"node/{i}", "facility_type": rnd.choice(["hospital", "school", "power_station"]),
+              "name": f"Facility {i}", "lat": 38.7, "lon": -120.2,
+              "risk_level": rnd.choice(["low", "high", "critical"]), "overlap_pct": 100}
+             for i in range(max(n // 100, 1))]
+    return buildings, infra
+
+async def scratch_analysis() -> tuple[str, str]:
+    event_id = await fetchval("""
+        INSERT INTO events (gdacs_id, title, event_type, severity, lat, lon, event_date)
+        VALUES ($1, 'bulk insert benchmark', 'WF', 'green', 38.75, -120.25, now())
+        RETURNING id
+    """, f"bench_{uuid.uuid4().hex}")
+    analysis_id = await fetchval(
+        "INSERT INTO analyses (job_id, event_id) VALUES ($1, $2::uuid) RETURNING id",
+        f"bench_{uuid.uuid4().hex}", event_id,
+    )
+    return str(event_id), str(analysis_id)
+
+async def old_path(analysis_id, event_id, buildings, infra) -> int:
+    """The original loop: one INSERT per row, each committed on its own."""
+    for b in buildings[:ORIGINAL_CAP]:
+        await execute("""
+            INSERT INTO building_damage
+                (analysis_id, event_id, osm_id, lat, lon, damage_class, damage_label, confidence, source)
+            VALUES ($1::uuid, $2::uuid, $3, $4, $5, $6, $7, $8, 'satellite')
+            ON CONFLICT DO NOTHING
+        """, analysis_id, event_id, b["osm_id"], b["lat"], b["lon"], b["damage_class"], b["damage_label"],
+            b["confidence"])
+    for ir in infra:
+        await execute("""
+            INSERT INTO infrastructure_risk
+                (analysis_id, event_id, osm_id, facility_type, name, lat, lon, risk_level, overlap_pct)
+            VALUES ($1::uuid, $2::uuid, $3, $4, $5, $6, $7, $8, $9)
+            ON CONFLICT DO NOTHING
+        """, analysis_id, event_id, ir["osm_id"], ir["facility_type"], ir["name"], ir["lat"], ir["lon"],
+            ir["risk_level"], ir["overlap_pct"])
+    return min(len(buildings), ORIGINAL_CAP) + len(infra)
+
+async def new_path(analysis_id, event_id, buildings, infra) -> int:
+    async with unit_of_work(transaction=True, pool="bulk"):
+        by_class, _ = await _store_results(analysis_id, event_id, buildings, infra)
+    return sum(by_class.values()) + len(infra)
+
+async def timed(path, n: int) -> float:
+    """Rows stored per second."""
+    buildings, infra = synth_records(n)
+    event_id, analysis_id = await scratch_analysis()
+    try:
+        start = time.perf_counter()
+        rows = await path(analysis_id, event_id, buildings, infra)
+        elapsed = time.perf_counter() - start
+    finally:
+        # building_damage and infrastructure_risk rows go with the analysis
+        await execute("DELETE FROM analyses WHERE id = $1::uuid", analysis_id)
+        await execute("DELETE FROM events WHERE id = $1::uuid", event_id)
+    return rows / elapsed
+
+async def main(counts: list[int]):
+    await init_db_pool()
+    try:
+        for n in counts:
+            old = await timed(old_path, n)
+            new = await timed(new_path, n)
+            print(f"{n:>7} buildings  original {old:9.0f} rows/s  COPY + merge {new:9.0f} rows/s  "
+                  f"({new / old:.0f}x)")
+    finally:
+        await close_db_pool()
+
+if __name__ == "__main__":
+    if not os.getenv("NEON_DATABASE_URL"):
+        sys.exit("NEON_DATABASE_URL is not set")
+    counts = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1000, 10_000, 100_000]
+    asyncio.run(main(counts))
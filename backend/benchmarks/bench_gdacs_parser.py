@@ -0,0 +1,55 @@
+"""
+Benchmark: streaming GDACS parser vs feedparser.
+
+Builds a large feed by repeating the items of fixtures/gdacs_rss_sample.xml
+and reports parse time and peak traced memory for both parsers.
+
+    python benchmarks/bench_gdacs_parser.py [items]
+"""
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feedparser
+from modules.event_monitor.gdacs_stream import iter_gdacs_entries
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "fixtures", "gdacs_rss_sample.xml")
+CHUNK_SIZE = 64 * 1024
+
+def build_feed(n_items: int) -> bytes:
+    text = open(FIXTURE, encoding="utf-8").read()
+    items = re.findall(r"<item>.*?</item>", text, flags=re.S)
+    head, tail = text.split(items[0], 1)[0], text.rsplit(items[-1], 1)[1]
+    body = [items[i % len(items)] for i in range(n_items)]
+    return (head + "\n".join(body) + tail).encode("utf-8")
+
+def run_feedparser(data: bytes) -> int:
+    feed = feedparser.parse(data.decode("utf-8"))
+    return sum(1 for e in feed.entries if e.get("gdacs_alertlevel", "green").lower() in ("orange", "red"))
+
+def run_stream(data: bytes) -> int:
+    chunks = (data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE))
+    return sum(1 for _ in iter_gdacs_entries(chunks))
+
+def measure(fn, data: bytes) -> tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    matched = fn(data)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return matched, elapsed, peak
+
+if __name__ == "__main__":
+    n_items = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    data = build_feed(n_items)
+    print(f"GDACS feed: {n_items} items, {len(data) / 1e6:.1f} MB")
+    print(f"{'parser':<12}{'matched':>10}{'time (s)':>12}{'peak MB':>12}")
+    for name, fn in (("feedparser", run_feedparser), ("stream", run_stream)):
+        matched, elapsed, peak = measure(fn, data)
+        print(f"{name:<12}{matched:>10}{elapsed:>12.3f}{peak / 1e6:>12.1f}")
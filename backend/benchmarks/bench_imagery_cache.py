@@ -0,0 +1,65 @@
+"""
+Benchmark: imagery cache write, lookup and memory-mapped read.
+
+Stores synthetic FLOAT32 [index, valid] TIFFs of each tile size in a
+temporary cache directory, then times a miss (decode and atomic .npy
+write), a hit (lookup plus mapping) and a full read of the mapped array,
+and an eviction pass over the populated cache.
+
+    python benchmarks/bench_imagery_cache.py [size,size,...] [entries]    (default 512,2048, 20)
+"""
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("IMAGERY_CACHE_DIR", tempfile.mkdtemp(prefix="bench-imagery-"))
+
+from bench_raster import encode_tiff
+from modules.satellite_pipeline import imagery_cache
+
+def run(size: int, entries: int):
+    rng = np.random.default_rng(size)
+    pixels = np.empty((size, size, 2), dtype=np.float32)
+    pixels[..., 0] = rng.uniform(-0.2, 0.8, (size, size))
+    pixels[..., 1] = 1
+    tiff = bytes(encode_tiff(pixels))
+    keys = [imagery_cache.cache_key([i, 0, i + 1, 1], ("a", "b"), "sentinel-2-l2a", "script", size, size)
+            for i in range(entries)]
+
+    start = time.perf_counter()
+    for key in keys:
+        imagery_cache.put(key, tiff, {})
+    write = (time.perf_counter() - start) / entries
+
+    start = time.perf_counter()
+    paths = [imagery_cache.get(key) for key in keys]
+    arrays = [imagery_cache.open_array(path) for path in paths]
+    hit = (time.perf_counter() - start) / entries
+
+    start = time.perf_counter()
+    checksum = sum(float(a[..., 0].sum()) for a in arrays)
+    read = (time.perf_counter() - start) / entries
+    del arrays
+
+    usage = imagery_cache.usage()
+    start = time.perf_counter()
+    freed = imagery_cache.evict(usage["bytes"] // 2)
+    evict = time.perf_counter() - start
+
+    mb = len(tiff) / 1e6
+    print(f"{size:>5}²  {mb:6.1f} MB/tile  miss {write * 1000:7.1f} ms ({mb / write:5.0f} MB/s)  "
+          f"hit {hit * 1000:6.2f} ms  mapped read {read * 1000:6.1f} ms  "
+          f"evict {freed / 1e6:.0f} MB of {usage['bytes'] / 1e6:.0f} MB in {evict * 1000:.1f} ms  [{checksum:.0f}]")
+    imagery_cache.evict(0)
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [512, 2048]
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"cache dir {imagery_cache.CACHE_DIR}")
+    for size in sizes:
+        run(size, count)
@@ -0,0 +1,91 @@
+"""
+Benchmark: jsonb codec throughput on a large `analyses` row.
+
+Compares the old path (json.dumps to a str passed as $n::jsonb, asyncpg text
+decode + json.loads on read) with the codecs shared/db.py registers on every
+pooled connection: binary jsonb with orjson, and the stdlib fallback used
+when orjson is not installed. Runs without a database — it times exactly the
+work done in Python on each side of the wire.
+
+    python benchmarks/bench_jsonb_codec.py [polygons]
+"""
+import os
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import db
+
+ROUNDS = 5
+
+def build_row(n_polygons: int) -> dict:
+    """damage_geojson + stats + recovery_history shaped like the pipeline output."""
+    rnd = random.Random(42)
+    features = []
+    for i in range(n_polygons):
+        lon, lat = rnd.uniform(-180, 180), rnd.uniform(-60, 60)
+        ring = [[round(lon + 0.01 * rnd.random(), 6), round(lat + 0.01 * rnd.random(), 6)] for _ in range(40)]
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {
+                "severity_class": rnd.choice([0, 2, 3, 4, 5]),
+                "severity_label": "moderate_high",
+                "color": "#FF4500",
+                "area_km2": round(rnd.uniform(0.01, 5), 3),
+                "dnbr_mean": round(rnd.uniform(0.1, 0.9), 3),
+            },
+        })
+    return {
+        "damage_geojson": {"type": "FeatureCollection", "features": features},
+        "stats": {"area_km2": 142.5, "high_severity_pct": 28.5, "mean_dnbr": 0.47, "confidence": 0.87},
+        "recovery_history": [{"date": f"2026-01-{d:02d}", "recovery_score": d * 3.1} for d in range(1, 29)],
+    }
+
+def best_of(fn) -> float:
+    times = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def old_encode(row):
+    return [json.dumps(v).encode() for v in row.values()]
+
+def old_decode(wire):
+    # asyncpg's default jsonb codec hands back str, which callers then json.loads
+    return [json.loads(b.decode()) for b in wire]
+
+def codec_encode(row):
+    return [db._encode_jsonb(v) for v in row.values()]
+
+def codec_decode(wire):
+    return [db._decode_jsonb(b) for b in wire]
+
+def report(label: str, encode, decode, row: dict):
+    wire = encode(row)
+    size_mb = sum(len(b) for b in wire) / 1e6
+    assert decode(wire)[0] == row["damage_geojson"]
+    enc, dec = best_of(lambda: encode(row)), best_of(lambda: decode(wire))
+    print(f"{label:<24} encode {enc * 1000:7.1f} ms ({size_mb / enc:6.1f} MB/s)   "
+          f"decode {dec * 1000:7.1f} ms ({size_mb / dec:6.1f} MB/s)")
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    row = build_row(n)
+    size_mb = len(json.dumps(row)) / 1e6
+    print(f"analyses row: {n} damage polygons, {size_mb:.1f} MB of JSON, best of {ROUNDS}")
+
+    report("json.dumps + ::jsonb", old_encode, old_decode, row)
+    if db.orjson:
+        report("codec (orjson, binary)", codec_encode, codec_decode, row)
+        db.orjson, orjson = None, db.orjson
+        report("codec (stdlib fallback)", codec_encode, codec_decode, row)
+        db.orjson = orjson
+    else:
+        report("codec (stdlib fallback)", codec_encode, codec_decode, row)
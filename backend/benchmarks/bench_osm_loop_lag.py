@@ -0,0 +1,105 @@
+"""
+Benchmark: event loop responsiveness during OSM acquisition.
+
+Simulates the old acquisition — six osmnx queries (buildings, then five
+facility tag sets) called straight from the coroutine — and the new one:
+a single combined query on the OSM thread pool. Each simulated query
+waits on the network (sleep) and then parses the response (pure-Python
+work holding the GIL). The loop lag monitor runs throughout, as does a
+probe standing in for an API route, counting the requests it got to serve.
+
+With geopandas and shapely installed, it also times centroid extraction
+with iterrows against osm.split_features on a synthetic GeoDataFrame.
+
+    python benchmarks/bench_osm_loop_lag.py [network_s] [parse_s] [features]    (default 1.0, 0.5, 50000)
+"""
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.loop_monitor import LoopMonitor
+from modules.damage_intelligence import osm
+
+PROBE_INTERVAL_S = 0.05
+
+def fake_query(network_s: float, parse_s: float):
+    time.sleep(network_s)
+    deadline = time.perf_counter() + parse_s
+    rows = []
+    while time.perf_counter() < deadline:
+        rows.append({"osm_id": len(rows), "lat": 0.0, "lon": 0.0})
+    return rows
+
+async def old_acquisition(network_s: float, parse_s: float):
+    for _ in range(1 + len(osm.FACILITY_TAGS)):
+        fake_query(network_s, parse_s)
+
+async def new_acquisition(network_s: float, parse_s: float):
+    osm.download = lambda bbox: fake_query(network_s, parse_s)
+    await osm.fetch_features([0, 0, 1, 1])
+
+async def probe(served: list, stop: asyncio.Event):
+    """An API route's view: a trivial request every PROBE_INTERVAL_S, if the loop lets it run."""
+    while not stop.is_set():
+        served.append(time.perf_counter())
+        await asyncio.sleep(PROBE_INTERVAL_S)
+
+async def measure(name: str, acquisition, network_s: float, parse_s: float):
+    monitor = LoopMonitor(interval=0.01)
+    monitor.start()
+    served, stop = [], asyncio.Event()
+    prober = asyncio.create_task(probe(served, stop))
+    await asyncio.sleep(0.1)
+    start = time.perf_counter()
+    await acquisition(network_s, parse_s)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+    await monitor.stop()
+    lag = monitor.snapshot()
+    print(f"{name:<26} acquisition {elapsed:5.1f} s  loop lag p50 {lag['p50_ms']:7.1f} ms  "
+          f"p99 {lag['p99_ms']:7.1f} ms  max {lag['max_ms']:7.1f} ms  "
+          f"probe served {len(served)} of ~{int(elapsed / PROBE_INTERVAL_S) + 2} requests")
+
+def centroid_benchmark(n: int):
+    try:
+        import numpy as np
+        import geopandas as gpd
+        import shapely
+    except ImportError:
+        print("centroids: geopandas/shapely not installed, skipped")
+        return
+    import pandas as pd
+    rng = np.random.default_rng(1)
+    x, y = rng.uniform(-120.5, -120.0, n), rng.uniform(38.5, 39.0, n)
+    geometry = shapely.buffer(shapely.points(x, y), 1e-4, quad_segs=2)
+    index = pd.MultiIndex.from_arrays([["way"] * n, np.arange(n)], names=["element_type", "osmid"])
+    features = gpd.GeoDataFrame({"building": "yes", "name": None}, geometry=geometry, index=index, crs=4326)
+
+    start = time.perf_counter()
+    old = []
+    for _, row in features.iterrows():
+        centroid = row.geometry.centroid
+        old.append({"osm_id": str(row.name), "lat": centroid.y, "lon": centroid.x})
+    iterrows_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new, _ = osm.split_features(features)
+    vectorized_s = time.perf_counter() - start
+    print(f"centroids of {n} buildings: iterrows {iterrows_s * 1000:.0f} ms, vectorized {vectorized_s * 1000:.0f} ms "
+          f"({iterrows_s / vectorized_s:.0f}x), identical {old == new}")
+
+async def main(network_s: float, parse_s: float, n: int):
+    await measure("inline, 6 queries", old_acquisition, network_s, parse_s)
+    await measure("executor, 1 combined query", new_acquisition, network_s, parse_s)
+    osm.shutdown_osm_executor()
+    centroid_benchmark(n)
+
+if __name__ == "__main__":
+    network_s = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    parse_s = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    n = int(sys.argv[3]) if len(sys.argv) > 3 else 50_000
+    asyncio.run(main(network_s, parse_s, n))
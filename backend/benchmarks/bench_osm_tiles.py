@@ -0,0 +1,93 @@
+"""
+Benchmark: OSM tile cache reuse across nearby and re-centred events.
+
+Runs a sequence of event lookups through OsmTileCache — a first event, a
+second one 2 km east, the first re-centred 5 km north, then the first again
+— against a synthetic OSM (a building every `spacing` degrees, a facility
+every 50th) and an in-memory stand-in for the osm_tiles table. For each it
+reports tiles read from cache, tiles fetched, Overpass queries and the
+features returned; the old per-bbox osm_cache missed on every one of these
+but an exact repeat, each time fetching the full 0.4° box.
+
+Also reports the stored size per tile against the same features as the
+plain JSON the old cache held.
+
+    python benchmarks/bench_osm_tiles.py [spacing_deg]    (default 0.002)
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.damage_intelligence import osm, osm_tiles as tiles
+from modules.damage_intelligence.service import _osm_bbox
+
+EVENTS = [
+    ("first event", 38.70, -120.30),
+    ("2 km east", 38.70, -120.277),
+    ("re-centred 5 km north", 38.745, -120.30),
+    ("first event again", 38.70, -120.30),
+]
+
+def synthetic_osm(spacing: float):
+    def download(bbox):
+        west, south, east, north = bbox
+        i0, i1 = math.ceil(round(west / spacing, 6)), math.floor(round(east / spacing, 6))
+        j0, j1 = math.ceil(round(south / spacing, 6)), math.floor(round(north / spacing, 6))
+        buildings, facilities = [], []
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                point = {"osm_id": f"way/{i}_{j}", "lat": j * spacing, "lon": i * spacing}
+                buildings.append(point)
+                if (i + j) % 50 == 0:
+                    facilities.append({**point, "osm_id": f"node/{i}_{j}", "facility_type": "school",
+                                       "name": f"School {i}_{j}"})
+        return buildings, facilities
+    return download
+
+class MemoryTiles:
+    """Just enough of the osm_tiles table for OsmTileCache.features."""
+
+    def __init__(self):
+        self.rows: dict[str, bytes] = {}
+
+    async def fetch(self, sql, keys):
+        return [{"quadkey": k, "payload": self.rows[k]} for k in keys if k in self.rows]
+
+    async def execute(self, sql, keys, zoom, payloads, *counts):
+        self.rows.update(zip(keys, payloads))
+
+async def main(spacing: float):
+    table = MemoryTiles()
+    tiles.fetch, tiles.execute = table.fetch, table.execute
+    osm.download = synthetic_osm(spacing)
+    cache = tiles.OsmTileCache()
+
+    for name, lat, lon in EVENTS:
+        before = dict(cache._counters)
+        start = time.perf_counter()
+        buildings, facilities, n = await cache.features(_osm_bbox(lat, lon))
+        elapsed = time.perf_counter() - start
+        delta = {k: cache._counters[k] - before[k] for k in before}
+        expected = osm.download(_osm_bbox(lat, lon))
+        same = sorted(b["osm_id"] for b in buildings) == sorted(b["osm_id"] for b in expected[0])
+        print(f"{name:<22} {n:4d} tiles: {delta['tiles_hit']:4d} cached {delta['tiles_missed']:4d} fetched "
+              f"in {delta['queries']:2d} queries  {len(buildings):6d} buildings {len(facilities):4d} facilities  "
+              f"{elapsed * 1000:6.0f} ms  matches direct query {same}")
+    stats = cache._counters
+    print(f"overall tile hit ratio {stats['tiles_hit'] / (stats['tiles_hit'] + stats['tiles_missed']):.2f}")
+
+    stored = [tiles.decode_tile(p) for p in table.rows.values()]
+    as_json = sum(len(json.dumps({"buildings": b, "infrastructure": f})) for b, f in stored)
+    packed = sum(len(p) for p in table.rows.values())
+    print(f"{len(table.rows)} tiles stored: {packed / len(table.rows) / 1024:.1f} KiB per tile "
+          f"vs {as_json / len(table.rows) / 1024:.1f} KiB as JSON ({as_json / packed:.1f}x smaller)")
+    osm.shutdown_osm_executor()
+
+if __name__ == "__main__":
+    spacing = float(sys.argv[1]) if len(sys.argv) > 1 else 0.002
+    asyncio.run(main(spacing))
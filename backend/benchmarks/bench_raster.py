@@ -0,0 +1,104 @@
+"""
+Benchmark: satellite raster engine (TIFF decode, dNBR, classification, stats).
+
+Synthesizes pre/post FLOAT32 [index, valid] TIFFs with burn scars and cloud
+patches at each size and reports per-stage time and peak traced memory.
+
+    python benchmarks/bench_raster.py [size,size,...]    (default 512,2048,8192)
+"""
+import os
+import sys
+import time
+import struct
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.satellite_pipeline import raster
+
+BBOX = [-120.5, 38.5, -120.0, 39.0]
+
+def encode_tiff(pixels: np.ndarray) -> bytearray:
+    """Single-strip, uncompressed, interleaved FLOAT32 TIFF like Sentinel Hub's output."""
+    height, width, bands = pixels.shape
+    entries = [
+        (256, 4, 1, width), (257, 4, 1, height), (258, 3, bands, 32), (259, 3, 1, 1),
+        (262, 3, 1, 1), (273, 4, 1, 0), (277, 3, 1, bands), (278, 4, 1, height),
+        (279, 4, 1, pixels.nbytes), (284, 3, 1, 1), (339, 3, bands, 3),
+    ]
+    data_offset = 8 + 2 + 12 * len(entries) + 4
+    data_offset += -data_offset % 16
+    out = bytearray(data_offset + pixels.nbytes)
+    struct.pack_into("<2sHI", out, 0, b"II", 42, 8)
+    struct.pack_into("<H", out, 8, len(entries))
+    for i, (tag, ftype, count, value) in enumerate(entries):
+        if tag == 273:
+            value = data_offset
+        if ftype == 3:
+            packed = struct.pack("<" + "H" * count, *([value] * count))
+        else:
+            packed = struct.pack("<I", value)
+        struct.pack_into("<HHI4s", out, 10 + i * 12, tag, ftype, count, packed.ljust(4, b"\0"))
+    np.frombuffer(out, dtype="<f4", offset=data_offset).reshape(pixels.shape)[:] = pixels
+    return out
+
+def synth_pair(size: int, seed: int = 7) -> tuple[bytearray, bytearray]:
+    """Smooth vegetation field; post has burn scars and both have clouds."""
+    rng = np.random.default_rng(seed)
+    coarse = max(size // 64, 4)
+    base = rng.uniform(0.3, 0.7, (coarse, coarse)).astype(np.float32)
+    scale = -(-size // coarse)
+    nbr_pre = np.kron(base, np.ones((scale, scale), dtype=np.float32))[:size, :size]
+
+    pre = np.empty((size, size, 2), dtype=np.float32)
+    pre[..., 0] = nbr_pre
+    pre[..., 1] = 1
+    post = pre.copy()
+    del nbr_pre
+
+    yy, xx = np.ogrid[:size, :size]
+    for _ in range(6):
+        cy, cx, r = rng.integers(0, size), rng.integers(0, size), rng.integers(size // 20, size // 6)
+        d2 = (yy - cy) ** 2 + (xx - cx) ** 2
+        scar = d2 < r * r
+        post[..., 0][scar] -= rng.uniform(0.2, 0.8) * (1 - d2[scar] / (r * r)).astype(np.float32)
+    for _ in range(3):
+        cy, cx, r = rng.integers(0, size), rng.integers(0, size), rng.integers(size // 30, size // 10)
+        post[..., 1][(yy - cy) ** 2 + (xx - cx) ** 2 < r * r] = 0
+    return encode_tiff(pre), encode_tiff(post)
+
+def run(size: int):
+    pre_tiff, post_tiff = synth_pair(size)
+    tracemalloc.start()
+    timings = {}
+
+    start = time.perf_counter()
+    pre, post = raster.read_tiff(pre_tiff), raster.read_tiff(post_tiff)
+    timings["decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    delta, valid = raster.change_index(pre, post, "nbr")
+    timings["dnbr+mask"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classes = raster.classify(delta, valid, "nbr")
+    timings["classify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stats = raster.compute_stats(delta, valid, classes, BBOX, "nbr")
+    timings["stats"] = time.perf_counter() - start
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total = sum(timings.values())
+    stages = "  ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items())
+    print(f"{size:>5}²  input {2 * len(pre_tiff) / 1e6:7.1f} MB  total {total * 1000:7.0f} ms  "
+          f"peak {peak / 1e6:7.1f} MB  {stages}  "
+          f"[{size * size / total / 1e6:.0f} Mpx/s, affected {stats['area_km2']} km², "
+          f"valid {stats['valid_pixel_pct']}%]")
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [512, 2048, 8192]
+    for size in sizes:
+        run(size)
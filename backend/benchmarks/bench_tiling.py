@@ -0,0 +1,88 @@
+"""
+Benchmark: tiled, multi-process assessment of a large AOI.
+
+Plans a square AOI at 10 m, serves each tile's pre/post FLOAT32 TIFFs from
+an in-memory raster through a fetch callable with simulated latency, and
+runs tiling.assess_tiled with each worker count. Reports wall time,
+throughput and the output size, and checks the tiled result against
+whole-raster vectorization when the AOI is small enough to do both.
+
+Speed-up is bounded by the CPUs available; on a single-CPU machine the
+worker counts only show the overhead of the process pool.
+
+    python benchmarks/bench_tiling.py [side_px] [processes,processes,...] [fetch_latency_s]
+        (default 6144, 1,2,4, 0.2)
+"""
+import os
+import sys
+import time
+import asyncio
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_raster import encode_tiff
+from bench_vectorize import synth_delta
+from modules.satellite_pipeline import raster, tiling, vectorize
+
+WHOLE_CHECK_MAX = 4096
+
+def synth_aoi(side: int) -> tuple[dict, np.ndarray, np.ndarray]:
+    # ~side * 10 m a side around 38.5°N
+    lat_span = side * 10 / 1000 / raster.KM_PER_DEG_LAT
+    lon_span = side * 10 / 1000 / (raster.KM_PER_DEG_LON * np.cos(np.radians(38.5 + lat_span / 2)))
+    bbox = [-120.5, 38.5, -120.5 + lon_span, 38.5 + lat_span]
+    grid = tiling.plan(bbox, 10)
+    h, w = grid["height"], grid["width"]
+    delta, valid = synth_delta(max(h, w))
+    pre = np.empty((h, w, 2), dtype=np.float32)
+    pre[..., 0], pre[..., 1] = 0.6, 1
+    post = pre.copy()
+    post[..., 0] -= delta[:h, :w]
+    post[..., 1] = valid[:h, :w]
+    return grid, pre, post
+
+def make_fetch(grid: dict, pre: np.ndarray, post: np.ndarray, latency: float):
+    west, _, east, north = grid["bbox"]
+    dx = (east - west) / grid["width"]
+    dy = (north - grid["bbox"][1]) / grid["height"]
+
+    async def fetch(bbox: list, width: int, height: int, phase: str) -> bytes:
+        await asyncio.sleep(latency)
+        x0, y0 = round((bbox[0] - west) / dx), round((north - bbox[3]) / dy)
+        source = post if phase == "post" else pre
+        return bytes(encode_tiff(np.ascontiguousarray(source[y0:y0 + height, x0:x0 + width])))
+    return fetch
+
+def run(side: int, processes: list[int], latency: float):
+    grid, pre, post = synth_aoi(side)
+    fetch = make_fetch(grid, pre, post, latency)
+    pixels = grid["width"] * grid["height"]
+    print(f"AOI {grid['width']}x{grid['height']} px, {len(grid['tiles'])} tiles of {tiling.TILE_SIZE} "
+          f"(+{tiling.TILE_OVERLAP} overlap), ~{grid['units']:.0f} processing units, "
+          f"fetch latency {latency * 1000:.0f} ms, {os.cpu_count()} CPU(s)")
+
+    fc = None
+    for n in processes:
+        tiling.shutdown_process_pool()
+        tiling.PIPELINE_PROCESSES = n
+        start = time.perf_counter()
+        fc, stats = asyncio.run(tiling.assess_tiled(grid, fetch, "nbr"))
+        elapsed = time.perf_counter() - start
+        vertices = sum(len(ring) for f in fc["features"] for ring in f["geometry"]["coordinates"])
+        print(f"  {n} process(es)  {elapsed:6.2f} s  {pixels / elapsed / 1e6:5.1f} Mpx/s  "
+              f"{len(fc['features'])} polygons, {vertices} vertices, affected {stats['area_km2']} km²")
+    tiling.shutdown_process_pool()
+
+    if max(grid["width"], grid["height"]) <= WHOLE_CHECK_MAX:
+        delta, valid = raster.change_index(pre, post, "nbr")
+        classes = raster.classify(delta, valid, "nbr")
+        whole = vectorize.vectorize(classes, grid["bbox"], delta, "nbr")
+        print(f"  identical to whole-raster vectorization: {whole == fc}")
+
+if __name__ == "__main__":
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 6144
+    processes = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 2, 4]
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    run(side, processes, latency)
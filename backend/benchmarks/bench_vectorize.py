@@ -0,0 +1,83 @@
+"""
+Benchmark: raster-to-polygon vectorizer on realistic class rasters.
+
+Synthesizes a dNBR field — smooth terrain variation, burn scars with ragged
+edges, per-pixel sensor noise and cloud holes — classifies it with
+raster.classify and vectorizes it, reporting per-stage time, polygon and
+vertex counts and the size of the resulting damage_geojson.
+
+    python benchmarks/bench_vectorize.py [size,size,...] [max_vertices]    (default 4096, 50000)
+"""
+import os
+import sys
+import time
+import numpy as np
+from scipy import ndimage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.db import encode_json
+from modules.satellite_pipeline import raster, vectorize
+
+BBOX = [-120.5, 38.5, -120.0, 39.0]
+
+def synth_delta(size: int, seed: int = 11) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    coarse = ndimage.zoom(rng.normal(0, 0.08, (32, 32)).astype(np.float32), size / 32, order=1)
+    delta = coarse[:size, :size] + rng.normal(0, 0.04, (size, size)).astype(np.float32)
+    del coarse
+    yy, xx = np.ogrid[:size, :size]
+    for _ in range(8):
+        cy, cx, r = rng.integers(0, size), rng.integers(0, size), rng.integers(size // 20, size // 5)
+        d2 = ((yy - cy) ** 2 + (xx - cx) ** 2).astype(np.float32) / (r * r)
+        # Wobble the radius so scars are not circles
+        angle = np.arctan2(yy - cy, xx - cx).astype(np.float32)
+        d2 *= 1 + 0.3 * np.sin(3 * angle + rng.uniform(0, 6)) + 0.15 * np.sin(7 * angle)
+        inside = d2 < 1
+        delta[inside] += rng.uniform(0.5, 0.9) * (1 - d2[inside])
+    valid = np.ones((size, size), dtype=bool)
+    for _ in range(3):
+        cy, cx, r = rng.integers(0, size), rng.integers(0, size), rng.integers(size // 30, size // 10)
+        valid[(yy - cy) ** 2 + (xx - cx) ** 2 < r * r] = False
+    return delta, valid
+
+def run(size: int, max_vertices: int):
+    delta, valid = synth_delta(size)
+    classes = raster.classify(delta, valid, "nbr")
+    timings = {}
+
+    start = time.perf_counter()
+    sieved = vectorize.sieve(classes, vectorize.VECTOR_MIN_PIXELS)
+    timings["sieve"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels, _ = vectorize.label_regions(sieved)
+    timings["label"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rings = vectorize.link_rings(vectorize.trace_edges(np.pad(vectorize.emitted(sieved), 1), labels), size)
+    timings["trace"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simplified = vectorize.simplify_rings(rings, vectorize.VECTOR_TOLERANCE_PX, max_vertices)
+    timings["simplify"] = time.perf_counter() - start
+    del sieved, labels
+
+    start = time.perf_counter()
+    fc = vectorize.vectorize(classes, BBOX, delta, "nbr", max_vertices=max_vertices)
+    total = time.perf_counter() - start
+    size_kb = len(encode_json(fc)) / 1e3
+
+    stages = "  ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items())
+    raw = len(rings["x"])
+    vertices = sum(len(ring) for f in fc["features"] for ring in f["geometry"]["coordinates"])
+    print(f"{size:>5}²  vectorize {total * 1000:6.0f} ms  {stages}")
+    print(f"        {len(rings['region'])} rings, {raw} traced vertices -> {len(fc['features'])} polygons, "
+          f"{vertices} vertices (cap {max_vertices}, tolerance {simplified and simplified['tolerance']:.2f} px)  "
+          f"geojson {size_kb:.0f} KB")
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [4096]
+    cap = int(sys.argv[2]) if len(sys.argv) > 2 else vectorize.VECTOR_MAX_VERTICES
+    for size in sizes:
+        run(size, cap)
@@ -0,0 +1,106 @@
+"""
+Load test: WebSocket fan-out through ConnectionManager with simulated clients.
+
+Drives thousands of in-process fake sockets, a share of which are slow, and
+compares the old serial broadcast loop with the queued fan-out. Reports how
+long each broadcast call blocks the caller and the delivery lag seen by fast
+clients.
+
+    python benchmarks/load_ws_fanout.py [clients] [slow_fraction]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.ws import ConnectionManager
+
+BROADCASTS = 20
+INTERVAL_S = 0.05
+FAST_DELAY_S = (0.0, 0.002)
+SLOW_DELAY_S = 0.5
+
+class FakeWebSocket:
+    def __init__(self, slow: bool):
+        self.slow = slow
+        self.received = []
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, message: str):
+        await asyncio.sleep(SLOW_DELAY_S if self.slow else random.uniform(*FAST_DELAY_S))
+        self.received.append((time.perf_counter(), message))
+
+def _payload(i: int) -> dict:
+    return {"version": i, "features": [{"id": str(n), "properties": {"n": n}} for n in range(50)]}
+
+async def run_serial(sockets: list) -> dict:
+    """The previous broadcast: await every socket in turn."""
+    blocked = []
+    for i in range(BROADCASTS):
+        start = time.perf_counter()
+        message = json.dumps({"type": "events_update", "data": _payload(i)}, default=str)
+        for ws in sockets:
+            await ws.send_text(message)
+        blocked.append(time.perf_counter() - start)
+    return {"broadcast_block_ms": statistics.mean(blocked) * 1000}
+
+async def run_queued(sockets: list, policy: str) -> dict:
+    manager = ConnectionManager(queue_size=8, policy=policy)
+    for ws in sockets:
+        await manager.connect(ws)
+    blocked, sent_at = [], {}
+    for i in range(BROADCASTS):
+        start = time.perf_counter()
+        await manager.broadcast("events_update", _payload(i))
+        blocked.append(time.perf_counter() - start)
+        sent_at[i] = start
+        await asyncio.sleep(INTERVAL_S)
+    await asyncio.sleep(FAST_DELAY_S[1] * 10)
+    
+    lags = [
+        (received_at - sent_at[json.loads(m)["data"]["version"]]) * 1000
+        for ws in sockets if not ws.slow
+        for received_at, m in ws.received
+    ]
+    stats = manager.stats()
+    for ws in list(manager.clients):
+        manager.disconnect(ws)
+    lags.sort()
+    return {
+        "broadcast_block_ms": statistics.mean(blocked) * 1000,
+        "fast_lag_p50_ms": lags[len(lags) // 2] if lags else None,
+        "fast_lag_p99_ms": lags[int(len(lags) * 0.99)] if lags else None,
+        "dropped": stats["total_dropped"],
+        "slow_disconnects": stats["slow_disconnects"],
+    }
+
+async def main(n_clients: int, slow_fraction: float):
+    print(f"{n_clients} clients, {slow_fraction:.0%} slow ({SLOW_DELAY_S * 1000:.0f} ms/send), "
+          f"{BROADCASTS} broadcasts every {INTERVAL_S * 1000:.0f} ms")
+    for policy in ("keep_latest", "disconnect"):
+        sockets = [FakeWebSocket(random.random() < slow_fraction) for _ in range(n_clients)]
+        result = await run_queued(sockets, policy)
+        print(f"queued/{policy:<12}" + "  ".join(
+            f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+    
+    # Serial baseline on a slice: every slow socket adds its full delay to each broadcast
+    sample = [FakeWebSocket(random.random() < slow_fraction) for _ in range(min(n_clients, 200))]
+    result = await run_serial(sample[:50])
+    print(f"serial (50 clients)   broadcast_block_ms={result['broadcast_block_ms']:.1f}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    frac = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    asyncio.run(main(n, frac))
@@ -6,6 +6,48 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Tables, sequences and unique columns each module relies on
+REQUIRED_TABLES = {
+    "events": "Event Monitor",
+    "analyses": "Satellite Pipeline",
+    "satellite_passes": "Satellite Ops",
+    "building_damage": "Damage Intelligence",
+    "ground_reports": "Ground Truth",
+    "infrastructure_risk": "Infrastructure Risk",
+    "alert_log": "Alerts Engine",
+    "osm_cache": "OSM Cache",
+    "osm_tiles": "OSM Tile Cache",
+    "pipeline_jobs": "Pipeline Job Queue",
+    "damage_zones": "Damage Zones",
+    "broadcast_payloads": "Broadcast Bus",
+}
+REQUIRED_SEQUENCES = {"events_snapshot_version": "Event Feed Snapshots"}
+REQUIRED_UNIQUE = {("events", "eonet_id"): "Event Feed Aliases"}
+
+async def missing_objects(conn) -> list[str]:
+    """Names of the required tables, sequences and unique columns that do not exist."""
+    tables = {r["table_name"] for r in await conn.fetch("""
+        SELECT table_name FROM information_schema.tables
+        WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+    """)}
+    sequences = {r["sequence_name"] for r in await conn.fetch("""
+        SELECT sequence_name FROM information_schema.sequences WHERE sequence_schema = 'public'
+    """)}
+    missing = [t for t in REQUIRED_TABLES if t not in tables]
+    missing += [s for s in REQUIRED_SEQUENCES if s not in sequences]
+    for table, column in REQUIRED_UNIQUE:
+        unique = await conn.fetchval("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_index i
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                WHERE i.indrelid = to_regclass('public.' || $1) AND i.indisunique
+                  AND i.indnatts = 1 AND a.attname = $2
+            )
+        """, table, column)
+        if not unique:
+            missing.append(f"{table}.{column} unique")
+    return missing
+
 async def check_database():
     db_url = os.getenv("NEON_DATABASE_URL")
     if not db_url:
@@ -35,33 +77,16 @@ async def check_database():
         except Exception as e:
             print(f"  {name}: ERROR - {e}")
     
-    # Check required tables for each module
-    required = {
-        "events": "Event Monitor",
-        "analyses": "Satellite Pipeline",
-        "satellite_passes": "Satellite Ops",
-        "building_damage": "Damage Intelligence",
-        "ground_reports": "Ground Truth",
-        "infrastructure_risk": "Infrastructure Risk",
-        "alert_log": "Alerts Engine",
-        "osm_cache": "OSM Cache"
-    }
-    
-    existing = {t['table_name'] for t in tables}
-    
-    print("\n=== MODULE TABLE CHECK ===")
-    all_good = True
-    for table, module in required.items():
-        if table in existing:
-            print(f"  [OK] {table} -> {module}")
-        else:
-            print(f"  [MISSING] {table} -> {module}")
-            all_good = False
-    
-    if all_good:
-        print("\n[SUCCESS] All required tables exist!")
+    missing = await missing_objects(conn)
+    print("\n=== MODULE SCHEMA CHECK ===")
+    for name, module in [*REQUIRED_TABLES.items(), *REQUIRED_SEQUENCES.items(),
+                         *((f"{t}.{c} unique", m) for (t, c), m in REQUIRED_UNIQUE.items())]:
+        print(f"  [{'MISSING' if name in missing else 'OK'}] {name} -> {module}")
+
+    if not missing:
+        print("\n[SUCCESS] All required schema objects exist!")
     else:
-        print("\n[WARNING] Some tables are missing. Run db_setup.py again.")
+        print("\n[WARNING] Some schema objects are missing. Run db_setup.py again.")
     
     await conn.close()
 
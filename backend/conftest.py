@@ -0,0 +1,175 @@
+"""Pytest setup shared by the backend tests. Run the suite from backend/ with `python -m pytest`.
+
+Tests taking the `database` fixture run their SQL against a real PostGIS
+database named by TEST_DATABASE_URL and are skipped without one."""
+import os
+import uuid
+import struct
+import zlib
+import asyncio
+import numpy as np
+import pytest
+
+# Manual scripts rather than tests: they reach the live database on import
+collect_ignore = ["test_db.py", "test_gdacs.py"]
+
+class FakeDb:
+    """Stands in for the shared.db helpers a module imported. Every call is
+    recorded as (method, first two SQL words, args); answers come from
+    `answers[method]`, either a list consumed in order or a function of
+    (sql, *args). Methods without answers return None."""
+
+    METHODS = ("fetch", "fetchrow", "fetchval", "execute")
+
+    def __init__(self):
+        self.calls: list[tuple[str, str, tuple]] = []
+        self.answers: dict = {}
+
+    def statements(self, method: str | None = None) -> list[str]:
+        return [statement for m, statement, _ in self.calls if method in (None, m)]
+
+    async def _answer(self, method: str, sql: str, args: tuple):
+        self.calls.append((method, " ".join(sql.split()[:2]), args))
+        answer = self.answers.get(method)
+        if callable(answer):
+            return answer(sql, *args)
+        if isinstance(answer, list):
+            return answer.pop(0)
+        return answer
+
+    async def fetch(self, sql, *args):
+        return await self._answer("fetch", sql, args)
+
+    async def fetchrow(self, sql, *args):
+        return await self._answer("fetchrow", sql, args)
+
+    async def fetchval(self, sql, *args):
+        return await self._answer("fetchval", sql, args)
+
+    async def execute(self, sql, *args):
+        return await self._answer("execute", sql, args)
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """fake_db(module, ...) replaces the db helpers those modules imported
+    with one FakeDb and returns it."""
+    def install(*modules) -> FakeDb:
+        db = FakeDb()
+        for module in modules:
+            for name in FakeDb.METHODS:
+                if hasattr(module, name):
+                    monkeypatch.setattr(module, name, getattr(db, name))
+        return db
+    return install
+
+@pytest.fixture
+def broadcasts(monkeypatch) -> list:
+    """WebSocket broadcasts made during the test, as (payload_type, data, kwargs)."""
+    from shared.ws import manager
+    sent = []
+
+    async def broadcast(payload_type, data, **kwargs):
+        sent.append((payload_type, data, kwargs))
+
+    monkeypatch.setattr(manager, "broadcast", broadcast)
+    return sent
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "migrations", "001_schema.sql")
+_schema_applied = False
+
+def schema_sql() -> str:
+    with open(SCHEMA_PATH) as f:
+        return f.read()
+
+class Database:
+    """Runs a test's coroutine on TEST_DATABASE_URL through the app's own pools.
+    The schema is applied once per session; rows the tests write are cleared
+    before each run."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def run(self, scenario):
+        """Run scenario(), an async function, on a fresh event loop and pool set."""
+        async def main():
+            from shared.db import close_db_pool
+            try:
+                await self._prepare()
+                return await scenario()
+            finally:
+                await close_db_pool()
+        return asyncio.run(main())
+
+    async def _prepare(self):
+        global _schema_applied
+        if not _schema_applied:
+            await self.apply_schema()
+            _schema_applied = True
+        await self.execute("TRUNCATE events, osm_tiles, broadcast_payloads CASCADE")
+
+    async def apply_schema(self):
+        """Run migrations/001_schema.sql, as db_setup.py does."""
+        await self.execute(schema_sql())
+
+    async def execute(self, sql: str):
+        """Run SQL on a connection of its own, outside the app's pools."""
+        import asyncpg
+        conn = await asyncpg.connect(self.url)
+        try:
+            await conn.execute(sql)
+        finally:
+            await conn.close()
+
+    async def add_event(self, severity: str = "red", population: int = 0) -> str:
+        """Insert an active wildfire event; returns its id."""
+        from shared.db import fetchval
+        return await fetchval("""
+            INSERT INTO events (gdacs_id, title, event_type, severity, lat, lon, event_date, affected_population)
+            VALUES ($1, 'Test event', 'WF', $2::severity_enum, 38.5, -120.5, now(), $3)
+            RETURNING id
+        """, f"test_{uuid.uuid4().hex}", severity, population)
+
+@pytest.fixture
+def database(monkeypatch) -> Database:
+    """A real database for SQL tests; skips the test when TEST_DATABASE_URL is unset."""
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    monkeypatch.setenv("NEON_DATABASE_URL", url)
+    monkeypatch.delenv("NEON_READ_REPLICA_URL", raising=False)
+    return Database(url)
+
+def _encode_tiff(pixels: np.ndarray, rows_per_strip: int | None = None, deflate: bool = False,
+                 bits: int = 32) -> bytes:
+    """Little-endian interleaved FLOAT32 TIFF, optionally in deflated strips."""
+    height, width, bands = pixels.shape
+    rows_per_strip = rows_per_strip or height
+    strips = [pixels[y:y + rows_per_strip].astype("<f4").tobytes() for y in range(0, height, rows_per_strip)]
+    if deflate:
+        strips = [zlib.compress(s) for s in strips]
+    n = len(strips)
+    entries = [(256, 4, [width]), (257, 4, [height]), (258, 3, [bits] * bands), (259, 3, [8 if deflate else 1]),
+               (273, 4, None), (277, 3, [bands]), (278, 4, [rows_per_strip]), (279, 4, [len(s) for s in strips]),
+               (339, 3, [3] * bands)]
+    header = 8 + 2 + 12 * len(entries) + 4
+    extra = bytearray()
+    data_offset = header + 8 * n + 64
+    offsets = list(np.cumsum([data_offset] + [len(s) for s in strips[:-1]]))
+    out = bytearray(struct.pack("<2sHI", b"II", 42, 8) + struct.pack("<H", len(entries)))
+    for tag, ftype, values in entries:
+        values = offsets if values is None else values
+        fmt = "<" + ("H" if ftype == 3 else "I") * len(values)
+        packed = struct.pack(fmt, *[int(v) for v in values])
+        if len(packed) <= 4:
+            out += struct.pack("<HHI4s", tag, ftype, len(values), packed.ljust(4, b"\0"))
+        else:
+            out += struct.pack("<HHII", tag, ftype, len(values), header + len(extra))
+            extra += packed
+    out += b"\0\0\0\0" + extra
+    out += b"\0" * (data_offset - len(out))
+    return bytes(out + b"".join(strips))
+
+@pytest.fixture
+def encode_tiff():
+    """The encoder for test imagery: encode_tiff(pixels, rows_per_strip, deflate, bits) -> bytes."""
+    return _encode_tiff
@@ -12,7 +12,15 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 load_dotenv()
 
-from shared.db import init_db_pool, close_db_pool
+from shared.db import init_db_pool, close_db_pool, pools, use_pool
+from shared.db_metrics import SortField
+from shared.http import close_http_client
+from shared.jobs import job_queue
+from shared.loop_monitor import loop_monitor
+from modules.damage_intelligence.osm import shutdown_osm_executor
+from modules.damage_intelligence.osm_tiles import osm_tiles
+from modules.satellite_pipeline.tiling import shutdown_process_pool
+from modules.satellite_pipeline.sentinel_hub import hub
 from modules.event_monitor.router import router as event_router
 from modules.satellite_pipeline.router import router as satellite_router
 from modules.damage_intelligence.router import router as intelligence_router
@@ -26,16 +34,29 @@ from fastapi import WebSocket, WebSocketDisconnect
 from shared.ws import manager
 
 # Import polling jobs
-from modules.event_monitor.service import poll_gdacs, poll_usgs, poll_eonet, deactivate_old_events
+from modules.event_monitor.service import (
+    poll_gdacs, poll_usgs, poll_eonet, deactivate_old_events, rebuild_event_index
+)
 from modules.recovery_tracker.service import check_new_passes
+from modules.satellite_pipeline import stages
 from modules.alerts_engine.service import run_alert_watchers
 
 scheduler = AsyncIOScheduler()
 
+# The replica trails the primary by up to a few seconds. GETs may read that
+# stale state except job and analysis status, polled while a pipeline runs,
+# and reads by a client that wrote within READ_YOUR_WRITES_S.
+PRIMARY_READ_PREFIXES = ("/api/admin/", "/api/satellite/analyses/", "/api/satellite/analysis/")
+READ_YOUR_WRITES_S = int(os.getenv("READ_YOUR_WRITES_S", "10"))
+PRIMARY_COOKIE = "sentinel_read_primary"
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    loop_monitor.start()
     await init_db_pool()
+    await rebuild_event_index()
+    await manager.start_bus()
     
     # Schedule polling jobs
     scheduler.add_job(poll_gdacs, 'interval', minutes=10, id='gdacs_poll')
@@ -44,8 +65,17 @@ async def lifespan(app: FastAPI):
     scheduler.add_job(deactivate_old_events, 'interval', hours=6, id='deactivate_events')
     scheduler.add_job(check_new_passes, 'interval', hours=2, id='recovery_passes')
     scheduler.add_job(run_alert_watchers, 'interval', minutes=15, id='alert_engine')
+    scheduler.add_job(manager.bus.prune, 'interval', minutes=10, id='broadcast_prune')
+    scheduler.add_job(job_queue.prune, 'interval', hours=6, id='job_prune')
+    scheduler.add_job(osm_tiles.refresh_stale, 'interval', hours=6, id='osm_tile_refresh')
     scheduler.start()
     
+    # Durable pipeline jobs; analyses resume at the stage they reached
+    job_queue.register("satellite", stages.run_job)
+    job_queue.register("assessment", stages.rerun_assessment_job)
+    await job_queue.start()
+    await stages.resume_interrupted(job_queue)
+    
     # Run initial poll on startup
     asyncio.create_task(poll_gdacs())
     asyncio.create_task(poll_usgs())
@@ -54,7 +84,14 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     scheduler.shutdown()
+    await job_queue.stop()
+    await manager.stop_bus()
+    await close_http_client()
+    await hub.close()
     await close_db_pool()
+    shutdown_process_pool()
+    shutdown_osm_executor()
+    await loop_monitor.stop()
 
 app = FastAPI(
     title="SENTINEL API",
@@ -76,6 +113,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def reads_from_replica(request) -> bool:
+    """GET handlers only read, so their queries may go to the read replica,
+    unless the path needs current state or the client just wrote."""
+    return (request.method == "GET" and PRIMARY_COOKIE not in request.cookies
+            and not request.url.path.startswith(PRIMARY_READ_PREFIXES))
+
+@app.middleware("http")
+async def route_reads(request, call_next):
+    with use_pool("interactive", replica_reads=reads_from_replica(request)):
+        response = await call_next(request)
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and "replica" in pools():
+        # Keep this client on the primary until the replica has caught up with its write
+        response.set_cookie(PRIMARY_COOKIE, "1", max_age=READ_YOUR_WRITES_S, httponly=True, samesite="lax")
+    return response
+
 # Mount all module routers
 app.include_router(event_router, prefix="/api")
 app.include_router(satellite_router, prefix="/api")
@@ -89,19 +141,24 @@ app.include_router(alerts_router, prefix="/api")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
-        # Push initial data state immediately upon connection
-        from modules.event_monitor.router import list_events
-        from modules.alerts_engine.router import list_alerts
-        
-        events = await list_events()
-        alerts = await list_alerts()
+        # Initial state goes to this socket only, from the shared caches.
+        # ?since=<version> resumes: just the changes since the client's last version.
+        from modules.event_monitor.snapshot import events_snapshot
+        from modules.alerts_engine.snapshot import alerts_snapshot
         
-        await manager.broadcast("events_update", events)
-        await manager.broadcast("alerts_update", alerts)
+        snapshot = await events_snapshot.current()
+        since = websocket.query_params.get("since", "")
+        delta = snapshot.since(int(since)) if since.isdigit() else None
+        if delta:
+            await manager.send(websocket, "events_delta", delta, topic="events")
+        else:
+            manager.send_encoded(websocket, "events_update", snapshot.message, topic="events")
+        await manager.send(websocket, "alerts_update", await alerts_snapshot.current(), topic="alerts")
         
         while True:
-            # Keep connection alive, listen for any client messages (ping/pong)
+            # Subscription control messages and keep-alive pings
             data = await websocket.receive_text()
+            await manager.handle_message(websocket, data)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -118,8 +175,55 @@ async def keepalive():
         await conn.fetchval("SELECT 1")
     return {"status": "alive"}
 
+@app.get("/api/admin/ws")
+async def websocket_status():
+    """Per-connection queue depth, drops and send lag."""
+    return manager.stats()
+
+@app.get("/api/admin/jobs")
+async def jobs_status(status: str | None = None, limit: int = 100):
+    """Pipeline queue depth, wait and run times, and the most recent jobs."""
+    metrics = await job_queue.metrics()
+    metrics["jobs"] = await job_queue.list_jobs(status, min(limit, 1000))
+    return metrics
+
+@app.get("/api/admin/loop-lag")
+async def loop_lag():
+    """How late the event loop has been running scheduled callbacks."""
+    return loop_monitor.snapshot()
+
+@app.delete("/api/admin/loop-lag")
+async def reset_loop_lag():
+    """Clear the loop lag statistics, returning what they held."""
+    snapshot = loop_monitor.snapshot()
+    loop_monitor.reset()
+    return snapshot
+
+@app.get("/api/admin/db-metrics")
+async def db_metrics(top: int = 50, sort: SortField = "total_exec_ms"):
+    """Per-fingerprint query timings, per-pool saturation and slow-query log."""
+    from shared.db import pools
+    from shared.db_metrics import pool_metrics, query_metrics
+    metrics = query_metrics.snapshot(top=top, sort=sort)
+    metrics["pools"] = pool_metrics.snapshot(pools())
+    return metrics
+
+@app.delete("/api/admin/db-metrics")
+async def reset_db_metrics(top: int = 50, sort: SortField = "total_exec_ms"):
+    """Clear query and pool metrics, returning what they held."""
+    from shared.db_metrics import pool_metrics, query_metrics
+    metrics = await db_metrics(top, sort)
+    query_metrics.reset()
+    pool_metrics.reset()
+    return metrics
+
 @app.get("/api/admin/storage")
 async def storage_status():
-    """Monitor free tier usage across Neon and R2."""
+    """Monitor free tier usage across Neon and R2, the local imagery cache and the OSM tile cache."""
     from shared.quota import get_quota_status
-    return await get_quota_status()
+    from modules.satellite_pipeline import imagery_cache
+    status = await get_quota_status()
+    status["imagery_cache"] = await asyncio.to_thread(imagery_cache.usage)
+    status["sentinel_hub"]["client"] = hub.stats()
+    status["osm_tiles"] = await osm_tiles.stats()
+    return status
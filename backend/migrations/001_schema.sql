@@ -279,3 +279,129 @@ BEGIN
     UPDATE events SET active = false WHERE last_seen_in_feed < now() - INTERVAL '72 hours' AND active = true;
 END;
 $$ language 'plpgsql';
+
+-- 011 BROADCAST BUS
+-- Shared version counter so every worker labels the same /api/events snapshot alike
+CREATE SEQUENCE IF NOT EXISTS events_snapshot_version;
+
+-- WebSocket payloads too large for a NOTIFY; read once by each worker, pruned after 10 minutes
+CREATE UNLOGGED TABLE IF NOT EXISTS broadcast_payloads (
+    id BIGSERIAL PRIMARY KEY,
+    body TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_payloads_created ON broadcast_payloads(created_at);
+
+-- 012 SENTINEL HUB CALL ACCOUNTING
+-- One row per Sentinel Hub call; processing units are fractional for small tiles
+ALTER TABLE sentinel_quota_log ALTER COLUMN units_used TYPE NUMERIC(12, 3);
+ALTER TABLE sentinel_quota_log ADD COLUMN IF NOT EXISTS request_kind TEXT;
+ALTER TABLE sentinel_quota_log ADD COLUMN IF NOT EXISTS latency_ms INTEGER;
+ALTER TABLE sentinel_quota_log ADD COLUMN IF NOT EXISTS status_code SMALLINT;
+ALTER TABLE sentinel_quota_log ADD COLUMN IF NOT EXISTS response_bytes INTEGER;
+ALTER TABLE sentinel_quota_log ADD COLUMN IF NOT EXISTS job_id TEXT;
+
+-- 013 PIPELINE JOB QUEUE
+CREATE TABLE IF NOT EXISTS pipeline_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    stage TEXT NOT NULL,
+    event_id UUID NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    priority SMALLINT NOT NULL DEFAULT 0,
+    population BIGINT NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT now(),
+    locked_by TEXT,
+    heartbeat_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    first_started_at TIMESTAMPTZ,
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- At most one live job per event and stage; enqueue relies on this for dedupe
+CREATE UNIQUE INDEX IF NOT EXISTS idx_pipeline_jobs_live
+    ON pipeline_jobs(event_id, stage) WHERE status IN ('queued', 'running');
+-- Claim order; only queued rows are indexed
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_claim
+    ON pipeline_jobs(priority DESC, population DESC, created_at) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_running ON pipeline_jobs(heartbeat_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_finished ON pipeline_jobs(finished_at) WHERE finished_at IS NOT NULL;
+
+-- 014 PIPELINE STAGE CHECKPOINTS
+-- artefacts: what each completed stage left for the next (imagery cache keys, class mosaic, OSM set)
+-- stage_timings: per-stage seconds and attempts; processing_time_seconds is their total
+ALTER TABLE analyses ADD COLUMN IF NOT EXISTS artefacts JSONB NOT NULL DEFAULT '{}'::jsonb;
+ALTER TABLE analyses ADD COLUMN IF NOT EXISTS stage_timings JSONB NOT NULL DEFAULT '{}'::jsonb;
+CREATE INDEX IF NOT EXISTS idx_analyses_in_progress ON analyses(status)
+    WHERE status IN ('fetching_imagery', 'running_detection', 'assessing_buildings', 'generating_report');
+
+-- 015 DAMAGE ZONES
+-- damage_geojson polygons, one row each, so spatial joins run in the database.
+-- feature_index is the polygon's position in damage_geojson; among equal
+-- classes the lowest index wins, as it did when the blob was scanned in order.
+CREATE TABLE IF NOT EXISTS damage_zones (
+    analysis_id UUID NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,
+    feature_index INTEGER NOT NULL,
+    event_id UUID NOT NULL REFERENCES events(id),
+    severity_class SMALLINT NOT NULL,
+    delta_mean FLOAT,
+    properties JSONB NOT NULL DEFAULT '{}'::jsonb,
+    geom GEOMETRY(Polygon, 4326) NOT NULL,
+    PRIMARY KEY (analysis_id, feature_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_damage_zones_geom ON damage_zones USING gist(geom);
+CREATE INDEX IF NOT EXISTS idx_damage_zones_event ON damage_zones(event_id);
+
+-- Backfill analyses saved before the table existed
+INSERT INTO damage_zones (analysis_id, feature_index, event_id, severity_class, delta_mean, properties, geom)
+SELECT a.id, f.ordinality - 1, a.event_id,
+       COALESCE((f.feature->'properties'->>'severity_class')::smallint, 0),
+       COALESCE(f.feature->'properties'->>'dnbr_mean', f.feature->'properties'->>'dndwi_mean')::float,
+       COALESCE(f.feature->'properties', '{}'::jsonb),
+       ST_SetSRID(ST_GeomFromGeoJSON(f.feature->'geometry'), 4326)
+FROM analyses a,
+     jsonb_array_elements(a.damage_geojson->'features') WITH ORDINALITY AS f(feature, ordinality)
+WHERE a.damage_geojson IS NOT NULL AND f.feature->'geometry'->>'type' = 'Polygon'
+  AND NOT EXISTS (SELECT 1 FROM damage_zones z WHERE z.analysis_id = a.id)
+ON CONFLICT DO NOTHING;
+
+-- 016 OSM TILE CACHE
+-- OSM buildings and facilities per slippy-map tile (quadkey); payload is
+-- zlib-compressed columnar JSON. Supersedes osm_cache's per-event bboxes.
+CREATE TABLE IF NOT EXISTS osm_tiles (
+    quadkey TEXT PRIMARY KEY,
+    zoom SMALLINT NOT NULL,
+    payload BYTEA NOT NULL,
+    buildings INTEGER NOT NULL DEFAULT 0,
+    facilities INTEGER NOT NULL DEFAULT 0,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    last_hit_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_osm_tiles_expiry ON osm_tiles(zoom, expires_at);
+
+CREATE OR REPLACE FUNCTION cleanup_expired_cache()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM osm_cache WHERE expires_at < now();
+    DELETE FROM osm_tiles WHERE expires_at < now() - INTERVAL '30 days';
+END;
+$$ language 'plpgsql';
+
+-- 017 PIPELINE JOB DONE DEDUPE
+-- enqueue returns a recently finished job instead of queueing the same work again
+CREATE INDEX IF NOT EXISTS idx_pipeline_jobs_done
+    ON pipeline_jobs(event_id, stage, finished_at DESC) WHERE status = 'done';
+
+-- 018 EVENT FEED ALIASES
+-- EONET key of an event, kept when the record was folded into another feed's
+-- event or its synthetic eonet_ gdacs_id was replaced by a GDACS one
+ALTER TABLE events ADD COLUMN IF NOT EXISTS eonet_id TEXT UNIQUE;
+UPDATE events SET eonet_id = gdacs_id WHERE gdacs_id LIKE 'eonet\_%' AND eonet_id IS NULL;
@@ -11,7 +11,7 @@ async def get_report(analysis_id: str):
     if not row:
         raise HTTPException(404, "Analysis not found")
     return {
-        "id": str(row["id"]),
+        "id": row["id"],
         "status": row["report_status"],
         "report": row["report"],
         "public_slug": row["public_slug"],
@@ -8,7 +8,7 @@ import string
 from datetime import datetime, timezone
 
 import httpx
-from shared.db import fetch, fetchrow, execute
+from shared.db import fetch, fetchrow, execute, unit_of_work, pooled
 from shared.quota import check_gemini_quota, record_gemini_call
 
 logger = logging.getLogger(__name__)
@@ -20,14 +20,16 @@ def _generate_slug() -> str:
     words_c = ["one","two","three","seven","eight","nine","zero","prime","base","core"]
     return f"{random.choice(words_a)}-{random.choice(words_b)}-{random.choice(words_c)}"
 
+@pooled("background")
 async def generate_report(analysis_id: str):
     """Generate AI situation report for a completed analysis."""
-    analysis = await fetchrow("SELECT * FROM analyses WHERE id = $1::uuid", analysis_id)
-    if not analysis:
-        logger.error(f"Analysis {analysis_id} not found")
-        return
-    
-    event = await fetchrow("SELECT * FROM events WHERE id = $1::uuid", analysis["event_id"])
+    async with unit_of_work():
+        analysis = await fetchrow("SELECT * FROM analyses WHERE id = $1::uuid", analysis_id)
+        if not analysis:
+            logger.error(f"Analysis {analysis_id} not found")
+            return
+        
+        event = await fetchrow("SELECT * FROM events WHERE id = $1::uuid", analysis["event_id"])
     stats = analysis.get("stats") or {}
     infra = analysis.get("infrastructure") or {}
     pop = analysis.get("population") or {}
@@ -54,13 +56,14 @@ async def generate_report(analysis_id: str):
     
     await execute("""
         UPDATE analyses SET
-            report = $1::jsonb,
+            report = $1,
             public_slug = $2,
             report_status = 'complete'
         WHERE id = $3::uuid
-    """, json.dumps(report), slug, analysis_id)
+    """, report, slug, analysis_id)
     
     logger.info(f"Report generated for {analysis_id}, slug: {slug}")
+    return {"public_slug": slug}
 
 async def _call_groq(event, stats, infra, pop) -> dict:
     """Call Groq API with llama-3.1-70b-versatile."""
@@ -1,22 +1,13 @@
 """Alerts Engine API routes."""
 from fastapi import APIRouter, HTTPException
 from shared.db import fetch, fetchrow, execute
+from modules.alerts_engine.snapshot import alerts_snapshot, publish_alerts
 
 router = APIRouter(tags=["Alerts Engine"])
 
 @router.get("/alerts")
 async def list_alerts():
-    rows = await fetch("""
-        SELECT al.*, e.title as event_title
-        FROM alert_log al
-        LEFT JOIN events e ON e.id = al.event_id
-        WHERE al.acknowledged = false
-        ORDER BY 
-            CASE al.severity WHEN 'critical' THEN 0 WHEN 'warning' THEN 1 ELSE 2 END,
-            al.created_at DESC
-        LIMIT 100
-    """)
-    return [dict(r) for r in rows]
+    return await alerts_snapshot.current()
 
 @router.get("/alerts/{event_id}")
 async def event_alerts(event_id: str):
@@ -32,6 +23,7 @@ async def acknowledge_alert(alert_id: str):
         UPDATE alert_log SET acknowledged = true, acknowledged_at = now()
         WHERE id = $1::uuid
     """, alert_id)
+    await publish_alerts()
     return {"status": "acknowledged"}
 
 @router.get("/alerts/module/health")
@@ -1,11 +1,11 @@
 """Alerts Engine — watches thresholds and logs alerts."""
-import json
 import logging
 from datetime import datetime, timezone
-from shared.db import fetch, fetchrow, execute
+from shared.db import fetch, fetchrow, execute, pooled
 
 logger = logging.getLogger(__name__)
 
+@pooled("background")
 async def run_alert_watchers():
     """Main alert loop — checks all threshold conditions."""
     initial_count = await fetchrow("SELECT COUNT(*) as c FROM alert_log WHERE acknowledged = false")
@@ -20,10 +20,8 @@ async def run_alert_watchers():
     
     if c2 > c1:
         # New alerts generated, broadcast to clients
-        from shared.ws import manager
-        from modules.alerts_engine.router import list_alerts
-        alerts_data = await list_alerts()
-        await manager.broadcast("alerts_update", alerts_data)
+        from modules.alerts_engine.snapshot import publish_alerts
+        await publish_alerts()
 
 async def _watch_critical_events():
     """Alert on new Red severity events."""
@@ -41,10 +39,10 @@ async def _watch_critical_events():
     for event in rows:
         await execute("""
             INSERT INTO alert_log (event_id, alert_type, severity, message, metadata)
-            VALUES ($1, 'new_critical_event', 'critical', $2, $3::jsonb)
+            VALUES ($1, 'new_critical_event', 'critical', $2, $3)
         """, event["id"],
         f"🔴 CRITICAL EVENT: {event['title']} — Red alert {event['event_type']} event detected",
-        json.dumps({"event_title": event["title"], "event_type": event["event_type"]}))
+        {"event_title": event["title"], "event_type": event["event_type"]})
         logger.info(f"Alert: new critical event {event['title']}")
 
 async def _watch_infrastructure_at_risk():
@@ -68,10 +66,10 @@ async def _watch_infrastructure_at_risk():
         facility = row["name"] or row["facility_type"]
         await execute("""
             INSERT INTO alert_log (event_id, alert_type, severity, message, metadata)
-            VALUES ($1, 'infrastructure_at_risk', 'critical', $2, $3::jsonb)
+            VALUES ($1, 'infrastructure_at_risk', 'critical', $2, $3)
         """, row["event_id"],
         f"⚠️ {row['facility_type'].upper()} AT RISK: {facility} — {row['risk_level']} damage zone ({row['title']})",
-        json.dumps({"facility_name": row["name"], "facility_type": row["facility_type"], "risk_level": row["risk_level"]}))
+        {"facility_name": row["name"], "facility_type": row["facility_type"], "risk_level": row["risk_level"]})
 
 async def _watch_high_disputes():
     """Alert when 5+ disputed reports exist for same location."""
@@ -96,7 +94,7 @@ async def _watch_high_disputes():
     for row in rows:
         await execute("""
             INSERT INTO alert_log (event_id, alert_type, severity, message, metadata)
-            VALUES ($1, 'high_dispute_density', 'warning', $2, $3::jsonb)
+            VALUES ($1, 'high_dispute_density', 'warning', $2, $3)
         """, row["event_id"],
         f"🔍 HIGH DISPUTE DENSITY: {row['cnt']} field reports disagree with satellite assessment — field verification recommended",
-        json.dumps({"dispute_count": row["cnt"]}))
+        {"dispute_count": row["cnt"]})
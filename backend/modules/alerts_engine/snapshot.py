@@ -0,0 +1,70 @@
+"""Alerts Engine — cached unread-alert list.
+
+Served to every new WebSocket and to GET /alerts without a query each time.
+It is reloaded through publish_alerts() when the alert watchers log something
+or an alert is acknowledged; other workers reload when the bus relays that
+alerts_update.
+The TTL only bounds staleness if a relay is ever missed.
+"""
+import os
+import time
+import asyncio
+from typing import Optional
+from shared.db import fetch
+from shared.ws import manager
+
+ALERTS_SNAPSHOT_TTL_S = float(os.getenv("ALERTS_SNAPSHOT_TTL_S", "60"))
+ALERT_LEVELS = ("critical", "warning", "info")
+
+class AlertsSnapshot:
+    def __init__(self):
+        self.data: Optional[list[dict]] = None
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _stale(self) -> bool:
+        return self.data is None or time.monotonic() - self.loaded_at > ALERTS_SNAPSHOT_TTL_S
+
+    async def current(self) -> list[dict]:
+        if self._stale():
+            async with self._lock:
+                if self._stale():
+                    await self._load()
+        return self.data
+
+    async def refresh(self) -> list[dict]:
+        async with self._lock:
+            await self._load()
+        return self.data
+
+    async def _load(self):
+        rows = await fetch("""
+            SELECT al.*, e.title as event_title
+            FROM alert_log al
+            LEFT JOIN events e ON e.id = al.event_id
+            WHERE al.acknowledged = false
+            ORDER BY
+                CASE al.severity WHEN 'critical' THEN 0 WHEN 'warning' THEN 1 ELSE 2 END,
+                al.created_at DESC
+            LIMIT 100
+        """)
+        self.data = [dict(r) for r in rows]
+        self.loaded_at = time.monotonic()
+
+alerts_snapshot = AlertsSnapshot()
+
+async def publish_alerts() -> list[dict]:
+    """Reload the unread alerts and push them: the whole list on `alerts`,
+    each severity's slice on `alerts:<level>` for topics with subscribers."""
+    alerts = await alerts_snapshot.refresh()
+    await manager.broadcast("alerts_update", alerts, ref={"kind": "alerts"})
+    for level in ALERT_LEVELS:
+        topic = f"alerts:{level}"
+        if manager.has_subscribers(topic):
+            await manager.broadcast("alerts_update", [a for a in alerts if a["severity"] == level], topic=topic)
+    return alerts
+
+async def _resolve_alerts(ref: dict) -> list[dict]:
+    return await alerts_snapshot.refresh()
+
+manager.register_ref("alerts", _resolve_alerts)
@@ -0,0 +1,100 @@
+"""
+Damage Intelligence — OpenStreetMap acquisition.
+
+osmnx is synchronous: a download plus GeoDataFrame build can take tens of
+seconds, so it never runs on the event loop. Queries go to a small thread
+pool (OSM_WORKERS), which also bounds how many hit Overpass at once.
+
+Buildings and every facility type come from one combined query per bbox —
+Overpass ORs the tag filters — and are split afterwards by tag. Centroids
+are computed for the whole GeoDataFrame at once with shapely.
+"""
+import os
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+OSM_WORKERS = int(os.getenv("OSM_WORKERS", "2"))
+
+# facility_type -> (OSM key, value)
+FACILITY_TAGS = {
+    "hospital": ("amenity", "hospital"),
+    "school": ("amenity", "school"),
+    "power_station": ("power", "station"),
+    "water_treatment": ("man_made", "water_works"),
+    "cell_tower": ("man_made", "mast"),
+}
+
+_executor: ThreadPoolExecutor | None = None
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=OSM_WORKERS, thread_name_prefix="osm")
+    return _executor
+
+def shutdown_osm_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def query_tags() -> dict:
+    """osmnx tags for buildings plus every facility type."""
+    tags: dict = {"building": True}
+    for key, value in FACILITY_TAGS.values():
+        tags.setdefault(key, []).append(value)
+    return tags
+
+async def fetch_features(bbox: list) -> tuple[list[dict], list[dict]]:
+    """(buildings, facilities) in bbox [west, south, east, north], fetched off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_pool(), download, bbox)
+
+def download(bbox: list) -> tuple[list[dict], list[dict]]:
+    """Blocking: one Overpass query for bbox, split into buildings and facilities."""
+    import osmnx as ox
+    try:
+        features = ox.features_from_bbox(
+            north=bbox[3], south=bbox[1], east=bbox[2], west=bbox[0], tags=query_tags()
+        )
+    except Exception as e:
+        # osmnx raises rather than return an empty frame; an empty area is an answer too
+        if type(e).__name__ == "InsufficientResponseError":
+            return [], []
+        raise
+    return split_features(features)
+
+def split_features(features) -> tuple[list[dict], list[dict]]:
+    """Building and facility centroids of an osmnx GeoDataFrame."""
+    import shapely
+    import numpy as np
+
+    centroids = shapely.centroid(features.geometry.to_numpy())
+    lon, lat = shapely.get_x(centroids), shapely.get_y(centroids)
+    located = np.isfinite(lon) & np.isfinite(lat)  # missing or empty geometries
+    osm_ids = np.array([str(i) for i in features.index], dtype=object)
+    names = features["name"].fillna("").astype(str).to_numpy() if "name" in features else None
+
+    def column_is(key: str, value) -> np.ndarray:
+        if key not in features:
+            return np.zeros(len(features), dtype=bool)
+        column = features[key]
+        return (column.notna() if value is True else column.eq(value)).to_numpy() & located
+
+    rows = np.flatnonzero(column_is("building", True))
+    buildings = [
+        {"osm_id": o, "lat": y, "lon": x}
+        for o, y, x in zip(osm_ids[rows].tolist(), lat[rows].tolist(), lon[rows].tolist())
+    ]
+    facilities = []
+    for facility_type, (key, value) in FACILITY_TAGS.items():
+        rows = np.flatnonzero(column_is(key, value))
+        facilities += [
+            {"osm_id": o, "facility_type": facility_type, "name": n, "lat": y, "lon": x}
+            for o, n, y, x in zip(osm_ids[rows].tolist(),
+                                  names[rows].tolist() if names is not None else [""] * len(rows),
+                                  lat[rows].tolist(), lon[rows].tolist())
+        ]
+    return buildings, facilities
@@ -0,0 +1,247 @@
+"""
+Damage Intelligence — OSM feature cache on slippy-map tiles.
+
+OSM buildings and facilities are cached per web-mercator tile at
+OSM_TILE_ZOOM (z14 tiles are ~2.4 km at the equator), keyed by quadkey. A
+lookup for any bbox reads the tiles covering it and fetches only those
+missing or expired, so nearby or re-centred events reuse what earlier ones
+fetched. Missing tiles are grouped into rectangles, one Overpass query each.
+
+A feature belongs to the single tile holding its centroid, so assembled
+tiles never repeat a feature; the result is then cut to the bbox.
+
+Each tile is one osm_tiles row: columnar JSON, coordinates as integer 1e-7
+degrees (OSM's own precision), zlib-compressed. Tiles live OSM_TILE_TTL_DAYS;
+refresh_stale() refetches recently used tiles shortly before they expire,
+so busy areas never go cold, and drops tiles nobody has read since.
+"""
+import os
+import math
+import zlib
+import asyncio
+import logging
+import numpy as np
+
+from shared.db import encode_json, decode_json, execute, fetch, fetchrow, pooled
+from modules.damage_intelligence import osm
+
+logger = logging.getLogger(__name__)
+
+OSM_TILE_ZOOM = int(os.getenv("OSM_TILE_ZOOM", "14"))
+OSM_TILE_TTL_DAYS = int(os.getenv("OSM_TILE_TTL_DAYS", "30"))
+OSM_TILE_QUERY_SPAN = 16  # tiles per side of one Overpass query
+OSM_REFRESH_AHEAD_H = 12
+OSM_REFRESH_BATCH = 256  # tiles per refresh run
+COORD_SCALE = 1e7
+
+# ── Tile math ───────────────────────────────────────────────
+
+def tile_xy(lon, lat, zoom: int):
+    """Tile column and row holding each point; works on scalars and arrays."""
+    n = 2 ** zoom
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    x = np.floor((np.asarray(lon) + 180.0) / 360.0 * n)
+    y = np.floor((1.0 - np.arcsinh(np.tan(np.radians(lat))) / math.pi) / 2.0 * n)
+    return np.clip(x, 0, n - 1).astype(np.int64), np.clip(y, 0, n - 1).astype(np.int64)
+
+def tile_bbox(x: int, y: int, zoom: int) -> list:
+    """[west, south, east, north] of a tile."""
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return [x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)]
+
+def quadkey(x: int, y: int, zoom: int) -> str:
+    digits = []
+    for z in range(zoom, 0, -1):
+        mask = 1 << (z - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return "".join(digits)
+
+def from_quadkey(key: str) -> tuple[int, int, int]:
+    x = y = 0
+    for digit in key:
+        x, y = x << 1 | int(digit) & 1, y << 1 | int(digit) >> 1
+    return x, y, len(key)
+
+def covering_tiles(bbox: list, zoom: int) -> list[tuple[int, int]]:
+    x0, y0 = tile_xy(bbox[0], bbox[3], zoom)
+    x1, y1 = tile_xy(bbox[2], bbox[1], zoom)
+    return [(x, y) for y in range(int(y0), int(y1) + 1) for x in range(int(x0), int(x1) + 1)]
+
+def rectangles(tiles: set[tuple[int, int]], span: int = OSM_TILE_QUERY_SPAN) -> list[tuple[int, int, int, int]]:
+    """Cover tiles with few (x0, y0, x1, y1) rectangles, inclusive, at most span on a side:
+    runs along each row, merged with identical runs in the rows below."""
+    runs: dict[tuple[int, int], list[int]] = {}
+    for y in sorted({y for _, y in tiles}):
+        xs = sorted(x for x, ty in tiles if ty == y)
+        start = prev = xs[0]
+        for x in xs[1:] + [None]:
+            if x is not None and x == prev + 1 and x - start < span:
+                prev = x
+                continue
+            runs.setdefault((start, prev), []).append(y)
+            if x is not None:
+                start = prev = x
+    result = []
+    for (x0, x1), rows in runs.items():
+        top = bottom = rows[0]
+        for y in rows[1:] + [None]:
+            if y is not None and y == bottom + 1 and y - top < span:
+                bottom = y
+                continue
+            result.append((x0, top, x1, bottom))
+            if y is not None:
+                top = bottom = y
+    return result
+
+# ── Tile payloads ───────────────────────────────────────────
+
+def encode_tile(buildings: list[dict], facilities: list[dict]) -> bytes:
+    def coords(features, axis):
+        return [round(f[axis] * COORD_SCALE) for f in features]
+
+    return zlib.compress(encode_json({
+        "b": {"id": [b["osm_id"] for b in buildings], "lon": coords(buildings, "lon"), "lat": coords(buildings, "lat")},
+        "f": {"id": [f["osm_id"] for f in facilities], "type": [f["facility_type"] for f in facilities],
+              "name": [f["name"] for f in facilities],
+              "lon": coords(facilities, "lon"), "lat": coords(facilities, "lat")},
+    }), 6)
+
+def decode_tile(payload: bytes) -> tuple[list[dict], list[dict]]:
+    data = decode_json(zlib.decompress(payload))
+    b, f = data["b"], data["f"]
+    buildings = [{"osm_id": i, "lat": lat / COORD_SCALE, "lon": lon / COORD_SCALE}
+                 for i, lon, lat in zip(b["id"], b["lon"], b["lat"])]
+    facilities = [{"osm_id": i, "facility_type": t, "name": n, "lat": lat / COORD_SCALE, "lon": lon / COORD_SCALE}
+                  for i, t, n, lon, lat in zip(f["id"], f["type"], f["name"], f["lon"], f["lat"])]
+    return buildings, facilities
+
+def _decode_within(payloads: list[bytes], bbox: list) -> tuple[list[dict], list[dict]]:
+    west, south, east, north = bbox
+    buildings, facilities = [], []
+    for payload in payloads:
+        b, f = decode_tile(payload)
+        buildings += [p for p in b if west <= p["lon"] <= east and south <= p["lat"] <= north]
+        facilities += [p for p in f if west <= p["lon"] <= east and south <= p["lat"] <= north]
+    return buildings, facilities
+
+def _bucket(features: list[dict], zoom: int, rect: tuple[int, int, int, int]) -> dict[tuple[int, int], list[dict]]:
+    """Features of a rectangle query by the tile holding their centroid. Features
+    centred outside the rectangle belong to a neighbouring tile and are dropped."""
+    buckets: dict[tuple[int, int], list[dict]] = {}
+    if not features:
+        return buckets
+    xs, ys = tile_xy(np.array([f["lon"] for f in features]), np.array([f["lat"] for f in features]), zoom)
+    x0, y0, x1, y1 = rect
+    for feature, x, y in zip(features, xs.tolist(), ys.tolist()):
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            buckets.setdefault((x, y), []).append(feature)
+    return buckets
+
+# ── Cache ───────────────────────────────────────────────────
+
+class OsmTileCache:
+    def __init__(self, zoom: int = OSM_TILE_ZOOM):
+        self.zoom = zoom
+        self._counters = {"lookups": 0, "tiles_hit": 0, "tiles_missed": 0, "queries": 0,
+                          "tiles_stored": 0, "bytes_stored": 0, "tiles_refreshed": 0}
+
+    async def features(self, bbox: list) -> tuple[list[dict], list[dict], int]:
+        """(buildings, facilities, tiles used) with centroids in bbox, fetching only uncached tiles."""
+        tiles = covering_tiles(bbox, self.zoom)
+        keys = {quadkey(x, y, self.zoom): (x, y) for x, y in tiles}
+        rows = await fetch("""
+            UPDATE osm_tiles SET last_hit_at = now()
+            WHERE quadkey = ANY($1::text[]) AND expires_at > now()
+            RETURNING quadkey, payload
+        """, list(keys))
+        payloads = [r["payload"] for r in rows]
+        missing = set(keys.values()) - {keys[r["quadkey"]] for r in rows}
+        self._counters["lookups"] += 1
+        self._counters["tiles_hit"] += len(rows)
+        self._counters["tiles_missed"] += len(missing)
+
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(rect) for rect in rectangles(missing)))
+            payloads += [payload for stored in fetched for payload in stored.values()]
+        logger.info(f"OSM tiles for {[round(v, 3) for v in bbox]}: {len(rows)} cached, {len(missing)} fetched")
+        buildings, facilities = await asyncio.to_thread(_decode_within, payloads, bbox)
+        return buildings, facilities, len(tiles)
+
+    async def _fetch(self, rect: tuple[int, int, int, int]) -> dict[str, bytes]:
+        """Query one rectangle of tiles and store every tile in it, empty ones included."""
+        x0, y0, x1, y1 = rect
+        west, _, _, north = tile_bbox(x0, y0, self.zoom)
+        _, south, east, _ = tile_bbox(x1, y1, self.zoom)
+        self._counters["queries"] += 1
+        buildings, facilities = await osm.fetch_features([west, south, east, north])
+
+        by_tile_b = _bucket(buildings, self.zoom, rect)
+        by_tile_f = _bucket(facilities, self.zoom, rect)
+        stored = {}
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                stored[quadkey(x, y, self.zoom)] = (by_tile_b.get((x, y), []), by_tile_f.get((x, y), []))
+        payloads = await asyncio.to_thread(lambda: {k: encode_tile(b, f) for k, (b, f) in stored.items()})
+
+        await execute("""
+            INSERT INTO osm_tiles (quadkey, zoom, payload, buildings, facilities, expires_at, last_hit_at)
+            SELECT t.quadkey, $2, t.payload, t.buildings, t.facilities, now() + make_interval(days => $6), now()
+            FROM unnest($1::text[], $3::bytea[], $4::int[], $5::int[]) AS t(quadkey, payload, buildings, facilities)
+            ON CONFLICT (quadkey) DO UPDATE SET  -- a refresh is not a read: last_hit_at stays
+                payload = EXCLUDED.payload, buildings = EXCLUDED.buildings, facilities = EXCLUDED.facilities,
+                fetched_at = now(), expires_at = EXCLUDED.expires_at
+        """, list(payloads), self.zoom, list(payloads.values()),
+            [len(stored[k][0]) for k in payloads], [len(stored[k][1]) for k in payloads], OSM_TILE_TTL_DAYS)
+        self._counters["tiles_stored"] += len(payloads)
+        self._counters["bytes_stored"] += sum(len(p) for p in payloads.values())
+        return payloads
+
+    @pooled("background")
+    async def refresh_stale(self) -> int:
+        """Refetch tiles read within their TTL that expire soon; drop expired tiles nobody reads."""
+        rows = await fetch("""
+            SELECT quadkey FROM osm_tiles
+            WHERE zoom = $1
+              AND expires_at < now() + make_interval(hours => $2)
+              AND last_hit_at > now() - make_interval(days => $3)
+            ORDER BY last_hit_at DESC
+            LIMIT $4
+        """, self.zoom, OSM_REFRESH_AHEAD_H, OSM_TILE_TTL_DAYS, OSM_REFRESH_BATCH)
+        tiles = {from_quadkey(r["quadkey"])[:2] for r in rows}
+        refreshed = 0
+        for rect in rectangles(tiles):
+            try:
+                await self._fetch(rect)
+            except Exception as e:
+                logger.warning(f"OSM tile refresh failed for {rect}: {e}")
+                continue
+            refreshed += (rect[2] - rect[0] + 1) * (rect[3] - rect[1] + 1)
+        await execute("""
+            DELETE FROM osm_tiles
+            WHERE expires_at < now() AND COALESCE(last_hit_at, fetched_at) < now() - make_interval(days => $1)
+        """, OSM_TILE_TTL_DAYS)
+        self._counters["tiles_refreshed"] += refreshed
+        if refreshed:
+            logger.info(f"Refreshed {refreshed} OSM tiles")
+        return refreshed
+
+    async def stats(self) -> dict:
+        hit, missed = self._counters["tiles_hit"], self._counters["tiles_missed"]
+        stored = await fetchrow("""
+            SELECT count(*) AS tiles, COALESCE(sum(octet_length(payload)), 0) AS bytes,
+                   COALESCE(sum(buildings), 0) AS buildings, COALESCE(sum(facilities), 0) AS facilities,
+                   count(*) FILTER (WHERE expires_at <= now()) AS expired
+            FROM osm_tiles
+        """)
+        return {
+            "zoom": self.zoom,
+            **self._counters,
+            "hit_ratio": round(hit / (hit + missed), 3) if hit + missed else None,
+            "stored": dict(stored),
+        }
+
+osm_tiles = OsmTileCache()
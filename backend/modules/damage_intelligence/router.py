@@ -1,7 +1,8 @@
 """Damage Intelligence API routes."""
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from shared.db import fetch, fetchrow
-from modules.damage_intelligence.service import run_building_assessment
+from fastapi import APIRouter, HTTPException
+from shared.db import fetch, fetchrow, fetchval
+from shared.jobs import job_queue
+from modules.damage_intelligence.service import buildings_geojson
 
 router = APIRouter(tags=["Damage Intelligence"])
 
@@ -31,29 +32,7 @@ async def get_intelligence(analysis_id: str):
 @router.get("/intelligence/buildings/{event_id}")
 async def get_buildings_geojson(event_id: str):
     """Return building damage as GeoJSON for map rendering."""
-    rows = await fetch("""
-        SELECT id, damage_class, damage_label, confidence, source, disputed,
-               ST_Y(location::geometry) as lat, ST_X(location::geometry) as lon
-        FROM building_damage
-        WHERE event_id = $1::uuid
-        LIMIT 5000
-    """, event_id)
-    
-    features = []
-    for r in rows:
-        features.append({
-            "type": "Feature",
-            "geometry": {"type": "Point", "coordinates": [r["lon"] or 0, r["lat"] or 0]},
-            "properties": {
-                "id": str(r["id"]),
-                "damage_class": r["damage_class"],
-                "damage_label": r["damage_label"],
-                "confidence": r["confidence"],
-                "source": r["source"],
-                "disputed": r["disputed"]
-            }
-        })
-    return {"type": "FeatureCollection", "features": features}
+    return await buildings_geojson(event_id)
 
 @router.get("/intelligence/infrastructure/{event_id}")
 async def get_infrastructure(event_id: str):
@@ -74,10 +53,14 @@ async def get_infrastructure(event_id: str):
     return [dict(r) for r in rows]
 
 @router.post("/intelligence/{analysis_id}/trigger")
-async def trigger_assessment(analysis_id: str, background_tasks: BackgroundTasks):
-    """Manually trigger assessment for an analysis."""
-    background_tasks.add_task(run_building_assessment, analysis_id)
-    return {"status": "triggered"}
+async def trigger_assessment(analysis_id: str):
+    """Queue the building assessment for an analysis again; one already queued for its event is reused."""
+    event_id = await fetchval("SELECT event_id FROM analyses WHERE id = $1::uuid", analysis_id)
+    if event_id is None:
+        raise HTTPException(404, "Analysis not found")
+    queue_job_id, created = await job_queue.enqueue("assessment", str(event_id), {"analysis_id": analysis_id},
+                                                    rerun=True)
+    return {"status": "queued" if created else "already_queued", "queue_job_id": queue_job_id}
 
 @router.get("/intelligence/module/health")
 async def intelligence_health():
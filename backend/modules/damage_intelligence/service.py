@@ -1,83 +1,124 @@
 """Damage Intelligence — OSM building assessment + infrastructure risk + population impact."""
-import json
 import logging
-from shared.db import fetch, fetchrow, execute
+import numpy as np
+from shared.db import (
+    fetch, fetchrow, execute, copy_merge, pooled, unit_of_work,
+)
+from modules.damage_intelligence.osm_tiles import osm_tiles
+from modules.damage_intelligence.spatial import PolygonIndex
 
 logger = logging.getLogger(__name__)
 
-async def run_building_assessment(analysis_id: str):
-    """Main entry: assess buildings and infrastructure for a completed satellite analysis."""
-    analysis = await fetchrow("SELECT * FROM analyses WHERE id = $1::uuid", analysis_id)
-    if not analysis:
-        return
-    
-    event = await fetchrow("SELECT * FROM events WHERE id = $1::uuid", analysis["event_id"])
-    lat, lon = event["lat"], event["lon"]
-    
-    await execute(
-        "UPDATE analyses SET building_assessment_status = 'running' WHERE id = $1::uuid", analysis_id
+BUILDING_STAGING_COLUMNS = [
+    ("osm_id", "text"), ("lat", "float8"), ("lon", "float8"),
+    ("damage_class", "int2"), ("damage_label", "text"), ("confidence", "float8"),
+]
+
+INFRA_STAGING_COLUMNS = [
+    ("osm_id", "text"), ("facility_type", "text"), ("name", "text"), ("lat", "float8"), ("lon", "float8"),
+    ("risk_level", "text"), ("overlap_pct", "float8"),
+]
+
+# Each merge replaces the analysis' rows, so rerunning an assessment never duplicates them
+MERGE_BUILDINGS = """
+    WITH cleared AS (
+        DELETE FROM building_damage WHERE analysis_id = $1::uuid AND source = 'satellite'
+    ),
+    inserted AS (
+        INSERT INTO building_damage
+            (analysis_id, event_id, osm_id, lat, lon, damage_class, damage_label, confidence, source)
+        SELECT $1::uuid, $2::uuid, osm_id, lat, lon, damage_class, damage_label, confidence, 'satellite'
+        FROM _buildings_staging
+        RETURNING damage_class
     )
+    SELECT damage_class, count(*) AS buildings FROM inserted GROUP BY damage_class
+"""
+
+# infra_summary is counted from the rows as they are inserted
+MERGE_INFRA_RISK = """
+    WITH cleared AS (
+        DELETE FROM infrastructure_risk WHERE analysis_id = $1::uuid
+    ),
+    inserted AS (
+        INSERT INTO infrastructure_risk
+            (analysis_id, event_id, osm_id, facility_type, name, lat, lon, risk_level, overlap_pct)
+        SELECT $1::uuid, $2::uuid, osm_id, facility_type::infra_type_enum, name, lat, lon,
+               risk_level::risk_level_enum, overlap_pct
+        FROM _infra_staging
+        RETURNING facility_type, risk_level IN ('critical', 'high') AS at_risk
+    )
+    SELECT
+        count(*) FILTER (WHERE at_risk AND facility_type = 'hospital') AS hospitals_at_risk,
+        count(*) FILTER (WHERE at_risk AND facility_type = 'bridge') AS bridges_compromised,
+        count(*) FILTER (WHERE at_risk AND facility_type = 'power_station') AS power_stations_offline,
+        0 AS roads_disrupted_km,
+        count(*) FILTER (WHERE at_risk AND facility_type = 'water_treatment') AS water_facilities,
+        count(*) FILTER (WHERE at_risk AND facility_type = 'cell_tower') AS cell_towers_affected
+    FROM inserted
+"""
+
+@pooled("background")
+async def run_building_assessment(analysis_id: str) -> dict:
+    """Main entry: assess buildings and infrastructure for a completed satellite analysis.
+    Safe to retry: results are written in one transaction and replace any earlier set.
+    Returns the building set it assessed, for the analysis' artefacts."""
+    async with unit_of_work():
+        analysis = await fetchrow(
+            "SELECT id, event_id, damage_geojson FROM analyses WHERE id = $1::uuid", analysis_id
+        )
+        if not analysis:
+            return {}
+        
+        event = await fetchrow("SELECT * FROM events WHERE id = $1::uuid", analysis["event_id"])
+        lat, lon = event["lat"], event["lon"]
+        
+        await execute(
+            "UPDATE analyses SET building_assessment_status = 'running' WHERE id = $1::uuid", analysis_id
+        )
     
     try:
         # Try real OSM query if osmnx is available
-        buildings, infra = await _get_osm_data(lat, lon, str(analysis["event_id"]))
+        buildings, infra = await _get_osm_data(lat, lon, analysis["event_id"])
         
         # Assign damage classes to buildings
-        damage_geojson = analysis.get("damage_geojson")
-        if isinstance(damage_geojson, str):
-            damage_geojson = json.loads(damage_geojson)
+        damage_geojson = analysis["damage_geojson"]
         
-        building_records = _classify_buildings(buildings, damage_geojson, str(analysis["id"]), str(event["id"]))
-        infra_records = _assess_infrastructure(infra, damage_geojson, str(analysis["id"]), str(event["id"]))
-        
-        # Bulk insert building records
-        for b in building_records[:1000]:  # Cap at 1000 per analysis
-            await execute("""
-                INSERT INTO building_damage 
-                    (analysis_id, event_id, osm_id, lat, lon, damage_class, damage_label, confidence, source)
-                VALUES ($1::uuid, $2::uuid, $3, $4, $5, $6, $7, $8, 'satellite')
-                ON CONFLICT DO NOTHING
-            """, b["analysis_id"], b["event_id"], b.get("osm_id"), b["lat"], b["lon"],
-                 b["damage_class"], b["damage_label"], b["confidence"])
-        
-        # Infrastructure risk
-        infra_summary = {"hospitals_at_risk": 0, "bridges_compromised": 0, 
-                        "power_stations_offline": 0, "roads_disrupted_km": 0,
-                        "water_facilities": 0, "cell_towers_affected": 0}
-        
-        for ir in infra_records:
-            await execute("""
-                INSERT INTO infrastructure_risk
-                    (analysis_id, event_id, osm_id, facility_type, name, lat, lon, risk_level, overlap_pct)
-                VALUES ($1::uuid, $2::uuid, $3, $4, $5, $6, $7, $8, $9)
-                ON CONFLICT DO NOTHING
-            """, ir["analysis_id"], ir["event_id"], ir.get("osm_id"), ir["facility_type"],
-                 ir.get("name"), ir["lat"], ir["lon"], ir["risk_level"], ir.get("overlap_pct", 0))
-            
-            if ir["risk_level"] in ("critical", "high"):
-                if ir["facility_type"] == "hospital": infra_summary["hospitals_at_risk"] += 1
-                elif ir["facility_type"] == "bridge": infra_summary["bridges_compromised"] += 1
-                elif ir["facility_type"] == "power_station": infra_summary["power_stations_offline"] += 1
-                elif ir["facility_type"] == "cell_tower": infra_summary["cell_towers_affected"] += 1
-                elif ir["facility_type"] == "water_treatment": infra_summary["water_facilities"] += 1
+        building_records = _classify_buildings(buildings, damage_geojson, analysis["id"], event["id"])
+        infra_records = _assess_infrastructure(infra, damage_geojson, analysis["id"], event["id"])
         
         # Population estimate (mock)
         population = {"total_affected": 45000, "high_severity": 12000, "moderate_severity": 18000,
                      "source": "WorldPop 2020", "year": 2020}
         
-        await execute("""
-            UPDATE analyses SET
-                building_assessment_status = 'complete',
-                infrastructure = $1::jsonb,
-                population = $2::jsonb
-            WHERE id = $3::uuid
-        """, json.dumps(infra_summary), json.dumps(population), analysis_id)
+        # Results land all at once or not at all: a failure part-way leaves no
+        # half-written building set behind the 'error' status
+        async with unit_of_work(transaction=True, pool="bulk"):
+            by_class, infra_summary = await _store_results(
+                analysis_id, event["id"], building_records, infra_records
+            )
+            await execute("""
+                UPDATE analyses SET
+                    building_assessment_status = 'complete',
+                    infrastructure = $1,
+                    population = $2
+                WHERE id = $3::uuid
+            """, infra_summary, population, analysis_id)
+        
+        logger.info(f"Building assessment complete for analysis {analysis_id}: "
+                    f"{len(building_records)} buildings, by class {by_class}")
         
-        logger.info(f"Building assessment complete for analysis {analysis_id}: {len(building_records)} buildings")
+        # Push fresh building damage to dashboards following this event
+        from shared.ws import manager
+        topic = f"event:{event['id']}:buildings"
+        if manager.has_subscribers(topic):
+            await manager.broadcast("buildings_update", await buildings_geojson(event["id"]), topic=topic)
         
-        # Trigger AI report
-        from modules.ai_reporting.service import generate_report
-        await generate_report(analysis_id)
+        return {
+            "osm_bbox": _osm_bbox(lat, lon),
+            "osm_zoom": osm_tiles.zoom,
+            "buildings": len(building_records),
+            "infrastructure": len(infra_records),
+        }
         
     except Exception as e:
         logger.error(f"Building assessment failed: {e}")
@@ -85,83 +126,62 @@ async def run_building_assessment(analysis_id: str):
             "UPDATE analyses SET building_assessment_status = 'error', error_message = $1 WHERE id = $2::uuid",
             str(e), analysis_id
         )
+        raise
 
-async def _get_osm_data(lat: float, lon: float, event_id: str) -> tuple:
-    """Fetch OSM buildings and infrastructure, with caching."""
-    import hashlib
-    bbox = [round(lon - 0.2, 2), round(lat - 0.2, 2), round(lon + 0.2, 2), round(lat + 0.2, 2)]
-    cache_key = hashlib.md5(f"{bbox}_buildings".encode()).hexdigest()
-    
-    # Check cache first
-    cached = await fetchrow(
-        "SELECT geojson FROM osm_cache WHERE cache_key = $1 AND expires_at > now()", cache_key
-    )
-    if cached:
-        data = cached["geojson"] if isinstance(cached["geojson"], dict) else json.loads(cached["geojson"])
-        return data.get("buildings", []), data.get("infrastructure", [])
+async def _store_results(analysis_id: str, event_id: str, building_records: list,
+                         infra_records: list) -> tuple[dict, dict]:
+    """COPY building and infrastructure records into staging tables and merge
+    each in one statement. Returns (buildings per damage class, infra_summary)."""
+    rows = await copy_merge("_buildings_staging", BUILDING_STAGING_COLUMNS, [
+        (b.get("osm_id"), b["lat"], b["lon"], b["damage_class"], b["damage_label"], b["confidence"])
+        for b in building_records
+    ], MERGE_BUILDINGS, analysis_id, event_id)
+    summary = await copy_merge("_infra_staging", INFRA_STAGING_COLUMNS, [
+        (ir.get("osm_id"), ir["facility_type"], ir.get("name"), ir["lat"], ir["lon"],
+         ir["risk_level"], ir.get("overlap_pct", 0))
+        for ir in infra_records
+    ], MERGE_INFRA_RISK, analysis_id, event_id)
+    return {r["damage_class"]: r["buildings"] for r in rows}, dict(summary[0])
+
+async def buildings_geojson(event_id: str) -> dict:
+    """Building damage for an event as a GeoJSON FeatureCollection."""
+    rows = await fetch("""
+        SELECT id, damage_class, damage_label, confidence, source, disputed,
+               ST_Y(location::geometry) as lat, ST_X(location::geometry) as lon
+        FROM building_damage
+        WHERE event_id = $1::uuid
+        LIMIT 5000
+    """, event_id)
     
-    # Try osmnx
+    features = []
+    for r in rows:
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [r["lon"] or 0, r["lat"] or 0]},
+            "properties": {
+                "id": r["id"],
+                "damage_class": r["damage_class"],
+                "damage_label": r["damage_label"],
+                "confidence": r["confidence"],
+                "source": r["source"],
+                "disputed": r["disputed"]
+            }
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+def _osm_bbox(lat: float, lon: float) -> list:
+    """OSM query bbox [west, south, east, north] around an event."""
+    return [lon - 0.2, lat - 0.2, lon + 0.2, lat + 0.2]
+
+async def _get_osm_data(lat: float, lon: float, event_id: str) -> tuple:
+    """OSM buildings and infrastructure around an event, from the tile cache."""
     try:
-        import osmnx as ox
-        buildings = ox.features_from_bbox(
-            north=bbox[3], south=bbox[1], east=bbox[2], west=bbox[0],
-            tags={"building": True}
-        )
-        building_list = []
-        for _, row in buildings.iterrows():
-            try:
-                centroid = row.geometry.centroid
-                building_list.append({
-                    "osm_id": str(row.name),
-                    "lat": centroid.y, "lon": centroid.x
-                })
-            except Exception:
-                pass
-        
-        infra_list = await _fetch_infrastructure(bbox)
-        
-        # Cache result
-        cache_data = json.dumps({"buildings": building_list[:2000], "infrastructure": infra_list})
-        await execute("""
-            INSERT INTO osm_cache (cache_key, bbox, data_type, geojson, feature_count)
-            VALUES ($1, $2::jsonb, 'buildings', $3::jsonb, $4)
-            ON CONFLICT (cache_key) DO UPDATE SET geojson = EXCLUDED.geojson, fetched_at = now()
-        """, cache_key, json.dumps({"bbox": bbox}), cache_data, len(building_list))
-        
-        return building_list, infra_list
-        
+        buildings, infra, _ = await osm_tiles.features(_osm_bbox(lat, lon))
+        return buildings, infra
     except Exception as e:
         logger.warning(f"OSM query failed: {e} — using mock building data")
         return _mock_buildings(lat, lon), _mock_infrastructure(lat, lon)
 
-async def _fetch_infrastructure(bbox):
-    """Fetch critical infrastructure from OSM."""
-    import osmnx as ox
-    facilities = []
-    tags_map = {
-        "hospital": {"amenity": "hospital"},
-        "school": {"amenity": "school"},
-        "power_station": {"power": "station"},
-        "water_treatment": {"man_made": "water_works"},
-        "cell_tower": {"man_made": "mast"}
-    }
-    for ftype, tags in tags_map.items():
-        try:
-            feats = ox.features_from_bbox(
-                north=bbox[3], south=bbox[1], east=bbox[2], west=bbox[0], tags=tags
-            )
-            for _, row in feats.iterrows():
-                centroid = row.geometry.centroid
-                facilities.append({
-                    "osm_id": str(row.name),
-                    "facility_type": ftype,
-                    "name": row.get("name", ""),
-                    "lat": centroid.y, "lon": centroid.x
-                })
-        except Exception:
-            pass
-    return facilities
-
 def _mock_buildings(lat, lon):
     """Generate mock building locations in a grid around event."""
     buildings = []
@@ -182,66 +202,80 @@ def _mock_infrastructure(lat, lon):
         {"osm_id": "w1", "facility_type": "water_treatment", "name": "Municipal Water Works", "lat": lat - 0.01, "lon": lon - 0.02},
     ]
 
+def _damage_polygons(damage_geojson) -> tuple[list[dict], PolygonIndex]:
+    """Polygon features of damage_geojson, in order, and a spatial index over them."""
+    features = damage_geojson.get("features", []) if damage_geojson else []
+    polygons = [f for f in features if f.get("geometry", {}).get("type") == "Polygon"]
+    return polygons, PolygonIndex([f["geometry"]["coordinates"] for f in polygons])
+
+def _containing(index: PolygonIndex, points: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """(point, polygon) containment pairs for dicts with lat/lon, ordered by point then polygon."""
+    lon = np.array([p["lon"] for p in points], dtype=np.float64)
+    lat = np.array([p["lat"] for p in points], dtype=np.float64)
+    return index.containing(lon, lat)
+
 def _classify_buildings(buildings, damage_geojson, analysis_id, event_id):
-    """Assign damage class to each building based on damage polygon intersection."""
+    """Assign damage class to each building based on damage polygon intersection.
+
+    A building takes the highest class of the polygons containing it; on a
+    tie the first such polygon supplies the confidence."""
+    polygons, index = _damage_polygons(damage_geojson)
+    classes = np.array([min(f.get("properties", {}).get("severity_class", 0) // 2, 3) for f in polygons],
+                       dtype=np.int64)
+
+    best_class = np.zeros(len(buildings), dtype=np.int64)
+    best_polygon = np.full(len(buildings), -1, dtype=np.int64)
+    points, polys = _containing(index, buildings)
+    if len(points):
+        # Per building, highest class first and earliest polygon among equals
+        order = np.lexsort((polys, -classes[polys], points))
+        points, polys = points[order], polys[order]
+        first = np.r_[True, points[1:] != points[:-1]]
+        points, polys = points[first], polys[first]
+        damaged = classes[polys] > 0
+        best_class[points[damaged]] = classes[polys[damaged]]
+        best_polygon[points[damaged]] = polys[damaged]
+
+    labels = {0: "no-damage", 1: "minor-damage", 2: "major-damage", 3: "destroyed"}
     records = []
-    features = damage_geojson.get("features", []) if damage_geojson else []
-    
-    for b in buildings:
-        best_class = 0
+    for b, cls, poly in zip(buildings, best_class.tolist(), best_polygon.tolist()):
         confidence = 0.7
-        
-        for feature in features:
-            geom = feature.get("geometry", {})
-            props = feature.get("properties", {})
-            
-            if geom.get("type") == "Polygon":
-                coords = geom["coordinates"][0]
-                from modules.ground_truth.service import _point_in_polygon
-                if _point_in_polygon(b["lon"], b["lat"], coords):
-                    cls = min(props.get("severity_class", 0) // 2, 3)
-                    if cls > best_class:
-                        best_class = cls
-                        confidence = 0.75 + props.get("dnbr_mean", 0) * 0.1
-        
-        labels = {0: "no-damage", 1: "minor-damage", 2: "major-damage", 3: "destroyed"}
+        if poly >= 0:
+            props = polygons[poly].get("properties", {})
+            confidence = 0.75 + props.get("dnbr_mean", props.get("dndwi_mean", 0)) * 0.1
         records.append({
             "analysis_id": analysis_id,
             "event_id": event_id,
             "osm_id": b.get("osm_id"),
             "lat": b["lat"],
             "lon": b["lon"],
-            "damage_class": best_class,
-            "damage_label": labels[best_class],
+            "damage_class": cls,
+            "damage_label": labels[cls],
             "confidence": round(min(confidence, 1.0), 3)
         })
     
     return records
 
 def _assess_infrastructure(infra_list, damage_geojson, analysis_id, event_id):
-    """Assess risk level for each infrastructure facility."""
+    """Assess risk level for each infrastructure facility from the first damage polygon containing it."""
+    polygons, index = _damage_polygons(damage_geojson)
+    first_polygon = np.full(len(infra_list), -1, dtype=np.int64)
+    points, polys = _containing(index, infra_list)
+    if len(points):
+        first = np.r_[True, points[1:] != points[:-1]]
+        first_polygon[points[first]] = polys[first]
+
     records = []
-    features = damage_geojson.get("features", []) if damage_geojson else []
-    risk_levels = {0: "none", 1: "low", 2: "moderate", 3: "high", 4: "critical", 5: "critical"}
-    
-    for facility in infra_list:
+    for facility, poly in zip(infra_list, first_polygon.tolist()):
         risk = "low"
         overlap = 0
-        
-        for feature in features:
-            geom = feature.get("geometry", {})
-            props = feature.get("properties", {})
-            if geom.get("type") == "Polygon":
-                coords = geom["coordinates"][0]
-                from modules.ground_truth.service import _point_in_polygon
-                if _point_in_polygon(facility["lon"], facility["lat"], coords):
-                    severity = props.get("severity_class", 0)
-                    overlap = 100
-                    if severity >= 4: risk = "critical"
-                    elif severity >= 3: risk = "high"
-                    elif severity >= 2: risk = "moderate"
-                    else: risk = "low"
-                    break
+        if poly >= 0:
+            severity = polygons[poly].get("properties", {}).get("severity_class", 0)
+            overlap = 100
+            if severity >= 4: risk = "critical"
+            elif severity >= 3: risk = "high"
+            elif severity >= 2: risk = "moderate"
+            else: risk = "low"
         
         records.append({
             "analysis_id": analysis_id,
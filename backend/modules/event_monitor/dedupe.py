@@ -0,0 +1,142 @@
+"""Event Monitor — spatio-temporal index for cross-source duplicate detection.
+
+The same disaster usually shows up in more than one feed (a GDACS earthquake
+is also a USGS feature, a GDACS cyclone is also an EONET storm). Active
+events are bucketed by (grid cell, time window, event type) so an incoming
+record from one feed can be matched to an event another feed already
+created, instead of becoming a second `events` row with its own pipeline run.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+CELL_DEG = 1.0
+WINDOW = timedelta(hours=24)
+EARTH_RADIUS_KM = 6371.0
+
+# event_type -> (max distance km, max time difference). Earthquakes are
+# located precisely by every feed; storm and flood centroids drift.
+TOLERANCES = {
+    "EQ": (50, timedelta(hours=2)),
+    "TC": (300, timedelta(hours=72)),
+    "FL": (150, timedelta(hours=72)),
+    "VO": (30, timedelta(hours=72)),
+    "WF": (50, timedelta(hours=48)),
+    "LS": (30, timedelta(hours=48)),
+}
+DEFAULT_TOLERANCE = (50, timedelta(hours=24))
+
+_N_LON_CELLS = int(360 / CELL_DEG)
+
+def source_of(gdacs_id: str) -> str:
+    """Feed that created a row, derived from the key it was stored under."""
+    if gdacs_id.startswith("usgs_"):
+        return "usgs"
+    if gdacs_id.startswith("eonet_"):
+        return "eonet"
+    return "gdacs"
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+class EventIndex:
+    def __init__(self):
+        self._buckets: dict[tuple, set] = defaultdict(set)
+        self._events: dict[str, dict] = {}
+        self._keys: dict[str, str] = {}
+
+    def __len__(self):
+        return len(self._events)
+
+    def clear(self):
+        self._buckets.clear()
+        self._events.clear()
+        self._keys.clear()
+
+    def add(self, event_id: str, event_type: str, lat: float, lon: float,
+            event_date: Optional[datetime], gdacs_id: str, usgs_id: Optional[str] = None,
+            eonet_id: Optional[str] = None):
+        """Insert or refresh an active event. usgs_id and eonet_id are the keys
+        of other feeds' records folded into it."""
+        event_id = str(event_id)
+        self.remove(event_id)
+        event_date = event_date or _now()
+        sources = {source_of(gdacs_id)}
+        if usgs_id:
+            sources.add("usgs")
+        if eonet_id:
+            sources.add("eonet")
+        
+        bucket = (*_cell(lat, lon), _window(event_date), event_type)
+        self._events[event_id] = {
+            "event_type": event_type, "lat": lat, "lon": lon, "event_date": event_date,
+            "sources": sources, "keys": [k for k in (gdacs_id, usgs_id, eonet_id) if k], "bucket": bucket,
+        }
+        self._buckets[bucket].add(event_id)
+        for key in self._events[event_id]["keys"]:
+            self._keys[key] = event_id
+
+    def remove(self, event_id: str):
+        event = self._events.pop(str(event_id), None)
+        if not event:
+            return
+        self._buckets[event["bucket"]].discard(str(event_id))
+        if not self._buckets[event["bucket"]]:
+            del self._buckets[event["bucket"]]
+        for key in event["keys"]:
+            self._keys.pop(key, None)
+
+    def owner(self, key: str) -> Optional[str]:
+        """Event already stored under a feed key (gdacs_id, usgs_id or eonet_id)."""
+        return self._keys.get(key)
+
+    def claim(self, event_id: str, source: str):
+        """Mark an event as already matched by a feed, so the same feed
+        cannot attach a second record to it in this batch."""
+        event = self._events.get(str(event_id))
+        if event:
+            event["sources"].add(source)
+
+    def find_duplicate(self, source: str, event_type: str, lat: float, lon: float,
+                       event_date: Optional[datetime]) -> Optional[str]:
+        """Closest active event of the same type from a different feed that lies
+        within the distance and time tolerance for that type, if any."""
+        max_km, max_dt = TOLERANCES.get(event_type, DEFAULT_TOLERANCE)
+        event_date = event_date or _now()
+        
+        cx, cy = _cell(lat, lon)
+        dy = math.ceil(max_km / 111.32 / CELL_DEG)
+        km_per_lon_cell = 111.32 * CELL_DEG * max(math.cos(math.radians(lat)), 0.01)
+        dx = min(math.ceil(max_km / km_per_lon_cell), _N_LON_CELLS // 2)
+        dw = math.ceil(max_dt / WINDOW)
+        window = _window(event_date)
+        
+        best, best_km = None, None
+        for ix in range(cx - dx, cx + dx + 1):
+            for iy in range(cy - dy, cy + dy + 1):
+                for iw in range(window - dw, window + dw + 1):
+                    for event_id in self._buckets.get((ix % _N_LON_CELLS, iy, iw, event_type), ()):
+                        event = self._events[event_id]
+                        if source in event["sources"]:
+                            continue  # a feed never duplicates its own entries
+                        if abs(event["event_date"] - event_date) > max_dt:
+                            continue
+                        km = haversine_km(lat, lon, event["lat"], event["lon"])
+                        if km <= max_km and (best_km is None or km < best_km):
+                            best, best_km = event_id, km
+        return best
+
+def _cell(lat: float, lon: float) -> tuple:
+    return int(math.floor((lon + 180) / CELL_DEG)) % _N_LON_CELLS, int(math.floor((lat + 90) / CELL_DEG))
+
+def _window(when: datetime) -> int:
+    return int(when.timestamp() // WINDOW.total_seconds())
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+event_index = EventIndex()
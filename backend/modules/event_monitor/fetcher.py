@@ -0,0 +1,116 @@
+"""Event Monitor — conditional feed fetching and per-entry change detection.
+
+Polls send ETag / If-Modified-Since and stop on 304, and parsed entries are
+fingerprinted so only new or changed ones are merged into the database.
+"""
+import hashlib
+import logging
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import AsyncIterator, Optional
+
+import httpx
+from shared.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Unchanged entries are still re-sent once per TTL so last_seen_in_feed stays
+# well inside the 72h deactivation window of deactivate_old_events.
+FINGERPRINT_TTL = timedelta(hours=6)
+
+class FeedFetcher:
+    def __init__(self, fingerprint_ttl: timedelta = FINGERPRINT_TTL):
+        self.fingerprint_ttl = fingerprint_ttl
+        self._validators: dict[str, dict] = {}
+        self._fingerprints: dict[str, dict[str, tuple[str, datetime]]] = defaultdict(dict)
+        self._counters: dict[str, Counter] = defaultdict(Counter)
+        self._last_fetch: dict[str, str] = {}
+
+    async def fetch(self, source: str, url: str) -> Optional[httpx.Response]:
+        """GET a feed, conditionally if we hold fresh validators. None means 304."""
+        resp = await get_http_client().get(url, headers=self._conditional_headers(source))
+        return self._check_response(source, resp)
+
+    @asynccontextmanager
+    async def stream(self, source: str, url: str) -> AsyncIterator[Optional[httpx.Response]]:
+        """Like fetch, but yields the response unread so the body can be parsed
+        incrementally with `resp.aiter_bytes()`. Yields None on 304."""
+        client = get_http_client()
+        async with client.stream("GET", url, headers=self._conditional_headers(source)) as resp:
+            yield self._check_response(source, resp)
+
+    def _conditional_headers(self, source: str) -> dict:
+        headers = {}
+        validators = self._validators.get(source)
+        if validators and _now() - validators["fetched_at"] < self.fingerprint_ttl:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def _check_response(self, source: str, resp: httpx.Response) -> Optional[httpx.Response]:
+        counters = self._counters[source]
+        counters["requests"] += 1
+        self._last_fetch[source] = _now().isoformat()
+        
+        if resp.status_code == 304:
+            counters["not_modified"] += 1
+            return None
+        resp.raise_for_status()
+        return resp
+
+    def changed(self, source: str, records: list) -> list:
+        """Drop records whose fingerprint matches one merged within the TTL.
+        Records are keyed by their first field (the source key)."""
+        known = self._fingerprints[source]
+        cutoff = _now() - self.fingerprint_ttl
+        fresh = []
+        for record in records:
+            seen = known.get(record[0])
+            if seen and seen[0] == _fingerprint(record) and seen[1] > cutoff:
+                continue
+            fresh.append(record)
+        
+        counters = self._counters[source]
+        counters["entries_seen"] += len(records)
+        counters["entries_skipped"] += len(records) - len(fresh)
+        counters["entries_changed"] += len(fresh)
+        return fresh
+
+    def commit(self, source: str, resp: httpx.Response, records: list):
+        """Remember validators and fingerprints once a poll was merged successfully."""
+        now = _now()
+        self._validators[source] = {
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+            "fetched_at": now,
+        }
+        known = self._fingerprints[source]
+        for record in records:
+            known[record[0]] = (_fingerprint(record), now)
+        
+        # Forget entries that have dropped out of the feed
+        cutoff = now - self.fingerprint_ttl
+        for key in [k for k, (_, seen_at) in known.items() if seen_at <= cutoff]:
+            del known[key]
+
+    def stats(self) -> dict:
+        """Per-source hit/skip counters for the module health endpoint."""
+        return {
+            source: {
+                **counters,
+                "tracked_entries": len(self._fingerprints[source]),
+                "last_fetch": self._last_fetch.get(source),
+            }
+            for source, counters in self._counters.items()
+        }
+
+def _fingerprint(record: tuple) -> str:
+    return hashlib.blake2b(repr(record).encode(), digest_size=16).hexdigest()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+feed_fetcher = FeedFetcher()
@@ -0,0 +1,87 @@
+"""Event Monitor — incremental GDACS RSS parser.
+
+Feeds the response body to an XML pull parser chunk by chunk and yields one
+small dict per <item> whose alert level we track, detaching each parsed item
+from the tree so memory stays flat however long the feed is. Entry keys
+mirror the feedparser names (`gdacs_eventid`, `geo_lat`, ...) that
+`_parse_gdacs_entry` reads.
+"""
+from typing import AsyncIterator, Iterable, Iterator
+from xml.etree.ElementTree import XMLPullParser
+
+GDACS_NS = "{http://www.gdacs.org}"
+GEO_NS = "{http://www.w3.org/2003/01/geo/wgs84_pos#}"
+
+# Element tag -> entry key. Everything else inside an <item> is ignored.
+_TEXT_FIELDS = {
+    "title": "title",
+    "guid": "id",
+    "pubDate": "published",
+    f"{GEO_NS}lat": "geo_lat",
+    f"{GEO_NS}long": "geo_long",
+    f"{GDACS_NS}eventid": "gdacs_eventid",
+    f"{GDACS_NS}eventtype": "gdacs_eventtype",
+    f"{GDACS_NS}alertlevel": "gdacs_alertlevel",
+    f"{GDACS_NS}country": "gdacs_country",
+    f"{GDACS_NS}fromdate": "gdacs_fromdate",
+}
+# Elements whose attributes carry the value, as feedparser exposes them
+_ATTR_FIELDS = {
+    f"{GDACS_NS}population": "gdacs_population",
+    f"{GDACS_NS}severity": "gdacs_severity",
+}
+
+class GdacsStreamParser:
+    def __init__(self, alert_levels: tuple = ("orange", "red")):
+        self.alert_levels = alert_levels
+        self._parser = XMLPullParser(events=("start", "end"))
+        self._stack = []
+        self._entry = None
+
+    def feed(self, chunk: bytes) -> list[dict]:
+        """Consume a chunk and return the matching entries it completed."""
+        self._parser.feed(chunk)
+        return list(self._drain())
+
+    def close(self) -> list[dict]:
+        self._parser.close()
+        return list(self._drain())
+
+    def _drain(self) -> Iterator[dict]:
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                self._stack.append(elem)
+                if elem.tag == "item":
+                    self._entry = {}
+                continue
+            
+            self._stack.pop()
+            if self._entry is None:
+                continue
+            
+            if elem.tag == "item":
+                entry, self._entry = self._entry, None
+                # Detach the finished item so the tree never holds more than one
+                if self._stack:
+                    self._stack[-1].remove(elem)
+                if entry.get("gdacs_alertlevel", "green").lower() in self.alert_levels:
+                    yield entry
+            elif elem.tag in _TEXT_FIELDS:
+                self._entry[_TEXT_FIELDS[elem.tag]] = (elem.text or "").strip()
+            elif elem.tag in _ATTR_FIELDS:
+                self._entry[_ATTR_FIELDS[elem.tag]] = dict(elem.attrib)
+
+def iter_gdacs_entries(chunks: Iterable[bytes], **kwargs) -> Iterator[dict]:
+    parser = GdacsStreamParser(**kwargs)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+async def aiter_gdacs_entries(chunks: AsyncIterator[bytes], **kwargs) -> AsyncIterator[dict]:
+    """Parse an async byte stream (e.g. `response.aiter_bytes()`) as it arrives."""
+    parser = GdacsStreamParser(**kwargs)
+    async for chunk in chunks:
+        for entry in parser.feed(chunk):
+            yield entry
+    for entry in parser.close():
+        yield entry
@@ -3,9 +3,12 @@ import os
 import hashlib
 import logging
 from datetime import datetime, timezone, timedelta
-import httpx
-import feedparser
-from shared.db import fetch, fetchrow, execute
+from email.utils import parsedate_to_datetime
+from shared.db import fetch, fetchrow, execute, copy_merge, pooled
+from modules.event_monitor.fetcher import feed_fetcher
+from modules.event_monitor.gdacs_stream import aiter_gdacs_entries
+from modules.event_monitor.dedupe import event_index
+from modules.event_monitor.snapshot import events_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -22,43 +25,56 @@ EVENT_TYPE_MAP = {
     "LS": "LS", "landslide": "LS",
 }
 
+# Staging layout shared by all three feeds — one row per parsed feed entry
+EVENT_STAGING_COLUMNS = [
+    ("gdacs_id", "text"),
+    ("usgs_id", "text"),
+    ("title", "text"),
+    ("event_type", "text"),
+    ("severity", "text"),
+    ("lat", "double precision"),
+    ("lon", "double precision"),
+    ("event_date", "timestamptz"),
+    ("country", "text"),
+    ("affected_population", "integer"),
+]
+
+@pooled("background")
 async def poll_gdacs():
     """Poll GDACS RSS feed every 10 minutes."""
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(GDACS_RSS)
-            resp.raise_for_status()
-        
-        feed = feedparser.parse(resp.text)
-        count = 0
-        for entry in feed.entries:
-            try:
-                await _upsert_gdacs_event(entry)
-                count += 1
-            except Exception as e:
-                logger.error(f"Error processing GDACS entry {entry.get('id', '?')}: {e}")
-        
-        logger.info(f"GDACS poll: processed {count} events")
+        async with feed_fetcher.stream("gdacs", GDACS_RSS) as resp:
+            if resp is None:
+                logger.info("GDACS poll: feed not modified")
+                return
+            
+            # Parse while the body downloads; only Orange/Red items come out
+            records = []
+            async for entry in aiter_gdacs_entries(resp.aiter_bytes()):
+                try:
+                    record = _parse_gdacs_entry(entry)
+                    if record:
+                        records.append(record)
+                except Exception as e:
+                    logger.error(f"Error processing GDACS entry {entry.get('id', '?')}: {e}")
         
-        # Broadcast update to connected clients
-        if count > 0:
-            from shared.ws import manager
-            from modules.event_monitor.router import list_events
-            events_data = await list_events()
-            await manager.broadcast("events_update", events_data)
+        changed = feed_fetcher.changed("gdacs", records)
+        merged = await _merge_events(changed, "gdacs")
+        feed_fetcher.commit("gdacs", resp, changed)
+        await _report_merge("GDACS", merged, len(records) - len(changed))
             
     except Exception as e:
         logger.error(f"GDACS poll failed: {e}")
 
-async def _upsert_gdacs_event(entry):
+def _parse_gdacs_entry(entry) -> tuple | None:
     gdacs_id = entry.get("gdacs_eventid", entry.get("id", ""))
     if not gdacs_id:
-        return
+        return None
     
     # Parse severity
     alert = entry.get("gdacs_alertlevel", "green").lower()
     if alert not in ("orange", "red"):
-        return  # Only track Orange/Red alerts
+        return None  # Only track Orange/Red alerts
     
     # Parse event type
     raw_type = entry.get("gdacs_eventtype", "OTHER").upper()
@@ -67,7 +83,8 @@ async def _upsert_gdacs_event(entry):
     # Parse coordinates
     geo = entry.get("where", {})
     lat = float(getattr(geo, 'latitude', 0) or entry.get("geo_lat", 0))
-    lon = float(getattr(geo, 'longitude', 0) or entry.get("geo_lon", 0))
+    lon = float(getattr(geo, 'longitude', 0) or entry.get("geo_long", entry.get("geo_lon", 0)))
+    _check_coordinates(lat, lon)
     
     title = entry.get("title", "Unknown Event")
     country = entry.get("gdacs_country", "")
@@ -81,53 +98,54 @@ async def _upsert_gdacs_event(entry):
     except (ValueError, TypeError):
         population = 0
     
-    # Check if event already exists
-    existing = await fetchrow("SELECT id FROM events WHERE gdacs_id = $1", gdacs_id)
+    # Real onset time when the feed carries one, so the duplicate index can match
+    # the same event from USGS/EONET; otherwise the merge stamps now()
+    event_date = None
+    if entry.get("gdacs_fromdate"):
+        event_date = parsedate_to_datetime(entry["gdacs_fromdate"])
     
-    if existing:
-        await execute(
-            "UPDATE events SET last_seen_in_feed = now(), active = true WHERE gdacs_id = $1",
-            gdacs_id
-        )
-    else:
-        await execute("""
-            INSERT INTO events (gdacs_id, title, event_type, severity, lat, lon, 
-                                event_date, country, affected_population, last_seen_in_feed)
-            VALUES ($1, $2, $3, $4, $5, $6, now(), $7, $8, now())
-            ON CONFLICT (gdacs_id) DO UPDATE SET last_seen_in_feed = now(), active = true
-        """, gdacs_id, title, event_type, alert, lat, lon, country, population)
-        logger.info(f"New event added: {title} ({event_type}, {alert})")
+    return (gdacs_id, None, title, event_type, alert, lat, lon,
+            event_date, country, population)
 
+@pooled("background")
 async def poll_usgs():
     """Poll USGS Earthquake API every 5 minutes for M5.0+ events."""
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(USGS_API)
-            resp.raise_for_status()
+        resp = await feed_fetcher.fetch("usgs", USGS_API)
+        if resp is None:
+            logger.info("USGS poll: feed not modified")
+            return
         
         data = resp.json()
+        records = []
         for feature in data.get("features", []):
             try:
-                await _upsert_usgs_event(feature)
+                record = _parse_usgs_feature(feature)
+                if record:
+                    records.append(record)
             except Exception as e:
                 logger.error(f"Error processing USGS event: {e}")
         
-        logger.info(f"USGS poll: processed {len(data.get('features', []))} earthquakes")
+        changed = feed_fetcher.changed("usgs", records)
+        merged = await _merge_events(changed, "usgs")
+        feed_fetcher.commit("usgs", resp, changed)
+        await _report_merge("USGS", merged, len(records) - len(changed))
     except Exception as e:
         logger.error(f"USGS poll failed: {e}")
 
-async def _upsert_usgs_event(feature):
+def _parse_usgs_feature(feature) -> tuple | None:
     props = feature.get("properties", {})
     usgs_id = feature.get("id", "")
     if not usgs_id:
-        return
+        return None
     
     mag = props.get("mag", 0) or 0
     if mag < 5.0:
-        return
+        return None
     
     coords = feature.get("geometry", {}).get("coordinates", [0, 0, 0])
     lon, lat = float(coords[0]), float(coords[1])
+    _check_coordinates(lat, lon)
     title = props.get("title", f"M{mag} Earthquake")
     place = props.get("place", "")
     time_ms = props.get("time", 0)
@@ -135,29 +153,34 @@ async def _upsert_usgs_event(feature):
     
     severity = "red" if mag >= 7.0 else "orange" if mag >= 5.5 else "orange"
     
-    await execute("""
-        INSERT INTO events (usgs_id, gdacs_id, title, event_type, severity, lat, lon, event_date, last_seen_in_feed)
-        VALUES ($1, $2, $3, 'EQ', $4, $5, $6, $7, now())
-        ON CONFLICT (usgs_id) DO UPDATE SET last_seen_in_feed = now(), active = true
-    """, usgs_id, f"usgs_{usgs_id}", title, severity, lat, lon, event_time)
+    return (f"usgs_{usgs_id}", usgs_id, title, "EQ", severity, lat, lon,
+            event_time, None, None)
 
+@pooled("background")
 async def poll_eonet():
     """Poll NASA EONET for volcanic, landslide, storm events."""
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(EONET_API)
-            resp.raise_for_status()
+        resp = await feed_fetcher.fetch("eonet", EONET_API)
+        if resp is None:
+            logger.info("EONET poll: feed not modified")
+            return
         data = resp.json()
+        records = []
         for event in data.get("events", []):
             try:
-                await _upsert_eonet_event(event)
+                record = _parse_eonet_event(event)
+                if record:
+                    records.append(record)
             except Exception as e:
                 logger.error(f"EONET event error: {e}")
-        logger.info(f"EONET poll: {len(data.get('events', []))} events")
+        changed = feed_fetcher.changed("eonet", records)
+        merged = await _merge_events(changed, "eonet")
+        feed_fetcher.commit("eonet", resp, changed)
+        await _report_merge("EONET", merged, len(records) - len(changed))
     except Exception as e:
         logger.error(f"EONET poll failed: {e}")
 
-async def _upsert_eonet_event(event):
+def _parse_eonet_event(event) -> tuple | None:
     eonet_id = event.get("id", "")
     title = event.get("title", "")
     categories = event.get("categories", [])
@@ -171,17 +194,193 @@ async def _upsert_eonet_event(event):
     
     geometries = event.get("geometry", [])
     if not geometries:
-        return
+        return None
     latest = geometries[-1]
     coords = latest.get("coordinates", [0, 0])
     lon, lat = float(coords[0]), float(coords[1])
+    _check_coordinates(lat, lon)
     
-    await execute("""
-        INSERT INTO events (gdacs_id, title, event_type, severity, lat, lon, event_date, last_seen_in_feed)
-        VALUES ($1, $2, $3, 'orange', $4, $5, now(), now())
-        ON CONFLICT (gdacs_id) DO UPDATE SET last_seen_in_feed = now(), active = true
-    """, f"eonet_{eonet_id}", title, event_type, lat, lon)
+    event_date = None
+    if latest.get("date"):
+        event_date = datetime.fromisoformat(latest["date"].replace("Z", "+00:00"))
+    
+    return (f"eonet_{eonet_id}", None, title, event_type, "orange", lat, lon,
+            event_date, None, None)
+
+def _check_coordinates(lat: float, lon: float):
+    # One out-of-range row would abort the whole batched merge, so reject it at parse time
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"coordinates out of range: {lat}, {lon}")
+
+async def _merge_events(records: list, source: str) -> list:
+    """COPY parsed feed records into a staging table and upsert them into events
+    in one statement. Records that duplicate an active event from another feed
+    are folded into that event instead. Returns one row per merged event with
+    `inserted`, `reactivated` and `duplicate` flags so callers know which rows
+    actually changed. Records left out because another feed key of theirs
+    already belongs to a different event are logged."""
+    if not records:
+        return []
+    
+    records, duplicates = _split_duplicates(records, source)
+    merged = []
+    if records:
+        merged += await copy_merge(
+            "_events_staging", EVENT_STAGING_COLUMNS, records, _merge_sql(source)
+        )
+        merged_keys = {row[CONFLICT_KEYS.get(source, "gdacs_id")] for row in merged}
+        skipped = [r for r in records if _record_key(r, source) not in merged_keys]
+        if skipped:
+            logger.warning(f"{source} poll: skipped {len(skipped)} entries whose ids belong to another event: "
+                           f"{[(r[0], r[1]) for r in skipped]}")
+    if duplicates:
+        merged += await _merge_duplicates(duplicates, source)
+    
+    for row in merged:
+        event_index.add(row["id"], row["event_type"], row["lat"], row["lon"],
+                        row["event_date"], row["gdacs_id"], row["usgs_id"], row["eonet_id"])
+    return merged
+
+# Column each feed's records are keyed on. EONET records are staged under a
+# synthetic eonet_ gdacs_id, which is also kept in eonet_id so the key
+# survives a GDACS id replacing it.
+CONFLICT_KEYS = {"usgs": "usgs_id", "eonet": "eonet_id"}
+
+def _merge_sql(source: str) -> str:
+    conflict_key = CONFLICT_KEYS.get(source, "gdacs_id")
+    eonet_id = "gdacs_id" if source == "eonet" else "NULL::text"
+    return f"""
+        WITH incoming AS (
+            SELECT DISTINCT ON ({conflict_key}) *
+            FROM (SELECT *, {eonet_id} AS eonet_id FROM _events_staging) s
+            -- A row whose other unique key is taken by a different event
+            -- would abort the whole INSERT, so it is left out
+            WHERE NOT EXISTS (
+                SELECT 1 FROM events e
+                WHERE (e.gdacs_id = s.gdacs_id OR e.usgs_id = s.usgs_id OR e.eonet_id = s.eonet_id)
+                  AND e.{conflict_key} IS DISTINCT FROM s.{conflict_key}
+            )
+            ORDER BY {conflict_key}
+        ),
+        previous AS (
+            SELECT e.{conflict_key}, e.active
+            FROM events e
+            JOIN incoming i ON i.{conflict_key} = e.{conflict_key}
+        ),
+        merged AS (
+            INSERT INTO events (gdacs_id, usgs_id, eonet_id, title, event_type, severity, lat, lon,
+                                event_date, country, affected_population, last_seen_in_feed)
+            SELECT gdacs_id, usgs_id, eonet_id, title, event_type::event_type_enum, severity::severity_enum,
+                   lat, lon, COALESCE(event_date, now()), country, COALESCE(affected_population, 0), now()
+            FROM incoming
+            ON CONFLICT ({conflict_key}) DO UPDATE SET last_seen_in_feed = now(), active = true
+            RETURNING id, gdacs_id, usgs_id, eonet_id, title, event_type, severity, lat, lon, event_date,
+                      (xmax = 0) AS inserted
+        )
+        SELECT m.*, (NOT m.inserted AND p.active IS false) AS reactivated, false AS duplicate
+        FROM merged m
+        LEFT JOIN previous p ON p.{conflict_key} = m.{conflict_key}
+    """
+
+def _record_key(record: tuple, source: str) -> str:
+    """Value of the record's conflict key: usgs_id for USGS, else its (possibly synthetic) gdacs_id."""
+    return record[1] if source == "usgs" else record[0]
+
+def _split_duplicates(records: list, source: str) -> tuple[list, list]:
+    """Separate records that belong to an event another feed already created.
+    Records whose own key is already stored, including as another event's
+    usgs_id or eonet_id alias, always take the normal merge path."""
+    fresh, duplicates = [], []
+    for record in records:
+        if event_index.owner(_record_key(record, source)):
+            fresh.append(record)
+            continue
+        _, _, _, event_type, _, lat, lon, event_date, _, _ = record
+        match = event_index.find_duplicate(source, event_type, lat, lon, event_date)
+        if match:
+            event_index.claim(match, source)
+            duplicates.append((match, record))
+        else:
+            fresh.append(record)
+    return fresh, duplicates
+
+async def _merge_duplicates(duplicates: list, source: str) -> list:
+    """Fold duplicate records into their existing events in one UPDATE.
+
+    The existing row adopts the incoming feed key where it has none (a USGS or
+    EONET id, or a real GDACS id replacing a synthetic usgs_/eonet_ one), so
+    later polls of that feed hit it through the ordinary ON CONFLICT path
+    rather than being matched again by location. Severity and affected
+    population only ever go up.
+    """
+    return await fetch("""
+        UPDATE events e SET
+            gdacs_id = CASE
+                WHEN $6 = 'gdacs' AND (e.gdacs_id LIKE 'usgs\\_%' OR e.gdacs_id LIKE 'eonet\\_%')
+                THEN v.gdacs_id ELSE e.gdacs_id END,
+            usgs_id = COALESCE(e.usgs_id, v.usgs_id),
+            eonet_id = CASE WHEN $6 = 'eonet' THEN COALESCE(e.eonet_id, v.gdacs_id) ELSE e.eonet_id END,
+            severity = GREATEST(e.severity, v.severity::severity_enum),
+            affected_population = GREATEST(e.affected_population, COALESCE(v.affected_population, 0)),
+            last_seen_in_feed = now(),
+            active = true
+        FROM unnest($1::uuid[], $2::text[], $3::text[], $4::text[], $5::int[])
+            AS v(id, gdacs_id, usgs_id, severity, affected_population)
+        WHERE e.id = v.id
+        RETURNING e.id, e.gdacs_id, e.usgs_id, e.eonet_id, e.title, e.event_type, e.severity, e.lat, e.lon,
+                  e.event_date, false AS inserted, false AS reactivated, true AS duplicate
+    """,
+        [event_id for event_id, _ in duplicates],
+        [r[0] for _, r in duplicates],
+        [r[1] for _, r in duplicates],
+        [r[4] for _, r in duplicates],
+        [r[9] for _, r in duplicates],
+        source,
+    )
+
+@pooled("background")
+async def rebuild_event_index():
+    """Load every active event into the duplicate index (startup, after deactivation)."""
+    rows = await fetch("""
+        SELECT id, gdacs_id, usgs_id, eonet_id, event_type, lat, lon, event_date
+        FROM events WHERE active = true
+    """)
+    event_index.clear()
+    for row in rows:
+        event_index.add(row["id"], row["event_type"], row["lat"], row["lon"],
+                        row["event_date"], row["gdacs_id"], row["usgs_id"], row["eonet_id"])
+    logger.info(f"Event duplicate index rebuilt: {len(event_index)} active events")
+
+async def _report_merge(source: str, merged: list, skipped: int = 0):
+    """Log a merge result and push the event list to clients if anything changed."""
+    inserted = [r for r in merged if r["inserted"]]
+    reactivated = [r for r in merged if r["reactivated"]]
+    duplicates = [r for r in merged if r["duplicate"]]
+    
+    for row in inserted:
+        logger.info(f"New event added: {row['title']} ({row['event_type']}, {row['severity']})")
+    for row in duplicates:
+        logger.info(f"{source} entry merged into existing event: {row['title']} ({row['id']})")
+    
+    logger.info(
+        f"{source} poll: merged {len(merged)} events "
+        f"({len(inserted)} new, {len(reactivated)} reactivated, {len(duplicates)} cross-feed duplicates, "
+        f"{len(merged) - len(inserted) - len(reactivated) - len(duplicates)} refreshed, "
+        f"{skipped} unchanged skipped)"
+    )
+    
+    if inserted or reactivated or duplicates:
+        await _publish_events_delta()
+
+async def _publish_events_delta():
+    """Rebuild the cached event list and push what changed to connected clients."""
+    delta = await events_snapshot.refresh()
+    if delta:
+        from shared.ws import manager
+        # Other workers rebuild from their own cache rather than receive the delta
+        await manager.broadcast("events_delta", delta, ref={"kind": "events", "version": delta["version"]})
 
+@pooled("background")
 async def deactivate_old_events():
     """Mark events not seen in GDACS feed for 72h as inactive."""
     cutoff = datetime.now(timezone.utc) - timedelta(hours=72)
@@ -190,3 +389,6 @@ async def deactivate_old_events():
         cutoff
     )
     logger.info(f"Deactivated old events: {result}")
+    await rebuild_event_index()
+    if result != "UPDATE 0":
+        await _publish_events_delta()
@@ -0,0 +1,155 @@
+"""Event Monitor — cached, versioned /api/events FeatureCollection.
+
+The active-event list is rebuilt only when an ingestion run reports changed
+rows. Each rebuild that alters the output takes a new `version` and yields a
+delta (added / updated / removed features) for WebSocket clients; HTTP clients
+get the pre-serialized bytes with an ETag.
+
+Versions come from the `events_snapshot_version` sequence so all workers agree
+on them: the worker that ingested takes the next value and the others rebuild
+at that version when the bus relays the delta by reference.
+
+The last EVENTS_DELTA_HISTORY deltas are kept so a reconnecting WebSocket
+client that sends its last version gets only what changed since then.
+"""
+import os
+import asyncio
+import hashlib
+import json
+import logging
+from collections import deque
+from typing import Optional
+from shared.db import fetch, fetchval
+from shared.ws import manager
+
+logger = logging.getLogger(__name__)
+
+EVENTS_DELTA_HISTORY = int(os.getenv("EVENTS_DELTA_HISTORY", "50"))
+
+class EventsSnapshot:
+    def __init__(self):
+        self.version = 0
+        self.body: Optional[bytes] = None
+        self.etag: Optional[str] = None
+        self.data: Optional[dict] = None
+        self.message: Optional[str] = None  # pre-encoded events_update for new sockets
+        self._features: dict[str, dict] = {}
+        self._history: deque = deque(maxlen=EVENTS_DELTA_HISTORY)  # (from_version, delta)
+        self._lock = asyncio.Lock()
+        self._build_lock = asyncio.Lock()
+
+    async def current(self) -> "EventsSnapshot":
+        """Return the cached snapshot, building it on first use."""
+        if self.body is None:
+            # A reconnect storm right after startup builds it once, not per socket
+            async with self._build_lock:
+                if self.body is None:
+                    await self.refresh(await fetchval("SELECT last_value FROM events_snapshot_version"))
+        return self
+
+    def since(self, version: int) -> Optional[dict]:
+        """Everything that changed after `version`, as one delta. None when the
+        history no longer reaches back that far and the client needs a full snapshot."""
+        if version > self.version or self.body is None:
+            return None
+        newer = [(start, delta) for start, delta in self._history if delta["version"] > version]
+        if newer and newer[0][0] > version:
+            return None
+        if not newer and version != self.version:
+            return None
+        
+        changed, removed = set(), set()
+        for _, delta in newer:
+            changed.update(f["id"] for f in delta["added"] + delta["updated"])
+            removed.update(delta["removed"])
+        return {
+            "version": self.version,
+            "added": [],
+            "updated": [f for fid, f in self._features.items() if fid in changed],
+            "removed": [fid for fid in removed if fid not in self._features],
+            "order": list(self._features),
+        }
+
+    async def refresh(self, version: Optional[int] = None) -> Optional[dict]:
+        """Reload active events. Returns the delta if anything changed, else None.
+        Without a version, a change takes the next one from the shared sequence."""
+        async with self._lock:
+            features = await _load_features()
+            by_id = {f["id"]: f for f in features}
+            
+            added = [f for fid, f in by_id.items() if fid not in self._features]
+            updated = [f for fid, f in by_id.items() if fid in self._features and self._features[fid] != f]
+            removed = [fid for fid in self._features if fid not in by_id]
+            order_changed = list(by_id) != list(self._features)
+            
+            if self.body is not None and not (added or updated or removed or order_changed):
+                return None
+            
+            if version is None:
+                version = await fetchval("SELECT nextval('events_snapshot_version')")
+            previous = self.version
+            self.version = max(self.version, version)
+            self._features = by_id
+            self.data = {"type": "FeatureCollection", "version": self.version, "features": features}
+            features_json = json.dumps(features, default=str)
+            self.body = (
+                f'{{"type": "FeatureCollection", "version": {self.version}, "features": '
+            ).encode() + features_json.encode() + b"}"
+            # Content hash, not version, so the tag is stable across processes
+            self.etag = f'"{hashlib.blake2b(features_json.encode(), digest_size=12).hexdigest()}"'
+            self.message = (
+                '{"type": "events_update", "topic": "events", "data": ' + self.body.decode() + "}"
+            )
+            
+            delta = {
+                "version": self.version,
+                "added": added,
+                "updated": updated,
+                "removed": removed,
+                "order": list(by_id),
+            }
+            if previous:
+                self._history.append((previous, delta))
+            return delta
+
+async def _load_features() -> list[dict]:
+    """All active events as GeoJSON features, sorted by severity then recency."""
+    rows = await fetch("""
+        SELECT id, gdacs_id, usgs_id, title, event_type, severity,
+               lat, lon, event_date, country, country_code,
+               affected_population, active, created_at
+        FROM events
+        WHERE active = true
+        ORDER BY 
+            CASE severity WHEN 'red' THEN 0 WHEN 'orange' THEN 1 ELSE 2 END,
+            event_date DESC
+        LIMIT 100
+    """)
+    
+    features = []
+    for row in rows:
+        features.append({
+            "type": "Feature",
+            "id": row["id"],
+            "geometry": {"type": "Point", "coordinates": [row["lon"], row["lat"]]},
+            "properties": {
+                "id": row["id"],
+                "gdacs_id": row["gdacs_id"],
+                "title": row["title"],
+                "event_type": row["event_type"],
+                "severity": row["severity"],
+                "lat": row["lat"],
+                "lon": row["lon"],
+                "event_date": row["event_date"].isoformat() if row["event_date"] else None,
+                "country": row["country"],
+                "affected_population": row["affected_population"],
+            }
+        })
+    return features
+
+events_snapshot = EventsSnapshot()
+
+async def _resolve_events_delta(ref: dict) -> Optional[dict]:
+    return await events_snapshot.refresh(ref["version"])
+
+manager.register_ref("events", _resolve_events_delta)
@@ -43,7 +43,7 @@ async def list_submissions(event_id: str):
             "type": "Feature",
             "geometry": {"type": "Point", "coordinates": [row["lon"] or 0, row["lat"] or 0]},
             "properties": {
-                "id": str(row["id"]),
+                "id": row["id"],
                 "damage_class": row["damage_class"],
                 "damage_type": row["damage_type"],
                 "confidence": row["ai_confidence"],
@@ -1,7 +1,6 @@
 """Ground Truth — crowdsourced field photo submissions with AI classification."""
 import os
 import io
-import json
 import uuid
 import hashlib
 import logging
@@ -62,8 +61,27 @@ async def submit_ground_report(
          confidence, description[:500] if description else None,
          photo_key, photo_url, satellite_class, agreement, disputed, ip_hash)
     
+    # Push the new submission to dashboards following this event
+    from shared.ws import manager
+    topic = f"event:{event_id}:ground_truth"
+    if manager.has_subscribers(topic):
+        await manager.broadcast("ground_truth_submission", {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lon, lat]},
+            "properties": {
+                "id": report_id["id"],
+                "damage_class": damage_class,
+                "damage_type": DAMAGE_CLASSES.get(damage_class, "unknown"),
+                "confidence": confidence,
+                "photo_url": photo_url,
+                "satellite_class": satellite_class,
+                "agreement": agreement,
+                "disputed": disputed,
+            }
+        }, topic=topic)
+    
     return {
-        "id": str(report_id["id"]),
+        "id": report_id["id"],
         "damage_class": damage_class,
         "damage_label": DAMAGE_CLASSES.get(damage_class, "unknown"),
         "confidence": confidence,
@@ -123,31 +141,36 @@ async def _classify_damage(photo: bytes) -> tuple[int, float]:
 
 async def _cross_validate(event_id: str, lat: float, lon: float, field_class: int) -> tuple:
     """Compare field report with satellite assessment for same location."""
-    analysis = await fetchrow("""
-        SELECT id, damage_geojson FROM analyses 
-        WHERE event_id = $1::uuid AND status IN ('complete', 'assessing_buildings', 'generating_report')
-        ORDER BY created_at DESC LIMIT 1
-    """, event_id)
-    
-    if not analysis or not analysis["damage_geojson"]:
-        return None, None  # No satellite data yet
+    # Zones of the event's latest analysis whose bounding box holds the point,
+    # found through the GiST index; the exact test is the ray cast below, the
+    # same one building assessment uses, so a point on an edge or in a hole
+    # gets the answer it got when damage_geojson was scanned
+    zones = await fetch("""
+        WITH latest AS (
+            SELECT id FROM analyses
+            WHERE event_id = $1::uuid AND status IN ('complete', 'assessing_buildings', 'generating_report')
+            ORDER BY created_at DESC LIMIT 1
+        )
+        SELECT z.severity_class, ST_AsGeoJSON(z.geom)::json AS geometry
+        FROM damage_zones z
+        JOIN latest ON z.analysis_id = latest.id
+        WHERE z.geom && ST_SetSRID(ST_MakePoint($3, $2), 4326)
+        ORDER BY z.feature_index
+    """, event_id, lat, lon)
     
-    geojson = analysis["damage_geojson"]
-    if isinstance(geojson, str):
-        geojson = json.loads(geojson)
+    # The first zone that contains the point
+    for zone in zones:
+        if _point_in_geometry(lon, lat, zone["geometry"]):
+            sat_class = min(zone["severity_class"] // 2, 3)
+            agree = abs(sat_class - field_class) <= 1
+            return sat_class, agree
     
-    # Check if point falls within any damage polygon
-    for feature in geojson.get("features", []):
-        props = feature.get("properties", {})
-        geom = feature.get("geometry", {})
-        if geom.get("type") == "Polygon":
-            coords = geom["coordinates"][0]
-            if _point_in_polygon(lon, lat, coords):
-                sat_class = min(props.get("severity_class", 0) // 2, 3)
-                agree = abs(sat_class - field_class) <= 1
-                return sat_class, agree
-    
-    return None, None
+    return None, None  # No satellite data yet, or no damage mapped here
+
+def _point_in_geometry(px, py, geom) -> bool:
+    """Point in a GeoJSON Polygon: inside the outer ring and outside every hole."""
+    outer, *holes = geom["coordinates"]
+    return _point_in_polygon(px, py, outer) and not any(_point_in_polygon(px, py, h) for h in holes)
 
 def _point_in_polygon(px, py, polygon) -> bool:
     """Ray casting algorithm for point-in-polygon."""
@@ -1,18 +1,18 @@
 """Recovery Tracker — monitors new satellite passes and tracks recovery over time."""
-import json
 import logging
 from datetime import datetime, timezone
-from shared.db import fetch, fetchrow, execute
+from shared.db import fetch, fetchrow, execute, pooled
 from modules.satellite_pipeline.service import trigger_pipeline
 
 logger = logging.getLogger(__name__)
 
+@pooled("background")
 async def check_new_passes():
     """For each active event, check if a new satellite pass is available."""
     active_events = await fetch("SELECT id, lat, lon, event_type FROM events WHERE active = true")
     
     for event in active_events:
-        event_id = str(event["id"])
+        event_id = event["id"]
         try:
             latest_analysis = await fetchrow("""
                 SELECT recovery_history FROM analyses 
@@ -33,8 +33,6 @@ async def check_new_passes():
 async def _append_recovery_snapshot(event_id: str, analysis):
     """Compute and append a recovery snapshot."""
     recovery_history = analysis.get("recovery_history") or []
-    if isinstance(recovery_history, str):
-        recovery_history = json.loads(recovery_history)
     
     if not recovery_history:
         return
@@ -63,12 +61,15 @@ async def _append_recovery_snapshot(event_id: str, analysis):
         if new_score < last_score:
             await execute("""
                 INSERT INTO alert_log (event_id, alert_type, severity, message, metadata)
-                VALUES ($1::uuid, 'severity_escalation', 'critical', $2, $3::jsonb)
+                VALUES ($1::uuid, 'severity_escalation', 'critical', $2, $3)
             """, event_id, 
             f"Damage worsening detected: recovery score dropped from {last_score:.1f}% to {new_score:.1f}%",
-            json.dumps({"before": last_score, "after": new_score}))
+            {"before": last_score, "after": new_score})
         
         await execute("""
-            UPDATE analyses SET recovery_history = $1::jsonb
+            UPDATE analyses SET recovery_history = $1
             WHERE event_id = $2::uuid AND status = 'complete'
-        """, json.dumps(recovery_history), event_id)
+        """, recovery_history, event_id)
+        
+        from shared.ws import manager
+        await manager.broadcast("recovery_snapshot", snapshot, topic=f"event:{event_id}:recovery")
@@ -0,0 +1,151 @@
+"""
+Satellite Pipeline — on-disk cache of decoded Sentinel Hub rasters.
+
+Entries are content-addressed: the key hashes everything that determines
+the pixels (bbox, time range, collection, evalscript, output size), so a
+rerun over the same area and baseline reads from disk and spends no
+processing units. Each entry is a plain .npy file, opened memory-mapped so
+workers read only the pages they touch, with a .json sidecar describing
+the request.
+
+Several workers and processes may share the directory:
+- writes go to a temporary file that is renamed into place, so an entry
+  is either absent or complete
+- eviction tolerates files another process already removed
+- an evicted file stays readable through mappings already open on it
+
+The cache is bounded by IMAGERY_CACHE_MAX_BYTES and evicts least recently
+used entries; a hit refreshes the entry's mtime, which is what LRU orders on.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import numpy as np
+
+from modules.satellite_pipeline import raster
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("IMAGERY_CACHE_DIR", os.path.join(tempfile.gettempdir(), "sentinel-imagery"))
+CACHE_MAX_BYTES = int(os.getenv("IMAGERY_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))  # 0 disables the cache
+
+def enabled() -> bool:
+    return CACHE_MAX_BYTES > 0
+
+def cache_key(bbox: list, time_range: tuple, collection: str, evalscript: str, width: int, height: int,
+              as_of: str | None = None) -> str:
+    """as_of pins an entry to one run: a time window still open can gain a
+    pass, so its pixels are only reusable by the run that fetched them."""
+    request = {
+        # Tile bboxes are derived arithmetically; rounding absorbs float noise
+        "bbox": [round(v, 9) for v in bbox],
+        "time_range": list(time_range),
+        "collection": collection,
+        "evalscript": hashlib.sha256(evalscript.encode()).hexdigest(),
+        "size": [width, height],
+    }
+    if as_of is not None:
+        request["as_of"] = as_of
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key[:2], key + ".npy")
+
+def get(key: str) -> str | None:
+    """Path of the cached array for key, or None. Marks the entry as recently used."""
+    if not enabled():
+        return None
+    path = _path(key)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+def open_array(path: str) -> np.ndarray:
+    return np.load(path, mmap_mode="r")
+
+def put(key: str, tiff: bytes, metadata: dict) -> str | None:
+    """Decode a fetched TIFF and store it under key. Returns the entry's
+    path, or None when the cache is disabled or the write failed."""
+    try:
+        array = raster.read_tiff(tiff)
+    except ValueError as e:
+        logger.warning(f"Imagery cache write failed for {key[:12]}: {e}")
+        return None
+    return put_array(key, array, metadata)
+
+def put_array(key: str, array: np.ndarray, metadata: dict) -> str | None:
+    """Store an array under key, e.g. a derived raster such as a class mosaic."""
+    if not enabled():
+        return None
+    path = _path(key)
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        metadata = {**metadata, "shape": list(array.shape), "dtype": array.dtype.str, "stored_at": time.time()}
+        _write_atomic(path[:-4] + ".json", lambda f: f.write(json.dumps(metadata).encode()))
+        # The .npy is renamed last: its presence is what makes the entry visible
+        _write_atomic(path, lambda f: np.save(f, array, allow_pickle=False))
+    except OSError as e:
+        logger.warning(f"Imagery cache write failed for {key[:12]}: {e}")
+        return None
+    evict(CACHE_MAX_BYTES)
+    return path
+
+def _write_atomic(path: str, write):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+def _entries() -> list[tuple[float, int, str]]:
+    """(mtime, bytes, path) of every cached array."""
+    entries = []
+    try:
+        shards = list(os.scandir(CACHE_DIR))
+    except FileNotFoundError:
+        return entries
+    for shard in shards:
+        if not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            if entry.name.endswith(".npy"):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    return entries
+
+def evict(max_bytes: int) -> int:
+    """Remove least recently used entries until the cache fits max_bytes. Returns bytes freed."""
+    entries = sorted(_entries())
+    excess = sum(size for _, size, _ in entries) - max_bytes
+    freed = 0
+    for _, size, path in entries:
+        if freed >= excess:
+            break
+        for victim in (path, path[:-4] + ".json"):
+            try:
+                os.unlink(victim)
+            except FileNotFoundError:
+                pass
+        freed += size
+    if freed:
+        logger.info(f"Imagery cache evicted {freed / 1e6:.0f} MB")
+    return freed
+
+def usage() -> dict:
+    entries = _entries()
+    return {"entries": len(entries), "bytes": sum(size for _, size, _ in entries), "max_bytes": CACHE_MAX_BYTES}
@@ -0,0 +1,221 @@
+"""
+Satellite Pipeline — raster engine.
+
+Decodes the FLOAT32 GeoTIFFs returned by the Sentinel Hub Process API into
+numpy arrays, computes the pre/post change index (dNBR for fire and
+earthquake, dNDWI for water) with nodata and cloud masking, classifies each
+pixel into the pipeline's severity_class buckets and derives the `stats`
+block from the classified pixels.
+
+Each TIFF carries two bands per pixel: the spectral index and a validity
+flag (dataMask with SCL cloud/shadow classes removed).
+"""
+import struct
+import zlib
+import numpy as np
+
+NODATA_CLASS = 255
+
+# severity_class -> label, matching the damage GeoJSON properties
+SEVERITY_LABELS = {
+    5: "high_severity",
+    4: "moderate_high",
+    3: "moderate_low",
+    2: "low_severity",
+    0: "unburned",
+}
+SEVERITY_COLORS = {5: "#8B0000", 4: "#FF4500", 3: "#FFA500", 2: "#FFFF00", 0: "#006400"}
+
+# Lower bounds of classes 2, 3, 4, 5 on the change index. dNBR follows the
+# USGS burn severity breaks; dNDWI uses the equivalent rise in surface water.
+THRESHOLDS = {
+    "nbr": (0.10, 0.27, 0.44, 0.66),
+    "ndwi": (0.05, 0.15, 0.30, 0.50),
+}
+_CLASS_VALUES = np.array([0, 2, 3, 4, 5], dtype=np.uint8)
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+# ── TIFF decoding ────────────────────────────────────────────
+
+_TAG_WIDTH, _TAG_HEIGHT, _TAG_BITS, _TAG_COMPRESSION = 256, 257, 258, 259
+_TAG_STRIP_OFFSETS, _TAG_SAMPLES, _TAG_ROWS_PER_STRIP, _TAG_STRIP_COUNTS = 273, 277, 278, 279
+_TAG_PLANAR, _TAG_PREDICTOR = 284, 317
+_TAG_TILE_WIDTH, _TAG_TILE_LENGTH, _TAG_TILE_OFFSETS, _TAG_TILE_COUNTS = 322, 323, 324, 325
+_TAG_SAMPLE_FORMAT = 339
+_FIELD_TYPES = {1: "B", 3: "H", 4: "I", 16: "Q"}  # BYTE, SHORT, LONG, LONG8
+
+def _read_ifd(data, order: str) -> dict:
+    (offset,) = struct.unpack_from(order + "I", data, 4)
+    (count,) = struct.unpack_from(order + "H", data, offset)
+    tags = {}
+    for i in range(count):
+        tag, ftype, n, value = struct.unpack_from(order + "HHI4s", data, offset + 2 + i * 12)
+        fmt = _FIELD_TYPES.get(ftype)
+        if fmt is None:
+            continue  # ASCII, RATIONAL, GeoTIFF doubles — not needed to decode pixels
+        size = struct.calcsize(fmt) * n
+        if size <= 4:
+            values = struct.unpack_from(order + fmt * n, value)
+        else:
+            (pointer,) = struct.unpack(order + "I", value)
+            values = struct.unpack_from(order + fmt * n, data, pointer)
+        tags[tag] = values
+    return tags
+
+def read_tiff(data: bytes) -> np.ndarray:
+    """Decode a FLOAT32 TIFF into a (height, width, bands) array.
+
+    An uncompressed image stored as one contiguous run of strips — what
+    Sentinel Hub returns — is returned as a read-only view over `data`
+    without copying. Deflate-compressed, tiled or band-planar files are
+    assembled into a new array.
+    """
+    order = {b"II": "<", b"MM": ">"}.get(bytes(data[:2]))
+    if order is None or struct.unpack_from(order + "H", data, 2)[0] != 42:
+        raise ValueError("Not a classic TIFF")
+    tags = _read_ifd(data, order)
+
+    width, height = tags[_TAG_WIDTH][0], tags[_TAG_HEIGHT][0]
+    bands = tags.get(_TAG_SAMPLES, (1,))[0]
+    if tags.get(_TAG_SAMPLE_FORMAT, (1,))[0] != 3 or tags.get(_TAG_BITS, (32,))[0] != 32:
+        raise ValueError("Expected FLOAT32 samples")
+    compression = tags.get(_TAG_COMPRESSION, (1,))[0]
+    if compression not in (1, 8, 32946):
+        raise ValueError(f"Unsupported TIFF compression {compression}")
+    if tags.get(_TAG_PREDICTOR, (1,))[0] != 1:
+        raise ValueError("TIFF predictors are not supported")
+    planar = tags.get(_TAG_PLANAR, (1,))[0] == 2
+    dtype = np.dtype(order + "f4")
+
+    if _TAG_TILE_OFFSETS in tags:
+        offsets, counts = tags[_TAG_TILE_OFFSETS], tags[_TAG_TILE_COUNTS]
+        block_w, block_h = tags[_TAG_TILE_WIDTH][0], tags[_TAG_TILE_LENGTH][0]
+    else:
+        offsets, counts = tags[_TAG_STRIP_OFFSETS], tags[_TAG_STRIP_COUNTS]
+        block_w, block_h = width, tags.get(_TAG_ROWS_PER_STRIP, (height,))[0]
+
+    total = width * height * bands * 4
+    contiguous = all(offsets[i] + counts[i] == offsets[i + 1] for i in range(len(offsets) - 1))
+    if compression == 1 and block_w == width and not planar and contiguous and sum(counts) >= total:
+        pixels = np.frombuffer(data, dtype=dtype, count=width * height * bands, offset=offsets[0])
+        return pixels.reshape(height, width, bands)
+
+    out = np.empty((bands, height, width) if planar else (height, width, bands), dtype=np.float32)
+    blocks_across = -(-width // block_w)
+    blocks_down = -(-height // block_h)
+    per_plane = blocks_across * blocks_down
+    for i, (offset, count) in enumerate(zip(offsets, counts)):
+        raw = data[offset:offset + count]
+        if compression != 1:
+            raw = zlib.decompress(raw)
+        plane, index = divmod(i, per_plane)
+        row, col = divmod(index, blocks_across)
+        y0, x0 = row * block_h, col * block_w
+        rows = min(block_h, height - y0)
+        cols = min(block_w, width - x0)
+        samples = 1 if planar else bands
+        block = np.frombuffer(raw, dtype=dtype)[:block_h * block_w * samples]
+        block = block.reshape(-1, block_w, samples)[:rows, :cols]
+        if planar:
+            out[plane, y0:y0 + rows, x0:x0 + cols] = block[..., 0]
+        else:
+            out[y0:y0 + rows, x0:x0 + cols] = block
+    return np.moveaxis(out, 0, -1) if planar else out
+
+# ── Change detection ─────────────────────────────────────────
+
+def change_index(pre: np.ndarray, post: np.ndarray, index: str) -> tuple[np.ndarray, np.ndarray]:
+    """Per-pixel change from (H, W, 2) [index, valid] rasters.
+
+    Returns (delta, valid). delta is oriented so larger means more damage:
+    pre − post for NBR (vegetation loss), post − pre for NDWI (new water).
+    """
+    if pre.shape != post.shape:
+        raise ValueError(f"Pre/post raster shapes differ: {pre.shape} vs {post.shape}")
+    pre_index, post_index = pre[..., 0], post[..., 0]
+    if index == "nbr":
+        delta = np.subtract(pre_index, post_index, dtype=np.float32)
+    else:
+        delta = np.subtract(post_index, pre_index, dtype=np.float32)
+
+    valid = pre[..., 1] > 0.5
+    valid &= post[..., 1] > 0.5
+    valid &= np.isfinite(delta)  # 0/0 index on dark or saturated pixels
+    return delta, valid
+
+def classify(delta: np.ndarray, valid: np.ndarray, index: str) -> np.ndarray:
+    """Map change values to severity_class (0, 2, 3, 4, 5); masked pixels get NODATA_CLASS."""
+    # Ascending overwrites instead of np.digitize, whose int64 bin indices
+    # would cost 8 bytes per pixel on top of the uint8 result
+    classes = np.zeros(delta.shape, dtype=np.uint8)
+    for value, lower in zip(_CLASS_VALUES[1:], THRESHOLDS[index]):
+        classes[delta >= lower] = value
+    classes[~valid] = NODATA_CLASS
+    return classes
+
+def pixel_row_areas_km2(bbox: list, height: int, width: int) -> np.ndarray:
+    """Area of one pixel in each image row (top row first) for a WGS84 bbox."""
+    west, south, east, north = bbox
+    pixel_h_km = (north - south) / height * KM_PER_DEG_LAT
+    pixel_w_deg = (east - west) / width
+    row_lats = north - (np.arange(height) + 0.5) * (north - south) / height
+    return pixel_h_km * pixel_w_deg * KM_PER_DEG_LON * np.cos(np.radians(row_lats))
+
+def partial_stats(delta: np.ndarray, valid: np.ndarray, classes: np.ndarray, row_area: np.ndarray) -> dict:
+    """Additive sums behind the stats block, for one raster or one tile of it."""
+    valid_pixels = int(np.count_nonzero(valid))
+    return {
+        "class_area": {int(c): float(np.count_nonzero(classes == c, axis=1) @ row_area) for c in _CLASS_VALUES},
+        "valid_pixels": valid_pixels,
+        "pixels": int(classes.size),
+        # where= avoids materialising delta[valid]
+        "delta_sum": float(np.sum(delta, where=valid, dtype=np.float64)) if valid_pixels else 0.0,
+        "delta_max": float(np.max(delta, where=valid, initial=-np.inf)) if valid_pixels else -np.inf,
+    }
+
+def merge_stats(parts: list[dict], index: str) -> dict:
+    """The analyses `stats` block from the partial sums of every tile."""
+    class_area = {int(c): sum(p["class_area"][int(c)] for p in parts) for c in _CLASS_VALUES}
+    valid_pixels = sum(p["valid_pixels"] for p in parts)
+    pixels = sum(p["pixels"] for p in parts)
+    valid_area = sum(class_area.values())
+    affected_area = sum(a for c, a in class_area.items() if c >= 2)
+
+    def pct(area: float) -> float:
+        return round(100 * area / valid_area, 1) if valid_area else 0.0
+
+    mean_delta = max_delta = None
+    if valid_pixels:
+        mean_delta = round(sum(p["delta_sum"] for p in parts) / valid_pixels, 3)
+        max_delta = round(max(p["delta_max"] for p in parts), 3)
+
+    return {
+        "area_km2": round(affected_area, 2),
+        "assessed_km2": round(valid_area, 2),
+        "high_severity_pct": pct(class_area[5]),
+        "moderate_high_pct": pct(class_area[4]),
+        "moderate_low_pct": pct(class_area[3]),
+        "low_severity_pct": pct(class_area[2]),
+        "mean_dnbr": mean_delta if index == "nbr" else None,
+        "max_dnbr": max_delta if index == "nbr" else None,
+        "mean_dndwi": mean_delta if index == "ndwi" else None,
+        "flood_extent_km2": round(affected_area, 2) if index == "ndwi" else None,
+        "valid_pixel_pct": round(100 * valid_pixels / pixels, 1) if pixels else 0.0,
+        "pixels": pixels,
+        "sensor_used": "S2_L2A",
+        "assessment_method": "dNBR_classification" if index == "nbr" else "dNDWI_classification",
+    }
+
+def compute_stats(delta: np.ndarray, valid: np.ndarray, classes: np.ndarray, bbox: list, index: str) -> dict:
+    """Area and severity statistics from classified pixels."""
+    row_area = pixel_row_areas_km2(bbox, *classes.shape)
+    return merge_stats([partial_stats(delta, valid, classes, row_area)], index)
+
+def assess_change(pre_tiff: bytes, post_tiff: bytes, bbox: list, index: str) -> tuple:
+    """Decode both rasters and classify the change. Returns (classes, delta, valid, stats)."""
+    pre, post = read_tiff(pre_tiff), read_tiff(post_tiff)
+    delta, valid = change_index(pre, post, index)
+    classes = classify(delta, valid, index)
+    return classes, delta, valid, compute_stats(delta, valid, classes, bbox, index)
@@ -1,8 +1,8 @@
 """Satellite Pipeline API routes."""
-from fastapi import APIRouter, BackgroundTasks, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
-from shared.db import fetch, fetchrow
-from modules.satellite_pipeline.service import trigger_pipeline
+from shared.db import fetch, fetchrow, fetchval
+from shared.jobs import job_queue
 
 router = APIRouter(tags=["Satellite Pipeline"])
 
@@ -10,13 +10,14 @@ class TriggerRequest(BaseModel):
     event_id: str
 
 @router.post("/satellite/trigger")
-async def trigger_satellite(req: TriggerRequest, background_tasks: BackgroundTasks):
-    """Manually trigger satellite pipeline for an event."""
-    event = await fetchrow("SELECT id FROM events WHERE id = $1::uuid", req.event_id)
-    if not event:
+async def trigger_satellite(req: TriggerRequest):
+    """Queue the satellite pipeline for an event; a run already queued, in progress or
+    finished within JOB_DONE_DEDUPE_S is reused."""
+    queue_job_id, created = await job_queue.enqueue("satellite", req.event_id)
+    if queue_job_id is None:
         raise HTTPException(404, "Event not found")
-    background_tasks.add_task(trigger_pipeline, req.event_id)
-    return {"status": "triggered", "event_id": req.event_id}
+    return {"status": "queued" if created else "already_queued", "event_id": req.event_id,
+            "queue_job_id": queue_job_id}
 
 @router.get("/satellite/passes/{event_id}")
 async def get_passes(event_id: str):
@@ -53,6 +54,34 @@ async def get_analysis(analysis_id: str):
         raise HTTPException(404, "Analysis not found")
     return dict(row)
 
+@router.get("/satellite/analysis/{analysis_id}/zones")
+async def get_damage_zones(analysis_id: str, bbox: str | None = None, min_class: int = 0):
+    """Damage polygons as GeoJSON for map rendering, optionally only those
+    overlapping bbox (west,south,east,north) at or above min_class.
+    The FeatureCollection is assembled in the database and passed through."""
+    envelope = None
+    if bbox:
+        try:
+            envelope = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            envelope = []
+        if len(envelope) != 4:
+            raise HTTPException(400, "bbox must be west,south,east,north")
+    body = await fetchval("""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'features', COALESCE(json_agg(json_build_object(
+                'type', 'Feature',
+                'geometry', ST_AsGeoJSON(geom, 6)::json,
+                'properties', properties
+            ) ORDER BY feature_index), '[]'::json)
+        )::text
+        FROM damage_zones
+        WHERE analysis_id = $1::uuid AND severity_class >= $2
+          AND ($3::float8[] IS NULL OR geom && ST_MakeEnvelope($3[1], $3[2], $3[3], $3[4], 4326))
+    """, analysis_id, min_class, envelope)
+    return Response(content=body, media_type="application/json")
+
 @router.get("/satellite/module/health")
 async def satellite_health():
     from shared.quota import check_sentinel_quota
@@ -0,0 +1,213 @@
+"""
+Satellite Pipeline — Sentinel Hub client.
+
+One long-lived client per process:
+- the OAuth token is cached until shortly before it expires, and concurrent
+  callers share a single client-credentials exchange
+- Process API calls go over one pooled connection, HTTP/2 when the h2
+  package is installed, so concurrent tile requests multiplex on it
+- identical requests in flight (same content key as the imagery cache)
+  are coalesced into one call; only the caller that made it is charged
+- every call is logged to sentinel_quota_log with its unit cost, latency
+  and status, which is what the quota guard sums
+"""
+import os
+import time
+import asyncio
+import logging
+import httpx
+
+from shared.quota import record_sentinel_usage
+from modules.satellite_pipeline import imagery_cache, tiling
+
+logger = logging.getLogger(__name__)
+
+SENTINEL_HUB_BASE = os.getenv("SENTINEL_HUB_BASE_URL", "https://services.sentinelhub.com")
+SENTINEL_HUB_TOKEN_URL = os.getenv(
+    "SENTINEL_HUB_TOKEN_URL",
+    "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token",
+)
+SENTINEL_COLLECTION = "sentinel-2-l2a"
+TOKEN_EXPIRY_MARGIN_S = 60
+
+try:
+    import h2  # noqa: F401  (httpx speaks HTTP/2 only when h2 is installed)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+class SentinelHubClient:
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self._token: str | None = None
+        self._token_expires = 0.0
+        self._token_lock = asyncio.Lock()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._stats = {"calls": 0, "errors": 0, "coalesced": 0, "cache_hits": 0,
+                       "units": 0.0, "latency_ms_total": 0.0, "token_exchanges": 0}
+
+    def configured(self) -> bool:
+        return bool(os.getenv("SENTINEL_HUB_CLIENT_ID") and os.getenv("SENTINEL_HUB_CLIENT_SECRET"))
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            # Every tile of a job may have its pre and post request in flight at once
+            connections = 2 * tiling.FETCH_CONCURRENCY
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                timeout=httpx.Timeout(120, connect=10),
+                limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    # ── Auth ─────────────────────────────────────────────────
+
+    def _token_valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._token_expires
+
+    async def token(self, refresh: bool = False) -> str | None:
+        """A valid access token, exchanging credentials only when the cached one expires."""
+        if not self.configured():
+            logger.warning("Sentinel Hub credentials not configured — using mock data")
+            return None
+        if refresh:
+            self._token = None
+        if self._token_valid():
+            return self._token
+        async with self._token_lock:
+            if self._token_valid():
+                return self._token
+            start = time.perf_counter()
+            resp = await self._http().post(SENTINEL_HUB_TOKEN_URL, data={
+                "grant_type": "client_credentials",
+                "client_id": os.getenv("SENTINEL_HUB_CLIENT_ID"),
+                "client_secret": os.getenv("SENTINEL_HUB_CLIENT_SECRET"),
+            })
+            self._stats["token_exchanges"] += 1
+            await self._account("token", 0, start, resp.status_code, len(resp.content), None)
+            if resp.status_code != 200:
+                logger.warning(f"Sentinel Hub token exchange failed: HTTP {resp.status_code}")
+                return None
+            body = resp.json()
+            self._token = body.get("access_token")
+            self._token_expires = time.monotonic() + max(body.get("expires_in", 300) - TOKEN_EXPIRY_MARGIN_S, 0)
+        return self._token
+
+    # ── Process API ──────────────────────────────────────────
+
+    async def fetch_image(self, bbox: list, time_range: tuple, evalscript: str, width: int, height: int,
+                          cache: bool = True, job_id: str | None = None,
+                          as_of: str | None = None) -> tuple[bytes | str, float]:
+        """One FLOAT32 image as (TIFF bytes or imagery cache path, processing units spent).
+
+        Cache hits and requests that joined an identical one already in
+        flight cost nothing; the call that reached Sentinel Hub is charged.
+        as_of scopes the cache entry to one run (see imagery_cache.cache_key).
+        """
+        key = self.image_key(bbox, time_range, evalscript, width, height, as_of)
+        if cache:
+            cached = await asyncio.to_thread(imagery_cache.get, key)
+            if cached:
+                self._stats["cache_hits"] += 1
+                return cached, 0.0
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+            image, _ = await asyncio.shield(task)
+            return image, 0.0
+
+        task = asyncio.ensure_future(self._fetch(key, bbox, time_range, evalscript, width, height, cache, job_id))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._settled(key, t))
+        # Shielded: a caller giving up must not cancel a request others share
+        return await asyncio.shield(task)
+
+    def image_key(self, bbox: list, time_range: tuple, evalscript: str, width: int, height: int,
+                  as_of: str | None = None) -> str:
+        return imagery_cache.cache_key(bbox, time_range, SENTINEL_COLLECTION, evalscript, width, height, as_of)
+
+    def _settled(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Retrieve the outcome so a failure nobody waited for is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, key: str, bbox: list, time_range: tuple, evalscript: str, width: int, height: int,
+                     cache: bool, job_id: str | None) -> tuple[bytes | str, float]:
+        body = {
+            "input": {
+                "bounds": {"bbox": bbox, "properties": {"crs": "http://www.opengis.net/def/crs/EPSG/0/4326"}},
+                "data": [{"dataFilter": {"timeRange": {"from": time_range[0], "to": time_range[1]},
+                                         "mosaickingOrder": "leastCC"}, "type": SENTINEL_COLLECTION}]
+            },
+            # FLOAT32 TIFF keeps full index precision; JPEG would quantize it to 8 bits
+            "output": {"width": width, "height": height,
+                       "responses": [{"identifier": "default", "format": {"type": "image/tiff"}}]},
+            "evalscript": evalscript,
+        }
+        units = tiling.processing_units(width, height)
+
+        for attempt in range(2):
+            token = await self.token(refresh=attempt > 0)
+            if token is None:
+                raise RuntimeError("Sentinel Hub token unavailable")
+            start = time.perf_counter()
+            try:
+                resp = await self._http().post(
+                    f"{SENTINEL_HUB_BASE}/api/v1/process", json=body, headers={"Authorization": f"Bearer {token}"}
+                )
+            except httpx.HTTPError:
+                await self._account("process", 0, start, None, 0, job_id)
+                raise
+            # A token revoked before its expiry: refresh once and retry
+            if resp.status_code == 401 and attempt == 0:
+                await self._account("process", 0, start, resp.status_code, len(resp.content), job_id)
+                continue
+            break
+
+        # Only successful requests consume processing units
+        charged = units if resp.status_code == 200 else 0
+        await self._account("process", charged, start, resp.status_code, len(resp.content), job_id)
+        resp.raise_for_status()
+
+        image = resp.content
+        if cache:
+            metadata = {"bbox": bbox, "time_range": time_range, "collection": SENTINEL_COLLECTION,
+                        "width": width, "height": height}
+            path = await asyncio.to_thread(imagery_cache.put, key, image, metadata)
+            if path:
+                return path, units
+        return image, units
+
+    async def _account(self, kind: str, units: float, start: float, status: int | None,
+                       response_bytes: int, job_id: str | None):
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._stats["calls"] += 1
+        self._stats["units"] += units
+        self._stats["latency_ms_total"] += latency_ms
+        if status != 200:
+            self._stats["errors"] += 1
+        try:
+            await record_sentinel_usage(units, request_kind=kind, latency_ms=round(latency_ms),
+                                        status_code=status, response_bytes=response_bytes, job_id=job_id)
+        except Exception as e:
+            # Losing one accounting row must not fail a request that was already paid for
+            logger.error(f"Sentinel Hub usage not recorded ({units:.2f} units): {e}")
+
+    def stats(self) -> dict:
+        calls = self._stats["calls"]
+        return {
+            **self._stats,
+            "units": round(self._stats["units"], 2),
+            "mean_latency_ms": round(self._stats["latency_ms_total"] / calls, 1) if calls else None,
+            "in_flight": len(self._inflight),
+            "http2": HTTP2,
+        }
+
+hub = SentinelHubClient()
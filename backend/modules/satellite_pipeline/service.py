@@ -1,108 +1,217 @@
 """
 Satellite Pipeline — fetches Sentinel-2/SAR imagery, computes damage indices,
-saves simplified GeoJSON to analyses table. All imagery processed in RAM.
+saves simplified GeoJSON to analyses table. Runs as the stages of stages.py.
 """
 import os
 import io
-import json
 import uuid
+import hashlib
 import logging
 import asyncio
 import numpy as np
-import httpx
-from datetime import datetime, timezone, timedelta
-from typing import Optional
+from datetime import datetime, timezone, timedelta, date
 
-from shared.db import fetch, fetchrow, execute
+from shared.db import fetch, fetchrow, fetchval, execute, unit_of_work, pooled
 from shared.r2 import upload_bytes
-from shared.quota import check_sentinel_quota, record_sentinel_usage
+from shared.quota import check_sentinel_quota, sentinel_units_remaining
+from modules.satellite_pipeline import tiling, imagery_cache
+from modules.satellite_pipeline.sentinel_hub import hub
 
 logger = logging.getLogger(__name__)
 
-SENTINEL_HUB_BASE = "https://services.sentinelhub.com"
-
-async def get_sentinel_token() -> Optional[str]:
-    """Get OAuth2 token from Sentinel Hub."""
-    client_id = os.getenv("SENTINEL_HUB_CLIENT_ID")
-    client_secret = os.getenv("SENTINEL_HUB_CLIENT_SECRET")
-    if not client_id or not client_secret:
-        logger.warning("Sentinel Hub credentials not configured — using mock data")
-        return None
-    
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://identity.dataspace.copernicus.eu/auth/realms/CDSE/protocol/openid-connect/token",
-            data={
-                "grant_type": "client_credentials",
-                "client_id": client_id,
-                "client_secret": client_secret,
-            }
-        )
-        if resp.status_code == 200:
-            return resp.json().get("access_token")
-    return None
-
-async def trigger_pipeline(event_id: str):
-    """Main pipeline entry point for a single event."""
-    event = await fetchrow("SELECT * FROM events WHERE id = $1::uuid", event_id)
-    if not event:
-        logger.error(f"Event {event_id} not found")
-        return
-    
-    job_id = str(uuid.uuid4())[:8]
-    
-    # Create analysis record
-    analysis_id = await execute("""
-        INSERT INTO analyses (job_id, event_id, status)
-        VALUES ($1, $2::uuid, 'fetching_imagery')
-        RETURNING id
-    """, job_id, event_id)
-    
-    # Mark event as triggered
-    await execute("UPDATE events SET pipeline_triggered = true WHERE id = $1::uuid", event_id)
-    
-    # Check quota before proceeding
-    if not await check_sentinel_quota():
-        await execute(
-            "UPDATE analyses SET status = 'imagery_unavailable', error_message = 'Sentinel Hub quota reached' WHERE job_id = $1",
-            job_id
-        )
-        logger.warning(f"Sentinel Hub quota exceeded — skipping event {event_id}")
-        return
+# Half-size of the assessed area in degrees; floods and cyclones cover far more ground
+AOI_HALF_DEG = float(os.getenv("SENTINEL_AOI_HALF_DEG", "0.25"))
+AOI_HALF_DEG_LARGE = float(os.getenv("SENTINEL_AOI_HALF_DEG_LARGE", "0.75"))
+# Processing units one analysis may spend; larger areas are fetched coarser
+JOB_UNIT_BUDGET = float(os.getenv("SENTINEL_JOB_UNIT_BUDGET", "1000"))
+
+# damage_geojson's polygons as damage_zones rows, parsed from the stored
+# column so the blob is not sent twice
+SAVE_DAMAGE_ZONES = """
+    WITH inserted AS (
+        INSERT INTO damage_zones (analysis_id, feature_index, event_id, severity_class, delta_mean, properties, geom)
+        SELECT a.id, f.ordinality - 1, a.event_id,
+               COALESCE((f.feature->'properties'->>'severity_class')::smallint, 0),
+               COALESCE(f.feature->'properties'->>'dnbr_mean', f.feature->'properties'->>'dndwi_mean')::float,
+               COALESCE(f.feature->'properties', '{}'::jsonb),
+               ST_SetSRID(ST_GeomFromGeoJSON(f.feature->'geometry'), 4326)
+        FROM analyses a,
+             jsonb_array_elements(a.damage_geojson->'features') WITH ORDINALITY AS f(feature, ordinality)
+        WHERE a.id = $1::uuid AND f.feature->'geometry'->>'type' = 'Polygon'
+        RETURNING 1
+    )
+    SELECT count(*) FROM inserted
+"""
+
+@pooled("background")
+async def trigger_pipeline(event_id: str, job_id: str | None = None, final_attempt: bool = True):
+    """Main pipeline entry point for a single event.
+    
+    job_id names the analysis; a retry passing the same job_id resumes its
+    analysis at the stage it reached (see stages.py). Failures are recorded
+    on the analysis and re-raised so the job queue can retry them.
+    """
+    job_id = job_id or str(uuid.uuid4())[:8]
     
-    try:
-        token = await get_sentinel_token()
+    # Setup runs on one connection and commits as a whole: an event is never
+    # left marked as triggered without its analysis record. The connection is
+    # released before the imagery fetch.
+    async with unit_of_work(transaction=True):
+        event = await fetchrow("SELECT * FROM events WHERE id = $1::uuid", event_id)
+        if not event:
+            logger.error(f"Event {event_id} not found")
+            return
         
-        if token:
-            # Real pipeline
-            damage_geojson, stats = await _run_real_pipeline(event, token, job_id)
-        else:
-            # Mock pipeline for demo/development
-            damage_geojson, stats = _generate_mock_damage(event)
+        # Create analysis record, or pick up the one a previous attempt left
+        analysis = await fetchrow("""
+            INSERT INTO analyses (job_id, event_id, status)
+            VALUES ($1, $2::uuid, 'fetching_imagery')
+            ON CONFLICT (job_id) DO UPDATE SET error_message = NULL
+            RETURNING id, status
+        """, job_id, event_id)
         
-        # Generate thumbnails
-        pre_url = await _mock_thumbnail(event, "pre")
-        post_url = await _mock_thumbnail(event, "post")
+        # Mark event as triggered
+        await execute("UPDATE events SET pipeline_triggered = true WHERE id = $1::uuid", event_id)
         
-        # Save to analyses
+        # Check quota before spending any; later stages need none
+        if analysis["status"] == "fetching_imagery" and not await check_sentinel_quota():
+            await execute(
+                "UPDATE analyses SET status = 'imagery_unavailable', error_message = 'Sentinel Hub quota reached' WHERE job_id = $1",
+                job_id
+            )
+            logger.warning(f"Sentinel Hub quota exceeded — skipping event {event_id}")
+            return
+    
+    from modules.satellite_pipeline.stages import advance
+    await advance(str(analysis["id"]), final_attempt)
+
+# ── Stages ───────────────────────────────────────────────────
+
+async def fetch_imagery(analysis, event) -> tuple[dict, str | None]:
+    """Stage fetching_imagery: plan the AOI and pull every tile into the imagery cache.
+    Returns the artefacts the detection stage needs, which include the cache keys."""
+    if not await hub.token():
+        # Mock pipeline for demo/development
+        return {"source": "mock"}, None
+    
+    bbox = _aoi_bbox(event)
+    index = "nbr" if event["event_type"] in ("WF", "EQ") else "ndwi"
+    # Native 10 m where the quota allows, coarser when it does not
+    grid = tiling.affordable_plan(bbox, min(JOB_UNIT_BUDGET, await sentinel_units_remaining()))
+    if grid is None:
+        return {"source": "sentinel", "reason": "Sentinel Hub quota too low for this area"}, "imagery_unavailable"
+    
+    # The baseline ends the day before the event, so every rerun asks for the
+    # same pre-event pixels and finds them in the imagery cache. The post
+    # window is still open, so its pixels are pinned to this analysis.
+    artefacts = {
+        "source": "sentinel",
+        "index": index,
+        "bbox": grid["bbox"],
+        "resolution_m": grid["resolution_m"],
+        "time_ranges": {
+            "pre": _time_range(event["event_date"].date() - timedelta(days=1)),
+            "post": _time_range(date.today()),
+        },
+        "as_of": analysis["job_id"],
+        "as_of_date": date.today().isoformat(),
+    }
+    logger.info(
+        f"Job {analysis['job_id']}: {grid['width']}x{grid['height']} px at {grid['resolution_m']:g} m, "
+        f"{len(grid['tiles'])} tiles, ~{grid['units']:.0f} processing units"
+    )
+    if not imagery_cache.enabled():
+        return artefacts, None  # nowhere to keep tiles; detection fetches them as it goes
+    
+    fetch_tile, spent = _tile_fetcher(artefacts, analysis["job_id"])
+    fetching = asyncio.Semaphore(tiling.FETCH_CONCURRENCY)
+    
+    async def fetch_window(tile: dict) -> list[str]:
+        x0, y0, x1, y1 = tile["window"]
+        tile_bbox = tiling.window_bbox(grid, tile["window"])
+        async with fetching:
+            await asyncio.gather(*(fetch_tile(tile_bbox, x1 - x0, y1 - y0, phase) for phase in ("pre", "post")))
+        return [_image_key(artefacts, tile_bbox, x1 - x0, y1 - y0, phase) for phase in ("pre", "post")]
+    
+    artefacts["imagery"] = await asyncio.gather(*(fetch_window(t) for t in grid["tiles"]))
+    artefacts["units_spent"] = spent()
+    return artefacts, None
+
+async def detect_damage(analysis, event) -> tuple[dict, str | None]:
+    """Stage running_detection: classify and vectorize the fetched imagery into damage polygons."""
+    artefacts = analysis["artefacts"] or {}
+    job_id = analysis["job_id"]
+    found = {}
+    if artefacts.get("source") == "sentinel":
+        grid = tiling.plan(artefacts["bbox"], artefacts["resolution_m"])
+        fetch_tile, spent = _tile_fetcher(artefacts, job_id)
+        found["classes"] = hashlib.sha256(f"classes:{job_id}".encode()).hexdigest()
+        # Tiles evicted from the cache since the fetch stage are fetched again
+        damage_geojson, stats = await tiling.assess_tiled(grid, fetch_tile, artefacts["index"],
+                                                          classes_key=found["classes"])
+        found["units_refetched"] = spent()
+        logger.info(
+            f"Raster assessment for job {job_id}: {stats['area_km2']} km² affected, "
+            f"{stats['valid_pixel_pct']}% of pixels usable, {len(damage_geojson['features'])} damage polygons"
+        )
+    else:
+        damage_geojson, stats = _generate_mock_damage(event)
+    
+    # Generate thumbnails
+    pre_url = await _mock_thumbnail(event, "pre")
+    post_url = await _mock_thumbnail(event, "post")
+    
+    async with unit_of_work(transaction=True):
         await execute("""
             UPDATE analyses SET
-                status = 'assessing_buildings',
-                damage_geojson = $1::jsonb,
-                stats = $2::jsonb,
+                damage_geojson = $1,
+                stats = $2,
                 pre_thumbnail_url = $3,
                 post_thumbnail_url = $4
             WHERE job_id = $5
-        """, json.dumps(damage_geojson), json.dumps(stats), pre_url, post_url, job_id)
-        
-        logger.info(f"Pipeline complete for event {event_id}")
-        
-    except Exception as e:
-        logger.error(f"Pipeline failed for event {event_id}: {e}")
-        await execute(
-            "UPDATE analyses SET status = 'error', error_message = $1 WHERE job_id = $2",
-            str(e), job_id
-        )
+        """, damage_geojson, stats, pre_url, post_url, job_id)
+        # Zones of an earlier attempt go first; they share its primary keys
+        await execute("DELETE FROM damage_zones WHERE analysis_id = $1::uuid", str(analysis["id"]))
+        zones = await fetchval(SAVE_DAMAGE_ZONES, str(analysis["id"]))
+    found["damage_zones"] = zones
+    
+    from shared.ws import manager
+    await manager.broadcast("analysis_update", {
+        "job_id": job_id, "status": "assessing_buildings", "stats": stats,
+        "pre_thumbnail_url": pre_url, "post_thumbnail_url": post_url,
+    }, topic=f"event:{event['id']}:analysis")
+    return found, None
+
+def _aoi_bbox(event) -> list:
+    lat, lon = event["lat"], event["lon"]
+    half = AOI_HALF_DEG_LARGE if event["event_type"] in ("FL", "TC") else AOI_HALF_DEG
+    return [lon - half, max(lat - half, -85.0), lon + half, min(lat + half, 85.0)]
+
+def _script(index: str) -> str:
+    return _dnbr_script() if index == "nbr" else _ndwi_script()
+
+def _as_of(artefacts: dict, phase: str) -> str | None:
+    # A window still open when fetched can gain a pass later; pin it to this run
+    time_range = artefacts["time_ranges"][phase]
+    return artefacts["as_of"] if time_range[1][:10] >= artefacts["as_of_date"] else None
+
+def _image_key(artefacts: dict, tile_bbox: list, width: int, height: int, phase: str) -> str:
+    return hub.image_key(tile_bbox, tuple(artefacts["time_ranges"][phase]), _script(artefacts["index"]),
+                         width, height, _as_of(artefacts, phase))
+
+def _tile_fetcher(artefacts: dict, job_id: str):
+    """tiling fetch callable for a planned analysis, and a getter for the units it spent."""
+    script = _script(artefacts["index"])
+    spent = 0.0
+    
+    async def fetch_tile(tile_bbox: list, width: int, height: int, phase: str) -> bytes | str:
+        nonlocal spent
+        image, units = await hub.fetch_image(tile_bbox, tuple(artefacts["time_ranges"][phase]), script,
+                                             width, height, job_id=job_id, as_of=_as_of(artefacts, phase))
+        spent += units
+        return image
+    
+    return fetch_tile, lambda: round(spent, 3)
 
 def _generate_mock_damage(event) -> tuple:
     """Generate realistic mock damage GeoJSON for demo mode."""
@@ -167,69 +276,30 @@ def _generate_mock_damage(event) -> tuple:
     
     return geojson, stats
 
-async def _run_real_pipeline(event, token: str, job_id: str) -> tuple:
-    """Real Sentinel Hub pipeline — fetches and processes imagery."""
-    lat, lon = event["lat"], event["lon"]
-    bbox = [lon - 0.25, lat - 0.25, lon + 0.25, lat + 0.25]
-    
-    event_type = event["event_type"]
-    
-    # Choose processing script based event type
-    if event_type in ("WF", "EQ"):
-        script = _dnbr_script()
-    else:
-        script = _ndwi_script()
-    
-    # Fetch post-event imagery
-    post_data = await _fetch_sentinel_imagery(token, bbox, script, days_offset=0)
-    # Fetch pre-event baseline (30 days before)
-    pre_data = await _fetch_sentinel_imagery(token, bbox, script, days_offset=-30)
-    
-    await record_sentinel_usage(100)  # ~50 units per request x2
-    
-    # Process damage — simplified without actual rasterio in this stub
-    # In production: use rasterio to compute ndBr pixel classifications
-    damage_geojson, stats = _generate_mock_damage(event)  # Fallback to mock processing
-    
-    return damage_geojson, stats
-
-async def _fetch_sentinel_imagery(token: str, bbox: list, script: str, days_offset: int = 0) -> bytes:
-    """Fetch imagery from Sentinel Hub Process API."""
-    from datetime import date
-    target_date = (date.today() + timedelta(days=days_offset)).isoformat()
-    
-    body = {
-        "input": {
-            "bounds": {"bbox": bbox, "properties": {"crs": "http://www.opengis.net/def/crs/EPSG/0/4326"}},
-            "data": [{"dataFilter": {"timeRange": {"from": f"{target_date}T00:00:00Z", "to": f"{target_date}T23:59:59Z"}}, "type": "sentinel-2-l2a"}]
-        },
-        "output": {"width": 512, "height": 512, "responses": [{"identifier": "default", "format": {"type": "image/jpeg"}}]},
-        "evalscript": script
-    }
-    
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{SENTINEL_HUB_BASE}/api/v1/process",
-            json=body,
-            headers={"Authorization": f"Bearer {token}"},
-            timeout=60
-        )
-        resp.raise_for_status()
-        return resp.content
+def _time_range(end: date) -> tuple[str, str]:
+    # One day rarely has a clear pass; mosaic the least cloudy scene of the last 10
+    start = end - timedelta(days=10)
+    return f"{start.isoformat()}T00:00:00Z", f"{end.isoformat()}T23:59:59Z"
 
+# Band 2 is the validity mask: no data, cloud shadow (3), cloud (8, 9) and cirrus (10) are 0
 def _dnbr_script() -> str:
     return """//VERSION=3
-function setup() { return { input: ["B08", "B12"], output: { bands: 1 } }; }
+function setup() {
+    return { input: ["B08", "B12", "SCL", "dataMask"], output: { bands: 2, sampleType: "FLOAT32" } };
+}
 function evaluatePixel(sample) {
-    var pre_nbr = (sample.B08 - sample.B12) / (sample.B08 + sample.B12);
-    return [pre_nbr];
+    var clear = sample.dataMask === 1 && [3, 8, 9, 10].indexOf(sample.SCL) === -1;
+    return [(sample.B08 - sample.B12) / (sample.B08 + sample.B12), clear ? 1 : 0];
 }"""
 
 def _ndwi_script() -> str:
     return """//VERSION=3
-function setup() { return { input: ["B03", "B08"], output: { bands: 1 } }; }
+function setup() {
+    return { input: ["B03", "B08", "SCL", "dataMask"], output: { bands: 2, sampleType: "FLOAT32" } };
+}
 function evaluatePixel(sample) {
-    return [(sample.B03 - sample.B08) / (sample.B03 + sample.B08)];
+    var clear = sample.dataMask === 1 && [3, 8, 9, 10].indexOf(sample.SCL) === -1;
+    return [(sample.B03 - sample.B08) / (sample.B03 + sample.B08), clear ? 1 : 0];
 }"""
 
 async def _mock_thumbnail(event, phase: str) -> str:
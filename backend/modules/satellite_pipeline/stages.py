@@ -0,0 +1,156 @@
+"""
+Satellite Pipeline — checkpointed stage machine over analyses.status.
+
+    fetching_imagery → running_detection → assessing_buildings → generating_report → complete
+
+Each stage reads what earlier stages persisted and records its own results
+before the status moves on, in one UPDATE, so a run interrupted anywhere
+resumes at the stage it was in rather than from scratch:
+
+  fetching_imagery     plan + imagery cache keys of every tile (artefacts)
+  running_detection    damage_geojson, stats, cache key of the class mosaic
+  assessing_buildings  building_damage / infrastructure_risk rows, OSM bbox and tile zoom
+  generating_report    report, public_slug
+
+Stages are idempotent, so repeating the interrupted one is safe. A stage may
+also end the run early (imagery_unavailable). Per-stage wall time and
+attempts go to stage_timings; processing_time_seconds is their total.
+"""
+import time
+import logging
+from datetime import datetime, timezone
+
+from shared.db import execute, fetch, fetchrow, pooled
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("fetching_imagery", "running_detection", "assessing_buildings", "generating_report")
+TERMINAL = ("complete", "error", "imagery_unavailable")
+
+async def _fetch_imagery(analysis, event):
+    from modules.satellite_pipeline.service import fetch_imagery
+    return await fetch_imagery(analysis, event)
+
+async def _detect_damage(analysis, event):
+    from modules.satellite_pipeline.service import detect_damage
+    return await detect_damage(analysis, event)
+
+async def _assess_buildings(analysis, event):
+    from modules.damage_intelligence.service import run_building_assessment
+    return await run_building_assessment(str(analysis["id"])), None
+
+async def _generate_report(analysis, event):
+    from modules.ai_reporting.service import generate_report
+    return await generate_report(str(analysis["id"])) or {}, None
+
+HANDLERS = {
+    "fetching_imagery": _fetch_imagery,
+    "running_detection": _detect_damage,
+    "assessing_buildings": _assess_buildings,
+    "generating_report": _generate_report,
+}
+
+@pooled("background")
+async def advance(analysis_id: str, final_attempt: bool = True) -> str | None:
+    """Run an analysis' remaining stages. Returns the status it ended in.
+
+    A failing stage keeps its status, so the next attempt repeats it; on the
+    final attempt the analysis is marked 'error'. The error is re-raised.
+    """
+    while True:
+        analysis = await fetchrow("""
+            SELECT id, job_id, event_id, status, artefacts, stage_timings
+            FROM analyses WHERE id = $1::uuid
+        """, analysis_id)
+        if not analysis:
+            logger.error(f"Analysis {analysis_id} not found")
+            return None
+        status = "fetching_imagery" if analysis["status"] == "queued" else analysis["status"]
+        if status in TERMINAL:
+            return status
+        event = await fetchrow("SELECT * FROM events WHERE id = $1", analysis["event_id"])
+        timings = dict(analysis["stage_timings"] or {})
+        timing = dict(timings.get(status) or {})
+        timing["attempts"] = timing.get("attempts", 0) + 1
+
+        start = time.monotonic()
+        try:
+            found, next_status = await HANDLERS[status](analysis, event)
+        except Exception as e:
+            timing["failed_seconds"] = round(timing.get("failed_seconds", 0) + time.monotonic() - start, 2)
+            timings[status] = timing
+            await execute("""
+                UPDATE analyses SET
+                    status = $2, error_message = $3, stage_timings = $4,
+                    artefacts = COALESCE(artefacts, '{}'::jsonb) || $5, processing_time_seconds = $6
+                WHERE id = $1::uuid
+            """, analysis_id, "error" if final_attempt else status, f"{status}: {e}", timings,
+                {"failed_stage": status}, _total_seconds(timings))
+            logger.error(f"Analysis {analysis['job_id']} failed in {status} (attempt {timing['attempts']}): {e}")
+            raise
+
+        timing["seconds"] = round(time.monotonic() - start, 2)
+        timing["finished_at"] = datetime.now(timezone.utc).isoformat()
+        timings[status] = timing
+        if next_status is None:
+            position = STAGES.index(status) + 1
+            next_status = STAGES[position] if position < len(STAGES) else "complete"
+        await execute("""
+            UPDATE analyses SET
+                status = $2, artefacts = COALESCE(artefacts, '{}'::jsonb) || $3, stage_timings = $4,
+                processing_time_seconds = $5, error_message = $6
+            WHERE id = $1::uuid
+        """, analysis_id, next_status, found or {}, timings, _total_seconds(timings),
+            (found or {}).get("reason"))
+        logger.info(f"Analysis {analysis['job_id']}: {status} done in {timing['seconds']:.1f}s → {next_status}")
+
+        from shared.ws import manager
+        await manager.broadcast("analysis_update", {
+            "job_id": analysis["job_id"], "status": next_status, "stage_timings": timings,
+        }, topic=f"event:{analysis['event_id']}:analysis")
+
+def _total_seconds(timings: dict) -> int:
+    return round(sum(t.get("seconds", 0) + t.get("failed_seconds", 0) for t in timings.values()))
+
+# ── Job queue integration ────────────────────────────────────
+
+async def run_job(job: dict):
+    """pipeline_jobs handler for 'satellite': start an analysis, or resume the one in the payload."""
+    final_attempt = job["attempts"] >= job["max_attempts"]
+    analysis_id = (job["payload"] or {}).get("analysis_id")
+    if analysis_id:
+        await advance(analysis_id, final_attempt)
+    else:
+        from modules.satellite_pipeline.service import trigger_pipeline
+        await trigger_pipeline(str(job["event_id"]), job_id=f"q{job['id']}", final_attempt=final_attempt)
+
+async def rerun_assessment_job(job: dict):
+    """pipeline_jobs handler for 'assessment': redo buildings and report for an analysis."""
+    analysis_id = job["payload"]["analysis_id"]
+    await execute("""
+        UPDATE analyses SET status = 'assessing_buildings', error_message = NULL
+        WHERE id = $1::uuid AND damage_geojson IS NOT NULL
+    """, analysis_id)
+    await advance(analysis_id, job["attempts"] >= job["max_attempts"])
+
+@pooled("background")
+async def resume_interrupted(job_queue) -> int:
+    """Queue every analysis left mid-pipeline with no live job driving it,
+    e.g. after a crash or a deploy. Returns how many were queued."""
+    rows = await fetch("""
+        SELECT a.id, a.event_id FROM analyses a
+        WHERE a.status = ANY($1::analysis_status_enum[])
+          AND NOT EXISTS (
+              SELECT 1 FROM pipeline_jobs j
+              WHERE j.status IN ('queued', 'running')
+                AND (a.job_id = 'q' || j.id OR j.payload->>'analysis_id' = a.id::text)
+          )
+    """, list(STAGES))
+    queued = 0
+    for row in rows:
+        _, created = await job_queue.enqueue("satellite", str(row["event_id"]), {"analysis_id": str(row["id"])},
+                                             rerun=True)
+        queued += created
+    if rows:
+        logger.info(f"Resuming {queued} of {len(rows)} interrupted analyses")
+    return queued
@@ -0,0 +1,285 @@
+"""
+Satellite Pipeline — tiled, multi-process assessment of large areas.
+
+An AOI at native resolution is cut into a grid of tiles, each fetched from
+Sentinel Hub with an overlap margin and processed in a worker process:
+
+  phase 1  decode pre/post, change index, classify and sieve the tile; the
+           overlap gives the sieve context across the seam. The tile's core
+           (no overlap) is written into a uint8 class mosaic in shared
+           memory, and its partial stats and per-component index sums are
+           returned.
+  phase 2  once every core is written, trace the boundary edges of each core
+           in image coordinates, reading its one-pixel halo from the
+           neighbouring cores in the mosaic.
+
+The parent joins components that continue across seams (union-find over the
+core borders), links all edges into rings and simplifies them in one pass,
+so a polygon spanning several tiles comes out exactly as if the AOI had been
+vectorized whole. Tile images reach the workers as memory-mapped imagery
+cache entries, or as TIFFs in shared memory when uncached, never by
+pickling; only edge lists and sums travel back.
+"""
+import os
+import math
+import asyncio
+import logging
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from modules.satellite_pipeline import raster, vectorize, imagery_cache
+
+logger = logging.getLogger(__name__)
+
+RESOLUTION_M = float(os.getenv("SENTINEL_RESOLUTION_M", "10"))
+MAX_RESOLUTION_M = 160.0
+TILE_SIZE = int(os.getenv("SENTINEL_TILE_SIZE", "2048"))  # Process API limit is 2500 px a side
+TILE_OVERLAP = int(os.getenv("SENTINEL_TILE_OVERLAP", "32"))
+MAX_MOSAIC_PIXELS = int(os.getenv("SENTINEL_MAX_MOSAIC_PIXELS", str(400_000_000)))
+FETCH_CONCURRENCY = int(os.getenv("SENTINEL_FETCH_CONCURRENCY", "4"))
+PIPELINE_PROCESSES = int(os.getenv("PIPELINE_PROCESSES", "0")) or os.cpu_count() or 1
+
+_pool: ProcessPoolExecutor | None = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=PIPELINE_PROCESSES,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+# ── Planning ─────────────────────────────────────────────────
+
+def processing_units(width: int, height: int) -> float:
+    """Sentinel Hub processing units for one FLOAT32 request of up to 3 input bands."""
+    return max(width * height / (512 * 512) * 2, 0.01)
+
+def plan(bbox: list, resolution_m: float = RESOLUTION_M) -> dict:
+    """Pixel grid and overlapping tiles covering bbox at resolution_m."""
+    west, south, east, north = bbox
+    mid_lat = math.radians((south + north) / 2)
+    width = max(1, round((east - west) * raster.KM_PER_DEG_LON * math.cos(mid_lat) * 1000 / resolution_m))
+    height = max(1, round((north - south) * raster.KM_PER_DEG_LAT * 1000 / resolution_m))
+
+    tiles = []
+    for y0 in range(0, height, TILE_SIZE):
+        for x0 in range(0, width, TILE_SIZE):
+            core = (x0, y0, min(x0 + TILE_SIZE, width), min(y0 + TILE_SIZE, height))
+            window = (max(core[0] - TILE_OVERLAP, 0), max(core[1] - TILE_OVERLAP, 0),
+                      min(core[2] + TILE_OVERLAP, width), min(core[3] + TILE_OVERLAP, height))
+            tiles.append({"core": core, "window": window})
+    units = sum(2 * processing_units(t["window"][2] - t["window"][0], t["window"][3] - t["window"][1])
+                for t in tiles)
+    return {"bbox": bbox, "width": width, "height": height, "resolution_m": resolution_m,
+            "tiles": tiles, "columns": -(-width // TILE_SIZE), "units": units}
+
+def affordable_plan(bbox: list, units_available: float) -> dict | None:
+    """The finest plan that fits the remaining quota and the mosaic limit,
+    coarsening by factors of two from RESOLUTION_M."""
+    resolution = RESOLUTION_M
+    while resolution <= MAX_RESOLUTION_M:
+        candidate = plan(bbox, resolution)
+        if candidate["units"] <= units_available and candidate["width"] * candidate["height"] <= MAX_MOSAIC_PIXELS:
+            return candidate
+        resolution *= 2
+    return None
+
+def window_bbox(grid: dict, window: tuple) -> list:
+    west, south, east, north = grid["bbox"]
+    dx, dy = (east - west) / grid["width"], (north - south) / grid["height"]
+    x0, y0, x1, y1 = window
+    return [west + x0 * dx, north - y1 * dy, west + x1 * dx, north - y0 * dy]
+
+# ── Worker side ──────────────────────────────────────────────
+
+def _mosaic(shm: shared_memory.SharedMemory, shape: tuple) -> np.ndarray:
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+def classify_tile(job: dict) -> dict:
+    """Phase 1, in a worker: classify one tile and write its sieved core into the mosaic."""
+    mosaic = shared_memory.SharedMemory(name=job["mosaic"])
+    handles = []
+    try:
+        return _classify_tile(job, handles, mosaic)
+    finally:
+        for shm in (*handles, mosaic):
+            shm.close()
+
+def _open_image(source: dict, handles: list) -> np.ndarray:
+    """A tile image from the imagery cache (memory-mapped .npy) or from a TIFF in shared memory."""
+    if "npy" in source:
+        return imagery_cache.open_array(source["npy"])
+    shm = shared_memory.SharedMemory(name=source["shm"])
+    handles.append(shm)
+    return raster.read_tiff(shm.buf[:source["size"]])
+
+def _classify_tile(job, handles, mosaic_shm) -> dict:
+    pre, post = _open_image(job["pre"], handles), _open_image(job["post"], handles)
+    delta, valid = raster.change_index(pre, post, job["index"])
+    del pre, post
+    classes = raster.classify(delta, valid, job["index"])
+
+    x0, y0, x1, y1 = job["core"]
+    wx0, wy0 = job["window"][:2]
+    core = (slice(y0 - wy0, y1 - wy0), slice(x0 - wx0, x1 - wx0))
+    stats = raster.partial_stats(delta[core], valid[core], classes[core], job["row_area"])
+
+    sieved = vectorize.emitted(vectorize.sieve(classes, job["min_pixels"])[core])
+    mosaic = _mosaic(mosaic_shm, job["shape"])
+    mosaic[y0:y1, x0:x1] = sieved
+    del mosaic
+
+    labels, label_class = vectorize.label_regions(sieved)
+    delta, finite = delta[core], np.isfinite(delta[core])
+    flat = labels.ravel()
+    sums = np.bincount(flat, weights=np.where(finite, delta, 0).ravel(), minlength=len(label_class))
+    counts = np.bincount(flat, weights=finite.ravel(), minlength=len(label_class))
+    return {"stats": stats, "sums": sums, "counts": counts}
+
+def trace_tile(job: dict) -> dict:
+    """Phase 2, in a worker: boundary edges of one core plus its border labels."""
+    mosaic_shm = shared_memory.SharedMemory(name=job["mosaic"])
+    try:
+        mosaic = _mosaic(mosaic_shm, job["shape"])
+        height, width = job["shape"]
+        x0, y0, x1, y1 = job["core"]
+        padded = np.zeros((y1 - y0 + 2, x1 - x0 + 2), dtype=np.uint8)
+        hy0, hx0 = max(y0 - 1, 0), max(x0 - 1, 0)
+        hy1, hx1 = min(y1 + 1, height), min(x1 + 1, width)
+        padded[hy0 - y0 + 1:hy1 - y0 + 1, hx0 - x0 + 1:hx1 - x0 + 1] = mosaic[hy0:hy1, hx0:hx1]
+        del mosaic
+    finally:
+        mosaic_shm.close()
+
+    # Same core, same labelling as phase 1, so label ids match its sums
+    labels, label_class = vectorize.label_regions(padded[1:-1, 1:-1])
+    return {
+        "edges": vectorize.trace_edges(padded, labels, x0, y0),
+        "classes": label_class,
+        "left": labels[:, 0], "right": labels[:, -1], "top": labels[0], "bottom": labels[-1],
+    }
+
+# ── Stitching ────────────────────────────────────────────────
+
+def stitch(grid: dict, classified: list[dict], traced: list[dict], index: str,
+           tolerance_px: float = vectorize.VECTOR_TOLERANCE_PX,
+           max_vertices: int = vectorize.VECTOR_MAX_VERTICES) -> tuple[dict, dict]:
+    """Merge per-tile results into one FeatureCollection and stats block."""
+    offsets = np.r_[0, np.cumsum([len(t["classes"]) for t in traced])]
+    class_of = np.concatenate([t["classes"] for t in traced])
+
+    # Components touching across a seam are one polygon: union the labels of
+    # the same class facing each other across every tile border
+    pairs_a, pairs_b = [], []
+    columns = grid["columns"]
+    for i, tile in enumerate(traced):
+        for j, (mine, theirs) in ((i + 1, ("right", "left")), (i + columns, ("bottom", "top"))):
+            if j >= len(traced) or (mine == "right" and (i + 1) % columns == 0):
+                continue
+            a, b = tile[mine], traced[j][theirs]
+            touching = (a > 0) & (b > 0)
+            pairs_a.append(offsets[i] + a[touching])
+            pairs_b.append(offsets[j] + b[touching])
+    total = int(offsets[-1])
+    a = np.concatenate(pairs_a) if pairs_a else np.zeros(0, dtype=np.int64)
+    b = np.concatenate(pairs_b) if pairs_b else np.zeros(0, dtype=np.int64)
+    same = class_of[a] == class_of[b]
+    graph = coo_matrix((np.ones(int(same.sum()), dtype=np.int8), (a[same], b[same])), shape=(total, total))
+    _, root = connected_components(graph, directed=False)
+
+    sums = np.bincount(root, weights=np.concatenate([c["sums"] for c in classified]), minlength=root.max() + 1)
+    counts = np.bincount(root, weights=np.concatenate([c["counts"] for c in classified]), minlength=root.max() + 1)
+    delta_mean = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    edges = []
+    for i, tile in enumerate(traced):
+        part = dict(tile["edges"])
+        part["label"] = root[offsets[i] + part["label"]]
+        edges.append(part)
+
+    stats = raster.merge_stats([c["stats"] for c in classified], index)
+    rings = vectorize.link_rings(vectorize.concat_edges(edges), grid["width"])
+    if rings is None:
+        return {"type": "FeatureCollection", "features": []}, stats
+    simplified = vectorize.simplify_rings(rings, tolerance_px, max_vertices)
+    shape = (grid["height"], grid["width"])
+    return vectorize.feature_collection(simplified, grid["bbox"], shape, delta_mean, index), stats
+
+# ── Orchestration ────────────────────────────────────────────
+
+def _to_source(data: bytes | str) -> tuple[dict, shared_memory.SharedMemory | None]:
+    """Job source for a fetched tile: a cached .npy path as is, TIFF bytes via shared memory."""
+    if isinstance(data, str):
+        return {"npy": data}, None
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    shm.buf[:len(data)] = data
+    return {"shm": shm.name, "size": len(data)}, shm
+
+async def assess_tiled(grid: dict, fetch, index: str,
+                       min_pixels: int = vectorize.VECTOR_MIN_PIXELS,
+                       classes_key: str | None = None) -> tuple[dict, dict]:
+    """Fetch, classify and vectorize every tile of a plan.
+
+    fetch(bbox, width, height, phase) returns the "pre" or "post" image of
+    one tile, as FLOAT32 TIFF bytes or as the path of an imagery cache
+    entry. At most FETCH_CONCURRENCY fetches are in flight, and at most
+    that many plus one per worker tiles are held in memory at a time.
+    With classes_key, the sieved class mosaic is kept in the imagery cache.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    shape = (grid["height"], grid["width"])
+    row_area = raster.pixel_row_areas_km2(grid["bbox"], *shape)
+    fetching = asyncio.Semaphore(FETCH_CONCURRENCY)
+    in_memory = asyncio.Semaphore(FETCH_CONCURRENCY + PIPELINE_PROCESSES)
+    mosaic = shared_memory.SharedMemory(create=True, size=shape[0] * shape[1])
+
+    async def phase1(tile: dict) -> dict:
+        x0, y0, x1, y1 = tile["window"]
+        tile_bbox = window_bbox(grid, tile["window"])
+        async with in_memory:
+            async with fetching:
+                post, pre = await asyncio.gather(
+                    fetch(tile_bbox, x1 - x0, y1 - y0, "post"),
+                    fetch(tile_bbox, x1 - x0, y1 - y0, "pre"),
+                )
+            (pre_source, pre_shm), (post_source, post_shm) = _to_source(pre), _to_source(post)
+            job = {
+                "mosaic": mosaic.name, "shape": shape, "pre": pre_source, "post": post_source,
+                "core": tile["core"], "window": tile["window"],
+                "index": index, "min_pixels": min_pixels, "row_area": row_area[tile["core"][1]:tile["core"][3]],
+            }
+            del pre, post
+            try:
+                return await loop.run_in_executor(pool, classify_tile, job)
+            finally:
+                for shm in (pre_shm, post_shm):
+                    if shm is not None:
+                        shm.close()
+                        shm.unlink()
+
+    try:
+        classified = await asyncio.gather(*(phase1(t) for t in grid["tiles"]))
+        traced = await asyncio.gather(*(
+            loop.run_in_executor(pool, trace_tile, {"mosaic": mosaic.name, "shape": shape, "core": t["core"]})
+            for t in grid["tiles"]
+        ))
+        if classes_key:
+            classes = _mosaic(mosaic, shape)
+            await asyncio.to_thread(imagery_cache.put_array, classes_key, classes,
+                                    {"bbox": grid["bbox"], "resolution_m": grid["resolution_m"], "index": index})
+            del classes
+    finally:
+        mosaic.close()
+        mosaic.unlink()
+    return await asyncio.to_thread(stitch, grid, classified, traced, index)
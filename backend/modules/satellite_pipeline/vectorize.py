@@ -0,0 +1,693 @@
+"""
+Satellite Pipeline — raster-to-polygon vectorizer.
+
+Turns a classified severity raster (see raster.classify) into the
+damage_geojson FeatureCollection stored on `analyses`:
+
+1. sieve     components smaller than `min_pixels` take the class of the
+             nearest larger region, so speckle neither becomes polygons nor
+             punches holes in them
+2. label     4-connected components per severity class 2-5; class 0 and
+             masked pixels are background and are not emitted
+3. trace     every pixel edge between two classes becomes a directed edge
+             with its region on one side. Tracing compares classes only, so
+             a window of the raster can be traced on its own given a
+             one-pixel halo; `link_rings` then joins edges from any number
+             of windows into rings with array operations only. A ring
+             touching itself where its region meets itself diagonally is
+             split there into an outer ring and holes, or into holes
+4. simplify  rings are cut into chains at junctions (vertices where three
+             regions meet). Both copies of a chain shared by two polygons
+             are simplified in the same canonical direction, so neighbours
+             keep identical borders — no slivers, no gaps. Douglas-Peucker
+             runs batched over every chain at once and records each vertex's
+             significance, so the vertex cap is met by raising the tolerance
+             rather than re-simplifying. Shortcuts that cross any border or
+             pass a whole ring get their vertices back, so every polygon is
+             valid and neighbours never overlap.
+5. emit      one Polygon per component, outer ring first, RFC 7946 winding
+
+Coordinates are pixel-grid vertices mapped linearly into the WGS84 bbox.
+tiling.py runs steps 1-3 per tile in worker processes.
+"""
+import os
+import logging
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from modules.satellite_pipeline.raster import SEVERITY_COLORS, SEVERITY_LABELS, pixel_row_areas_km2
+
+logger = logging.getLogger(__name__)
+
+VECTOR_TOLERANCE_PX = float(os.getenv("VECTOR_TOLERANCE_PX", "1.0"))
+VECTOR_MIN_PIXELS = int(os.getenv("VECTOR_MIN_PIXELS", "16"))
+VECTOR_MAX_VERTICES = int(os.getenv("VECTOR_MAX_VERTICES", "50000"))
+EMITTED_CLASSES = (2, 3, 4, 5)
+
+# Directions E, S, W, N in image coordinates (y grows downwards). A directed
+# edge keeps its region on side (DY, -DX): E runs along the bottom of its
+# region, S along its west side, W along its top and N along its east side.
+DX = np.array([1, 0, -1, 0], dtype=np.int64)
+DY = np.array([0, 1, 0, -1], dtype=np.int64)
+
+# ── Raster preparation ───────────────────────────────────────
+
+def sieve(classes: np.ndarray, min_pixels: int) -> np.ndarray:
+    """Give components smaller than min_pixels the class of the nearest larger region."""
+    if min_pixels <= 1:
+        return classes
+    small = np.zeros(classes.shape, dtype=bool)
+    for value in np.flatnonzero(np.bincount(classes.ravel(), minlength=256)):
+        labels, _ = ndimage.label(classes == value)
+        tiny = np.bincount(labels.ravel()) < min_pixels
+        tiny[0] = False
+        if tiny.any():
+            small |= tiny[labels]
+    if not small.any() or small.all():
+        return classes
+
+    # Grow the surviving regions into the speckle one pixel ring per pass;
+    # components are smaller than min_pixels, so few passes are needed and
+    # each only touches the pixels still unfilled
+    h, w = classes.shape
+    filled = classes.copy()
+    ys, xs = np.nonzero(small)
+    while len(ys):
+        value = np.zeros(len(ys), dtype=classes.dtype)
+        found = np.zeros(len(ys), dtype=bool)
+        for dy, dx in ((0, 1), (0, -1), (1, 0), (-1, 0)):
+            ny, nx = np.clip(ys + dy, 0, h - 1), np.clip(xs + dx, 0, w - 1)
+            source = ~small[ny, nx] & ~found
+            value[source] = filled[ny[source], nx[source]]
+            found |= source
+        filled[ys[found], xs[found]] = value[found]
+        small[ys[found], xs[found]] = False
+        ys, xs = ys[~found], xs[~found]
+    return filled
+
+def label_regions(classes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Connected components of the emitted classes. Returns (labels, class of
+    each label); label 0 is background."""
+    labels = np.zeros(classes.shape, dtype=np.int32)
+    region_class = [0]
+    for value in EMITTED_CLASSES:
+        component, n = ndimage.label(classes == value)
+        if n:
+            mask = component > 0
+            labels[mask] = component[mask] + (len(region_class) - 1)
+            region_class.extend([value] * n)
+    return labels, np.array(region_class, dtype=np.uint8)
+
+def emitted(classes: np.ndarray) -> np.ndarray:
+    """Class raster with every non-emitted class (0, masked) folded into background 0."""
+    return np.where((classes >= EMITTED_CLASSES[0]) & (classes <= EMITTED_CLASSES[-1]), classes, 0).astype(np.uint8)
+
+# ── Boundary tracing ─────────────────────────────────────────
+
+def _pixel(padded: np.ndarray, x, y, ox, oy):
+    """Label of the pixel centred at vertex (x, y) + (ox, oy) / 2, for ox, oy in {-1, 1}."""
+    return padded[y + (oy - 1) // 2 + 1, x + (ox - 1) // 2 + 1]
+
+def _directed_edges(padded: np.ndarray) -> tuple:
+    """(start x, start y, direction, class) of every edge bordering an emitted
+    region inside the window; the one-pixel border of `padded` is halo."""
+    h, w = padded.shape[0] - 2, padded.shape[1] - 2
+    parts = []
+    # Horizontal edges on vertex row i, between padded rows i and i + 1
+    above, below = padded[:-1, 1:-1], padded[1:, 1:-1]
+    i, c = np.nonzero(above != below)
+    up, down = above[i, c], below[i, c]
+    parts.append((c, i, 0, np.where(i > 0, up, 0)))          # E, region above
+    parts.append((c + 1, i, 2, np.where(i < h, down, 0)))    # W, region below
+    # Vertical edges on vertex column j, between padded columns j and j + 1
+    left, right = padded[1:-1, :-1], padded[1:-1, 1:]
+    r, j = np.nonzero(left != right)
+    west, east = left[r, j], right[r, j]
+    parts.append((j, r + 1, 3, np.where(j > 0, west, 0)))    # N, region to the west
+    parts.append((j, r, 1, np.where(j < w, east, 0)))        # S, region to the east
+
+    xs, ys, ds, regions = [], [], [], []
+    for x, y, d, region in parts:
+        keep = region > 0  # halo-side regions belong to the neighbouring window
+        xs.append(x[keep])
+        ys.append(y[keep])
+        ds.append(np.full(np.count_nonzero(keep), d, dtype=np.int64))
+        regions.append(region[keep])
+    return (np.concatenate(xs).astype(np.int64), np.concatenate(ys).astype(np.int64),
+            np.concatenate(ds), np.concatenate(regions))
+
+def _ring_positions(nxt: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Ring id and position along the ring of each edge, given each edge's successor.
+    Positions come from pointer jumping: log2(longest ring) array passes."""
+    n = len(nxt)
+    index = np.arange(n)
+    graph = csr_matrix((np.ones(n, dtype=np.int8), (index, nxt)), shape=(n, n))
+    _, ring = connected_components(graph, directed=True, connection="weak")
+    _, heads = np.unique(ring, return_index=True)  # lowest edge index of each ring
+
+    is_head = np.zeros(n, dtype=bool)
+    is_head[heads] = True
+    tail = is_head[nxt]
+    succ = np.where(tail, index, nxt)
+    to_tail = (~tail).astype(np.int64)
+    while True:
+        jump = succ[succ]
+        if np.array_equal(jump, succ):
+            break
+        to_tail += to_tail[succ]
+        succ = jump
+    length = to_tail[heads] + 1
+    return ring, length[ring] - 1 - to_tail
+
+def trace_edges(padded: np.ndarray, labels: np.ndarray, x0: int = 0, y0: int = 0) -> dict:
+    """Directed boundary edges of a window, in image vertex coordinates.
+
+    padded is the window's emitted() classes with a one-pixel halo of the
+    surrounding raster (zeros at the image border); labels are component ids
+    for the window itself; (x0, y0) is the window's offset in the image.
+    """
+    x, y, d, region = _directed_edges(padded)
+    side_x, side_y = DY[d], -DX[d]
+    qx, qy = x + DX[d], y + DY[d]
+    # Continue around the region: turn away from it when both pixels ahead
+    # belong to it, go straight when only the near-side one does, otherwise
+    # turn towards it. Same-class pixels meeting only at a corner are not
+    # connected (4-connectivity), which is why classes are enough here
+    ahead_near = _pixel(padded, qx, qy, DX[d] + side_x, DY[d] + side_y)
+    ahead_far = _pixel(padded, qx, qy, DX[d] - side_x, DY[d] - side_y)
+    turn = np.where(ahead_near == region, np.where(ahead_far == region, 1, 0), 3)
+
+    # Junctions: three or more classes, or two in a checkerboard, around the end vertex
+    nw, ne = _pixel(padded, qx, qy, -1, -1), _pixel(padded, qx, qy, 1, -1)
+    sw, se = _pixel(padded, qx, qy, -1, 1), _pixel(padded, qx, qy, 1, 1)
+    distinct = 1 + (ne != nw) + ((sw != nw) & (sw != ne)) + ((se != nw) & (se != ne) & (se != sw))
+    junction = (distinct >= 3) | ((distinct == 2) & (nw == se) & (ne == sw))
+
+    return {
+        "x": x + x0,
+        "y": y + y0,
+        "d": d,
+        "next_d": (d + turn) % 4,
+        "region": region,
+        "neighbour": _pixel(padded, x, y, DX[d] - side_x, DY[d] - side_y),
+        "junction": junction,
+        "label": labels[y + (DY[d] + side_y - 1) // 2, x + (DX[d] + side_x - 1) // 2],
+    }
+
+def concat_edges(parts: list[dict]) -> dict:
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+def link_rings(edges: dict, width: int) -> dict | None:
+    """Join directed edges into rings, reduced to corner and junction
+    vertices. Vertex arrays are grouped by ring, in traversal order."""
+    x, y, d, next_d = edges["x"], edges["y"], edges["d"], edges["next_d"]
+    if not len(x):
+        return None
+    qx, qy = x + DX[d], y + DY[d]
+    key = (y * (width + 1) + x) * 4 + d
+    wanted = (qy * (width + 1) + qx) * 4 + next_d
+    order = np.argsort(key)
+    nxt = order[np.minimum(np.searchsorted(key[order], wanted), len(key) - 1)]
+    if not np.array_equal(key[nxt], wanted):
+        raise ValueError("Boundary edges do not close into rings")
+
+    ring, position = _ring_positions(nxt)
+    walk = np.lexsort((position, ring))
+    keep = walk[(next_d[walk] != d[walk]) | edges["junction"][walk]]
+
+    ring = ring[keep]
+    starts = np.flatnonzero(np.r_[True, ring[1:] != ring[:-1]])
+    return _split_pinches({
+        "width": width,
+        "x": qx[keep],
+        "y": qy[keep],
+        "junction": edges["junction"][keep],
+        "neighbour": edges["neighbour"][nxt[keep]],  # across the edge leaving each vertex
+        "starts": np.r_[starts, len(keep)],
+        "region": edges["region"][keep][starts],
+        "label": edges["label"][keep][starts],
+    })
+
+def _split_pinches(rings: dict) -> dict:
+    """Split rings that pass through a vertex twice into simple rings.
+
+    A region meeting itself diagonally is not 4-connected there, so its
+    boundary touches itself at that vertex — invalid as one ring. Cut at
+    each repeat, an outer ring becomes the outer ring plus holes touching it
+    at one point, and a hole becomes touching holes, both valid. Pinch
+    vertices are junctions, so the pieces still start and end on anchors.
+    """
+    starts, w = rings["starts"], rings["width"]
+    lengths = np.diff(starts)
+    ring_of = np.repeat(np.arange(len(lengths)), lengths)
+    vid = rings["y"] * (w + 1) + rings["x"]
+    order = np.lexsort((vid, ring_of))
+    repeat = (ring_of[order][1:] == ring_of[order][:-1]) & (vid[order][1:] == vid[order][:-1])
+    pinched = np.unique(ring_of[order][1:][repeat])
+    if not len(pinched):
+        return rings
+
+    loops, loop_ring = [], []
+    for r in pinched.tolist():
+        stack, seen = [], {}
+        for i in range(starts[r], starts[r + 1]):
+            v = int(vid[i])
+            if v in seen:
+                k = seen[v]
+                loops.append(stack[k:])
+                loop_ring.append(r)
+                for j in stack[k:]:
+                    del seen[int(vid[j])]
+                del stack[k:]
+            seen[v] = len(stack)
+            stack.append(i)
+        loops.append(stack)
+        loop_ring.append(r)
+
+    keep = np.ones(len(lengths), dtype=bool)
+    keep[pinched] = False
+    whole = _select_rings(rings, keep)
+    vertex = np.concatenate([np.flatnonzero(np.repeat(keep, lengths))] + [np.array(l) for l in loops])
+    loop_ring = np.array(loop_ring)
+    split = {k: rings[k][vertex] for k in ("x", "y", "junction", "neighbour")}
+    split.update(
+        width=w,
+        region=np.r_[whole["region"], rings["region"][loop_ring]],
+        label=np.r_[whole["label"], rings["label"][loop_ring]],
+        starts=np.r_[whole["starts"], whole["starts"][-1] + np.cumsum([len(l) for l in loops])],
+    )
+    return split
+
+def _select_rings(rings: dict, keep: np.ndarray) -> dict:
+    lengths = np.diff(rings["starts"])
+    vertex = np.repeat(keep, lengths)
+    selected = {k: rings[k][vertex] for k in ("x", "y", "junction", "neighbour")}
+    selected.update(width=rings["width"], region=rings["region"][keep], label=rings["label"][keep],
+                    starts=np.r_[0, np.cumsum(lengths[keep])])
+    return selected
+
+# ── Simplification ───────────────────────────────────────────
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(s, s + n) for each (s, n)."""
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    steps = np.ones(total, dtype=np.int64)
+    nonempty = lengths > 0
+    s, e = starts[nonempty], ends[nonempty]
+    steps[0] = s[0]
+    steps[e[:-1]] = s[1:] - (s[:-1] + lengths[nonempty][:-1] - 1)
+    return np.cumsum(steps)
+
+def _significance(px, py, seg_a, seg_b, reverse, tolerance) -> np.ndarray:
+    """Batched Douglas-Peucker over point runs [a, b]. Returns, per point, the
+    largest tolerance at which it would survive (0 for points that do not
+    survive `tolerance`). Reversed runs break ties from the far end, so both
+    copies of a shared chain keep the same vertices."""
+    sig = np.zeros(len(px))
+    cap = np.full(len(seg_a), np.inf)
+    while len(seg_a):
+        inner = seg_b - seg_a - 1
+        busy = inner > 0
+        seg_a, seg_b, reverse, cap, inner = seg_a[busy], seg_b[busy], reverse[busy], cap[busy], inner[busy]
+        if not len(seg_a):
+            break
+        points = _ranges(seg_a + 1, inner)
+        seg = np.repeat(np.arange(len(seg_a)), inner)
+        ax, ay = px[seg_a][seg], py[seg_a][seg]
+        dx, dy = px[seg_b][seg] - ax, py[seg_b][seg] - ay
+        ox, oy = px[points] - ax, py[points] - ay
+        # Integer coordinates make the cross product exact, so a chain and its
+        # reversed twin compute bit-identical distances
+        norm2 = dx * dx + dy * dy
+        dist = np.where(norm2 > 0, np.abs(dx * oy - dy * ox) / np.sqrt(np.maximum(norm2, 1)),
+                        np.hypot(ox, oy))
+
+        offsets = np.r_[0, np.cumsum(inner)[:-1]]
+        peak = np.maximum.reduceat(dist, offsets)
+        at_peak = np.flatnonzero(dist == peak[seg])
+        peak_seg = seg[at_peak]
+        boundary = np.r_[True, peak_seg[1:] != peak_seg[:-1]]
+        first = at_peak[boundary]
+        last = at_peak[np.r_[boundary[1:], True]]
+        split = points[np.where(reverse, last, first)]
+
+        value = np.minimum(peak, cap)
+        sig[split] = value
+        go = value > tolerance
+        seg_a, seg_b = np.r_[seg_a[go], split[go]], np.r_[split[go], seg_b[go]]
+        reverse = np.r_[reverse[go], reverse[go]]
+        cap = np.r_[value[go], value[go]]
+    return sig
+
+def simplify_rings(rings: dict, tolerance: float, max_vertices: int) -> dict:
+    """Simplify traced rings sharing junction anchors into closed rings.
+
+    If the anchors alone exceed max_vertices, the smallest components are
+    dropped until the anchors fit in half the budget.
+    """
+    starts, w = rings["starts"], rings["width"]
+    lengths = np.diff(starts)
+    n_rings = len(lengths)
+    if not n_rings:
+        return {"x": np.zeros(0), "y": np.zeros(0), "starts": np.zeros(1, dtype=np.int64),
+                "region": rings["region"], "label": rings["label"], "area2": np.zeros(0),
+                "mean_y": np.zeros(0), "tolerance": tolerance, "vertices": 0}
+    ring_of = np.repeat(np.arange(n_rings), lengths)
+    local = np.arange(len(ring_of)) - starts[:-1][ring_of]
+    vid = rings["y"] * (w + 1) + rings["x"]
+
+    # Rotate every ring to start on its lowest junction or, for rings without
+    # one, its lowest vertex — the same vertex for both twins, however the
+    # edges were ordered. The following vertex breaks ties at pinch points
+    has_junction = np.logical_or.reduceat(rings["junction"], starts[:-1])
+    following = vid[starts[:-1][ring_of] + (local + 1) % lengths[ring_of]]
+    order_key = vid * (int(vid.max()) + 1) + following
+    candidate = rings["junction"] | ~has_junction[ring_of]
+    lowest = np.minimum.reduceat(np.where(candidate, order_key, np.iinfo(np.int64).max), starts[:-1])
+    rotation = np.zeros(n_rings, dtype=np.int64)
+    is_lowest = candidate & (order_key == lowest[ring_of])
+    rotation[ring_of[is_lowest]] = local[is_lowest]
+    source = starts[:-1][ring_of] + (local + rotation[ring_of]) % lengths[ring_of]
+
+    # Closed point runs: each rotated ring followed by its first vertex again
+    closed_starts = starts[:-1] + np.arange(n_rings)
+    total = len(ring_of) + n_rings
+    body = np.ones(total, dtype=bool)
+    body[closed_starts + lengths] = False
+    src = np.empty(total, dtype=np.int64)
+    src[body] = source
+    src[~body] = source[starts[:-1]]
+    px, py = rings["x"][src].astype(np.float64), rings["y"][src].astype(np.float64)
+    point_ring = np.repeat(np.arange(n_rings), lengths + 1)
+
+    anchor = rings["junction"][src] | ~body
+    anchor[closed_starts] = True
+    # Junction-free rings also anchor at the vertex farthest from their start
+    free = np.flatnonzero(~has_junction)
+    if len(free):
+        run = _ranges(closed_starts[free], lengths[free])
+        far = np.hypot(px[run] - np.repeat(px[closed_starts[free]], lengths[free]),
+                       py[run] - np.repeat(py[closed_starts[free]], lengths[free]))
+        anchor[_farthest(run, far, lengths[free], rings, free)] = True
+
+    # Chains run between consecutive anchors. A chain bordering an emitted
+    # region of a lower class is the reversed twin of that region's copy
+    anchors = np.flatnonzero(anchor)
+    chain_a, chain_b = anchors[:-1], anchors[1:]
+    same_ring = point_ring[chain_a] == point_ring[chain_b]
+    chain_a, chain_b = chain_a[same_ring], chain_b[same_ring]
+    owner = rings["region"][point_ring[chain_a]]
+    across = rings["neighbour"][src[chain_a]]
+    reverse = (across > 0) & (across < owner)
+
+    area2 = _shoelace(rings["x"], rings["y"], starts)
+    budget = max_vertices - len(anchors)
+    if budget < 0:
+        return simplify_rings(_drop_smallest(rings, area2, np.add.reduceat(anchor, closed_starts),
+                                             max_vertices // 2), tolerance, max_vertices)
+
+    sig = _significance(px, py, chain_a, chain_b, reverse, tolerance)
+    survivors = sig[sig > tolerance]
+    used = tolerance
+    if len(survivors) > budget:
+        cut = len(survivors) - budget - 1
+        used = float(np.partition(survivors, cut)[cut])
+
+    # A shortcut — a segment over dropped vertices — may cross its own ring
+    # or a neighbour's border. Its dropped vertices are simplified again at
+    # half their tolerance, down to the traced run, until nothing crosses;
+    # the cap is then met by raising the tolerance everywhere else. Limits
+    # are kept per vertex, which both copies of a shared chain pass
+    chain_of = np.searchsorted(chain_a, np.arange(total), side="right") - 1
+    key = _chain_keys(vid[src], chain_a, chain_b)
+    _, vertex = np.unique(vid[src], return_inverse=True)
+    limit = np.full(int(vertex.max()) + 1, np.inf)
+    while True:
+        point_tolerance = np.minimum(limit[vertex], used)
+        kept = anchor | (sig > point_tolerance) | (limit[vertex] == 0)
+        start, end = _crossing_shortcuts(px, py, kept, point_ring, chain_of, key)
+        if len(start):
+            dropped = _ranges(start + 1, end - start - 1)
+            half = point_tolerance[dropped] / 2
+            np.minimum.at(limit, vertex[dropped], np.where(half >= 0.25, half, 0.0))
+            continue
+        excess = np.count_nonzero(kept) - max_vertices
+        droppable = sig[~anchor & (limit[vertex] > used) & (sig > used)]
+        if excess <= 0 or not len(droppable):
+            break
+        cut = min(excess, len(droppable)) - 1
+        used = float(np.partition(droppable, cut)[cut])
+    if np.count_nonzero(kept) > max_vertices:
+        ring_vertices = np.bincount(point_ring[kept], minlength=n_rings)
+        return simplify_rings(_drop_smallest(rings, area2, ring_vertices, max_vertices // 2), tolerance, max_vertices)
+    tolerance = used
+
+    idx = np.flatnonzero(kept)
+    kept_ring = point_ring[idx]
+    ring_bounds = np.searchsorted(kept_ring, np.arange(n_rings + 1))
+    return {
+        "x": px[idx],
+        "y": py[idx],
+        "starts": ring_bounds,
+        "region": rings["region"],
+        "label": rings["label"],
+        "area2": area2,
+        "mean_y": np.add.reduceat(rings["y"], starts[:-1]) / lengths,
+        "tolerance": tolerance,
+        "vertices": len(idx),
+    }
+
+def _drop_smallest(rings: dict, area2: np.ndarray, ring_vertices: np.ndarray, target: int) -> dict:
+    """Rings of all but the smallest components, keeping at most `target` vertices."""
+    components, ring_component = np.unique(rings["label"], return_inverse=True)
+    pixels = np.bincount(ring_component, weights=-area2 / 2, minlength=len(components))
+    vertices = np.bincount(ring_component, weights=ring_vertices, minlength=len(components))
+    by_size = np.argsort(pixels)
+    excess = vertices.sum() - target
+    dropped = by_size[:np.searchsorted(np.cumsum(vertices[by_size]), excess) + 1]
+    logger.info(f"Vectorizer vertices over budget; dropping {len(dropped)} smallest of {len(components)} polygons")
+    return _select_rings(rings, ~np.isin(ring_component, dropped))
+
+def _chain_keys(vid: np.ndarray, chain_a: np.ndarray, chain_b: np.ndarray) -> np.ndarray:
+    """Key shared by a chain and its twin only: the lowest interior vertex, which
+    no other chain passes, or for chains without one, the pair of end vertices."""
+    inner = chain_b - chain_a - 1
+    key = -1 - (np.minimum(vid[chain_a], vid[chain_b]) * (int(vid.max()) + 1) + np.maximum(vid[chain_a], vid[chain_b]))
+    has_inner = inner > 0
+    if has_inner.any():
+        points = _ranges(chain_a[has_inner] + 1, inner[has_inner])
+        key[has_inner] = np.minimum.reduceat(vid[points], np.r_[0, np.cumsum(inner[has_inner])[:-1]])
+    return key
+
+def _crossing_shortcuts(px, py, kept, point_ring, chain_of, key) -> tuple[np.ndarray, np.ndarray]:
+    """(start, end) point indices of the shortcuts that collapse their ring,
+    meet another segment anywhere but a shared end vertex, overlap the
+    segment next to them, or sweep past a whole ring. Twin segments coincide
+    by design and are skipped."""
+    idx = np.flatnonzero(kept)
+    joined = point_ring[idx[1:]] == point_ring[idx[:-1]]
+    start, end = idx[:-1][joined], idx[1:][joined]
+    chain = chain_of[start]
+    x0, y0, x1, y1 = px[start], py[start], px[end], py[end]
+    shortcut = end - start > 1
+    if not shortcut.any():
+        return start[:0], end[:0]
+
+    # Rings left with fewer than three vertices, and zero-length segments
+    collapsed = np.bincount(point_ring[start], minlength=int(point_ring.max()) + 1) < 3
+    crossing = collapsed[point_ring[start]] | ((x0 == x1) & (y0 == y1))
+
+    # Traced segments never cross each other, so only pairs involving a
+    # shortcut are tested. Candidates share a grid cell sized to the
+    # shortcuts' typical extent
+    extent = np.maximum(np.abs(x1 - x0), np.abs(y1 - y0))[shortcut]
+    cell = max(float(np.percentile(extent, 90)), 2.0)
+    cx0, cx1 = (np.minimum(x0, x1) // cell).astype(np.int64), (np.maximum(x0, x1) // cell).astype(np.int64)
+    cy0, cy1 = (np.minimum(y0, y1) // cell).astype(np.int64), (np.maximum(y0, y1) // cell).astype(np.int64)
+    nx, ny = cx1 - cx0 + 1, cy1 - cy0 + 1
+    seg = np.repeat(np.arange(len(start)), nx * ny)
+    k = np.arange(len(seg)) - np.repeat(np.r_[0, np.cumsum(nx * ny)[:-1]], nx * ny)
+    cells = (cy0[seg] + k // nx[seg]) * (int(cx1.max()) + 1) + cx0[seg] + k % nx[seg]
+    # Shortcuts first in each cell, each paired with every segment after it
+    order = np.lexsort((seg, ~shortcut[seg], cells))
+    seg, cells = seg[order], cells[order]
+    group_end = np.searchsorted(cells, cells, side="right")
+    lead = np.flatnonzero(shortcut[seg])
+    i = np.repeat(seg[lead], group_end[lead] - lead - 1)
+    j = seg[_ranges(lead + 1, group_end[lead] - lead - 1)]
+    pairs = np.unique(np.minimum(i, j) * len(start) + np.maximum(i, j))
+    i, j = pairs // len(start), pairs % len(start)
+    twins = (key[chain[i]] == key[chain[j]]) & (chain[i] != chain[j])
+    i, j = i[~twins], j[~twins]
+
+    def orient(ax, ay, bx, by, cx, cy):
+        return np.sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+    def touches(ax, ay, bx, by, cx, cy, side):
+        """c lies on segment ab but is neither of its ends."""
+        return ((side == 0) & (np.minimum(ax, bx) <= cx) & (cx <= np.maximum(ax, bx))
+                & (np.minimum(ay, by) <= cy) & (cy <= np.maximum(ay, by))
+                & ~((cx == ax) & (cy == ay)) & ~((cx == bx) & (cy == by)))
+
+    ax, ay, bx, by = x0[i], y0[i], x1[i], y1[i]
+    cx, cy, dx, dy = x0[j], y0[j], x1[j], y1[j]
+    d1, d2 = orient(ax, ay, bx, by, cx, cy), orient(ax, ay, bx, by, dx, dy)
+    d3, d4 = orient(cx, cy, dx, dy, ax, ay), orient(cx, cy, dx, dy, bx, by)
+    same = (((ax == cx) & (ay == cy) & (bx == dx) & (by == dy))
+            | ((ax == dx) & (ay == dy) & (bx == cx) & (by == cy)))
+    hit = (((d1 * d2 < 0) & (d3 * d4 < 0)) | same
+           | touches(ax, ay, bx, by, cx, cy, d1) | touches(ax, ay, bx, by, dx, dy, d2)
+           | touches(cx, cy, dx, dy, ax, ay, d3) | touches(cx, cy, dx, dy, bx, by, d4))
+    crossing[i[hit]] = True
+    crossing[j[hit]] = True
+
+    # A shortcut can also pass a whole ring, or cluster of rings, without
+    # touching it: then kept vertices lie inside the area between the shortcut
+    # and its traced run. Only the shortcut's own ends may lie on that area's
+    # border, as no other chain passes the traced run
+    a, b = start[shortcut], end[shortcut]
+    run = _ranges(a, b - a + 1)
+    offsets = np.r_[0, np.cumsum(b - a + 1)[:-1]]
+    bx0, bx1 = np.minimum.reduceat(px[run], offsets), np.maximum.reduceat(px[run], offsets)
+    by0, by1 = np.minimum.reduceat(py[run], offsets), np.maximum.reduceat(py[run], offsets)
+    vx, vy = x0, y0
+    cell = max(float(np.percentile(np.maximum(bx1 - bx0, by1 - by0), 90)), 2.0)
+    gx0, gx1 = (bx0 // cell).astype(np.int64), (bx1 // cell).astype(np.int64)
+    gy0, gy1 = (by0 // cell).astype(np.int64), (by1 // cell).astype(np.int64)
+    nx, ny = gx1 - gx0 + 1, gy1 - gy0 + 1
+    sweep = np.repeat(np.arange(len(a)), nx * ny)
+    k = np.arange(len(sweep)) - np.repeat(np.r_[0, np.cumsum(nx * ny)[:-1]], nx * ny)
+    stride = int(max(gx1.max(), (vx // cell).max())) + 1
+    sweep_cell = (gy0[sweep] + k // nx[sweep]) * stride + gx0[sweep] + k % nx[sweep]
+    vertex_cell = (vy // cell).astype(np.int64) * stride + (vx // cell).astype(np.int64)
+    order = np.argsort(vertex_cell)
+    lo = np.searchsorted(vertex_cell[order], sweep_cell)
+    hi = np.searchsorted(vertex_cell[order], sweep_cell, side="right")
+    s_id = np.repeat(sweep, hi - lo)
+    v_id = order[_ranges(lo, hi - lo)]
+    inside_box = ((bx0[s_id] < vx[v_id]) & (vx[v_id] < bx1[s_id]) & (by0[s_id] < vy[v_id]) & (vy[v_id] < by1[s_id])
+                  & ~((vx[v_id] == px[a[s_id]]) & (vy[v_id] == py[a[s_id]]))
+                  & ~((vx[v_id] == px[b[s_id]]) & (vy[v_id] == py[b[s_id]])))
+    s_id, v_id = s_id[inside_box], v_id[inside_box]
+    if len(s_id):
+        # Even-odd ray cast towards +x over the traced run and the shortcut back
+        n_edges = b[s_id] - a[s_id] + 1
+        pair = np.repeat(np.arange(len(s_id)), n_edges)
+        p = _ranges(a[s_id], n_edges)
+        q = np.where(p == np.repeat(b[s_id], n_edges), np.repeat(a[s_id], n_edges), p + 1)
+        ox, oy = vx[v_id][pair], vy[v_id][pair]
+        spans = (py[p] > oy) != (py[q] > oy)
+        t = (oy - py[p]) / np.where(spans, py[q] - py[p], 1)
+        passes = spans & (px[p] + t * (px[q] - px[p]) > ox)
+        swept = np.bincount(pair, weights=passes, minlength=len(s_id)) % 2 == 1
+        crossing[np.flatnonzero(shortcut)[s_id[swept]]] = True
+    crossing &= shortcut
+    return start[crossing], end[crossing]
+
+def _farthest(run, far, lengths, rings, free) -> np.ndarray:
+    """Index of the farthest point of each junction-free ring from its start.
+    Ties go to the first point, or the last for a ring traversed as the
+    reversed twin, so both twins pick the same vertex."""
+    seg = np.repeat(np.arange(len(lengths)), lengths)
+    peak = np.maximum.reduceat(far, np.r_[0, np.cumsum(lengths)[:-1]])
+    at_peak = np.flatnonzero(far == peak[seg])
+    peak_seg = seg[at_peak]
+    boundary = np.r_[True, peak_seg[1:] != peak_seg[:-1]]
+    first, last = at_peak[boundary], at_peak[np.r_[boundary[1:], True]]
+    owner = rings["region"][free]
+    across = rings["neighbour"][rings["starts"][free]]
+    reverse = (across > 0) & (across < owner)
+    return run[np.where(reverse, last, first)]
+
+def _shoelace(x, y, starts) -> np.ndarray:
+    """Twice the signed area of each closed ring (vertex runs between starts)."""
+    lengths = np.diff(starts)
+    nxt = np.arange(1, len(x) + 1)
+    nxt[starts[1:] - 1] = starts[:-1]
+    return np.add.reduceat(x * y[nxt] - x[nxt] * y, starts[:-1]) if len(x) else np.zeros(len(lengths))
+
+# ── GeoJSON ──────────────────────────────────────────────────
+
+def vectorize(classes: np.ndarray, bbox: list, delta: np.ndarray | None = None, index: str = "nbr",
+              tolerance_px: float = VECTOR_TOLERANCE_PX, min_pixels: int = VECTOR_MIN_PIXELS,
+              max_vertices: int = VECTOR_MAX_VERTICES) -> dict:
+    """Severity polygons for a class raster over a WGS84 bbox, as a FeatureCollection
+    holding about max_vertices coordinates at most."""
+    sieved = sieve(classes, min_pixels)
+    labels, _ = label_regions(sieved)
+    rings = link_rings(trace_edges(np.pad(emitted(sieved), 1), labels), classes.shape[1])
+    del sieved
+    if rings is None:
+        return {"type": "FeatureCollection", "features": []}
+
+    delta_mean = None
+    if delta is not None:
+        finite = np.isfinite(delta)
+        flat = labels.ravel()
+        sums = np.bincount(flat, weights=np.where(finite, delta, 0).ravel())
+        counts = np.bincount(flat, weights=finite.ravel())
+        delta_mean = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    del labels
+    return feature_collection(simplify_rings(rings, tolerance_px, max_vertices), bbox, classes.shape,
+                              delta_mean, index)
+
+def feature_collection(simplified: dict, bbox: list, shape: tuple, delta_mean: np.ndarray | None,
+                       index: str) -> dict:
+    """GeoJSON for simplified rings; delta_mean is indexed by component label."""
+    h, w = shape
+    west, south, east, north = bbox
+    lon = west + simplified["x"] * ((east - west) / w)
+    lat = north - simplified["y"] * ((north - south) / h)
+    starts, area2 = simplified["starts"], simplified["area2"]
+    row_area = pixel_row_areas_km2(bbox, h, w)
+
+    # Tracing keeps regions on a fixed side, so outer rings have negative
+    # area in image coordinates and holes positive; flipping y for latitude
+    # makes outer rings counter-clockwise as RFC 7946 asks
+    polygons: dict[int, dict] = {}
+    for r, (label, severity) in enumerate(zip(simplified["label"].tolist(), simplified["region"].tolist())):
+        polygon = polygons.setdefault(label, {"class": severity, "outer": None, "holes": [], "pixels": 0.0, "row": 0})
+        polygon["pixels"] -= area2[r] / 2
+        a, b = starts[r], starts[r + 1]
+        if b - a < 4:
+            continue  # collapsed below a triangle
+        ring = np.column_stack((lon[a:b], lat[a:b])).round(6).tolist()
+        if area2[r] > 0:
+            polygon["holes"].append(ring)
+        elif polygon["outer"] is None or area2[r] < polygon["outer_area2"]:
+            polygon.update(outer=ring, outer_area2=area2[r], row=int(simplified["mean_y"][r]))
+
+    delta_key = "dnbr_mean" if index == "nbr" else "dndwi_mean"
+    features = []
+    for label, polygon in polygons.items():
+        if polygon["outer"] is None:
+            continue
+        severity = polygon["class"]
+        properties = {
+            "severity_class": severity,
+            "severity_label": SEVERITY_LABELS[severity],
+            "color": SEVERITY_COLORS[severity],
+            "area_km2": round(float(polygon["pixels"] * row_area[min(polygon["row"], h - 1)]), 4),
+        }
+        if delta_mean is not None:
+            properties[delta_key] = round(float(delta_mean[label]), 3)
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [polygon["outer"], *sorted(polygon["holes"])]},
+            "properties": properties,
+        })
+    # Ring starts are canonical, so the first vertex settles ties the same way
+    # however the raster was labelled or tiled
+    features.sort(key=lambda f: (f["properties"]["severity_class"], -f["properties"]["area_km2"],
+                                 f["geometry"]["coordinates"][0][0]))
+
+    logger.info(
+        f"Vectorized {h}x{w} raster into {len(features)} polygons, {simplified['vertices']} vertices "
+        f"(tolerance {simplified['tolerance']:.2f} px)"
+    )
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,172 @@
+"""Cross-process broadcast bus for WebSocket fan-out.
+
+Each uvicorn worker holds its own sockets. The bus carries every broadcast to
+the other workers so a poll or alert in one process reaches clients connected
+to any of them:
+
+  local     single process, nothing leaves the worker
+  postgres  LISTEN/NOTIFY on a dedicated asyncpg connection (default)
+
+Snapshot payloads travel by reference (e.g. a version) so receivers rebuild
+them into their own cache and keep serving it. Anything else goes inline,
+or as a row id in `broadcast_payloads` when over NOTIFY's 8000-byte cap.
+"""
+import os
+import json
+import uuid
+import asyncio
+import logging
+import asyncpg
+from shared.db import execute, fetchval
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "postgres")
+BROADCAST_CHANNEL = "sentinel_broadcast"
+NOTIFY_INLINE_LIMIT = 7000  # leave headroom under Postgres' 8000-byte cap
+RECONNECT_DELAY_S = 5
+
+class LocalBus:
+    distributed = False
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.manager = None
+
+    async def start(self, manager):
+        self.manager = manager
+
+    async def stop(self):
+        pass
+
+    def reaches_remote(self, topic: str | None) -> bool:
+        return False
+
+    async def publish(self, payload_type: str, topic: str | None, message: str, ref: dict | None = None):
+        pass
+
+    def topics_changed(self, added: list[str], removed: list[str]):
+        pass
+
+    async def prune(self):
+        pass
+
+class PostgresBus(LocalBus):
+    distributed = True
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._conn: asyncpg.Connection | None = None
+        self._closing = False
+        self._remote_topics: dict[str, set[str]] = {}
+
+    async def start(self, manager):
+        await super().start(manager)
+        await self._listen()
+        await self._notify({"c": "sync"})
+
+    async def stop(self):
+        self._closing = True
+        if self._conn:
+            await self._conn.close()
+            self._conn = None
+
+    def reaches_remote(self, topic: str | None) -> bool:
+        from shared.ws import DEFAULT_TOPICS
+        if self._conn is None:
+            return False  # not started, or reconnecting
+        if topic is None or topic in DEFAULT_TOPICS:
+            return True
+        return any(topic in topics for topics in self._remote_topics.values())
+
+    async def publish(self, payload_type: str, topic: str | None, message: str, ref: dict | None = None):
+        envelope = {"t": payload_type, "p": topic}
+        if ref:
+            envelope["ref"] = ref
+        elif len(message.encode()) <= NOTIFY_INLINE_LIMIT:
+            envelope["m"] = message
+        else:
+            envelope["id"] = await fetchval(
+                "INSERT INTO broadcast_payloads (body) VALUES ($1) RETURNING id", message
+            )
+        await self._notify(envelope)
+
+    def topics_changed(self, added: list[str], removed: list[str]):
+        if added or removed:
+            asyncio.create_task(self._notify({"c": "topics", "add": added, "remove": removed}))
+
+    async def prune(self):
+        """Stored payloads are only needed until every worker has read them."""
+        await execute("DELETE FROM broadcast_payloads WHERE created_at < now() - interval '10 minutes'")
+
+    async def _notify(self, envelope: dict):
+        envelope["w"] = self.worker_id
+        try:
+            await execute("SELECT pg_notify($1, $2)", BROADCAST_CHANNEL, json.dumps(envelope))
+        except Exception as e:
+            logger.error(f"Broadcast NOTIFY failed: {e}")
+
+    async def _listen(self):
+        self._conn = await asyncpg.connect(self.dsn)
+        self._conn.add_termination_listener(self._on_terminated)
+        await self._conn.add_listener(BROADCAST_CHANNEL, self._on_notify)
+        logger.info(f"Broadcast bus listening on '{BROADCAST_CHANNEL}' as worker {self.worker_id}")
+
+    def _on_terminated(self, conn):
+        self._conn = None
+        if not self._closing:
+            logger.warning("Broadcast bus connection lost — reconnecting")
+            asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._closing:
+            await asyncio.sleep(RECONNECT_DELAY_S)
+            try:
+                await self._listen()
+                await self._notify({"c": "sync"})
+                return
+            except Exception as e:
+                logger.warning(f"Broadcast bus reconnect failed: {e}")
+
+    def _on_notify(self, conn, pid, channel, payload: str):
+        try:
+            envelope = json.loads(payload)
+        except ValueError:
+            return
+        if envelope.get("w") == self.worker_id:
+            return  # already delivered locally
+        asyncio.create_task(self._handle(envelope))
+
+    async def _handle(self, envelope: dict):
+        worker = envelope["w"]
+        try:
+            control = envelope.get("c")
+            if control == "sync":
+                # A worker (re)joined: tell it which per-event topics we serve
+                await self._notify({"c": "topics", "all": sorted(self.manager.topics)})
+            elif control == "topics":
+                topics = self._remote_topics.setdefault(worker, set())
+                if "all" in envelope:
+                    topics.clear()
+                    topics.update(envelope["all"])
+                topics.update(envelope.get("add", []))
+                topics.difference_update(envelope.get("remove", []))
+            elif "m" in envelope:
+                self.manager.deliver(envelope["t"], envelope["p"], envelope["m"])
+            elif "ref" in envelope:
+                await self.manager.deliver_ref(envelope["t"], envelope["p"], envelope["ref"])
+            elif "id" in envelope:
+                body = await fetchval("SELECT body FROM broadcast_payloads WHERE id = $1", envelope["id"])
+                if body:
+                    self.manager.deliver(envelope["t"], envelope["p"], body)
+        except Exception as e:
+            logger.error(f"Broadcast from worker {worker} failed: {e}")
+
+def create_bus() -> LocalBus:
+    if BROADCAST_BACKEND == "postgres":
+        dsn = os.getenv("BROADCAST_DATABASE_URL") or os.getenv("NEON_DATABASE_URL")
+        if dsn:
+            return PostgresBus(dsn)
+        logger.warning("No database URL for the broadcast bus — broadcasting within this worker only")
+    return LocalBus()
@@ -1,48 +1,273 @@
-"""Shared database client — asyncpg connection pool to Neon PostgreSQL."""
+"""Shared database client — asyncpg connection pool to Neon PostgreSQL.
+
+Every pooled connection gets type codecs on init: json/jsonb columns take and
+return Python objects (encoded with orjson when installed), and uuid columns
+come back as plain strings. Callers never json.dumps/json.loads column values.
+
+By default each helper call borrows a connection for one statement. Inside
+`async with unit_of_work():` every helper — including those called from
+nested service functions — runs on the same connection, optionally inside one
+transaction. Repeated statements are prepared once per connection by
+asyncpg's own statement cache (DB_STATEMENT_CACHE_SIZE entries).
+
+Connections come from named pools so one workload cannot starve another:
+
+  interactive  API requests and WebSocket handlers (default)
+  background   scheduler jobs and pipeline stages
+  bulk         large writes (COPY merges, assessment result sets)
+  replica      reads from GET requests, when NEON_READ_REPLICA_URL is set
+               (main.route_reads keeps status polls and recent writers on the primary)
+
+Sizes are set per pool with DB_POOL_<NAME>_MIN / DB_POOL_<NAME>_MAX. Code
+picks a pool with `use_pool(name)` or the `@pooled(name)` decorator; the
+choice is inherited by everything called underneath.
+"""
+import gc
 import os
+import sys
+import json
+import time
+import asyncio
+import functools
 import asyncpg
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
+from shared.db_metrics import pool_metrics, query_metrics, rows_from_status
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
 
 load_dotenv()
 
-_pool: asyncpg.Pool | None = None
+# name -> (default min_size, default max_size); together no more than the old single pool of 10
+POOL_SIZES = {"interactive": (2, 5), "background": (1, 3), "bulk": (1, 2)}
+REPLICA_POOL_SIZE = (1, 5)
+READ_METHODS = {"fetch", "fetchrow", "fetchval"}
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))  # per connection; 0 disables
+
+_pools: dict[str, asyncpg.Pool] = {}
+_pools_lock = asyncio.Lock()
+_workload: ContextVar[str] = ContextVar("db_workload", default="interactive")
+_replica_reads: ContextVar[bool] = ContextVar("db_replica_reads", default=False)
+# (connection, owning task) of the active unit of work
+_current_conn: ContextVar[tuple | None] = ContextVar("db_unit_of_work", default=None)
+
+def _pool_size(name: str, defaults: tuple[int, int]) -> tuple[int, int]:
+    min_size = int(os.getenv(f"DB_POOL_{name.upper()}_MIN", defaults[0]))
+    max_size = int(os.getenv(f"DB_POOL_{name.upper()}_MAX", defaults[1]))
+    return min(min_size, max_size), max_size
 
 async def init_db_pool():
-    global _pool
     db_url = os.getenv("NEON_DATABASE_URL")
     if not db_url:
         raise RuntimeError("NEON_DATABASE_URL is not set. Please configure terra/backend/.env")
-    _pool = await asyncpg.create_pool(db_url, min_size=2, max_size=10)
-    return _pool
+    async with _pools_lock:
+        if not _pools:
+            for name, sizes in POOL_SIZES.items():
+                _pools[name] = await _create_pool(db_url, name, sizes)
+            replica_url = os.getenv("NEON_READ_REPLICA_URL")
+            if replica_url:
+                _pools["replica"] = await _create_pool(replica_url, "replica", REPLICA_POOL_SIZE)
+    return _pools["interactive"]
+
+async def _create_pool(url: str, name: str, sizes: tuple[int, int]) -> asyncpg.Pool:
+    min_size, max_size = _pool_size(name, sizes)
+    return await asyncpg.create_pool(url, min_size=min_size, max_size=max_size, init=_init_connection,
+                                     statement_cache_size=STATEMENT_CACHE_SIZE)
+
+def encode_json(value) -> bytes:
+    if orjson:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, default=str, separators=(",", ":")).encode()
+
+GC_PAUSE_BYTES = 1 << 20
+
+def decode_json(data: bytes):
+    loads = orjson.loads if orjson else json.loads
+    if len(data) < GC_PAUSE_BYTES or not gc.isenabled():
+        return loads(data)
+    # Building a multi-MB GeoJSON allocates ~10^5 lists/dicts, which otherwise
+    # triggers repeated full-generation collections mid-parse
+    gc.disable()
+    try:
+        return loads(data)
+    finally:
+        gc.enable()
+
+def _encode_jsonb(value) -> bytes:
+    return b"\x01" + encode_json(value)  # jsonb binary format version 1
+
+def _decode_jsonb(data: bytes):
+    return decode_json(data[1:])
 
-async def get_pool() -> asyncpg.Pool:
-    global _pool
-    if _pool is None:
+async def _init_connection(conn: asyncpg.Connection):
+    # Binary format skips Postgres' text round-trip for multi-MB GeoJSON
+    await conn.set_type_codec("jsonb", schema="pg_catalog", format="binary",
+                              encoder=_encode_jsonb, decoder=_decode_jsonb)
+    await conn.set_type_codec("json", schema="pg_catalog", format="binary",
+                              encoder=encode_json, decoder=decode_json)
+    await conn.set_type_codec("uuid", schema="pg_catalog", format="text",
+                              encoder=str, decoder=str)
+
+async def get_pool(name: str | None = None) -> asyncpg.Pool:
+    """The named pool, or the one for the current workload."""
+    if not _pools:
         await init_db_pool()
-    return _pool
+    return _pools[name or _workload.get()]
+
+def pools() -> dict[str, asyncpg.Pool]:
+    return dict(_pools)
 
 async def close_db_pool():
-    global _pool
-    if _pool:
-        await _pool.close()
-        _pool = None
+    for pool in _pools.values():
+        await pool.close()
+    _pools.clear()
+
+@contextmanager
+def use_pool(name: str, replica_reads: bool | None = None):
+    """Route db helpers in this block (and tasks it spawns) to a named pool.
+    replica_reads sends fetch/fetchrow/fetchval to the replica if configured."""
+    if name not in POOL_SIZES:
+        raise ValueError(f"Unknown pool '{name}'")
+    token = _workload.set(name)
+    replica_token = _replica_reads.set(replica_reads) if replica_reads is not None else None
+    try:
+        yield
+    finally:
+        _workload.reset(token)
+        if replica_token is not None:
+            _replica_reads.reset(replica_token)
+
+def pooled(name: str):
+    """Decorator: run a coroutine function on a named pool."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with use_pool(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _caller() -> str:
+    """Name of the function that called the public helper (two frames up)."""
+    frame = sys._getframe(2)
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+def _row_count(method: str, result) -> int:
+    if method == "execute":
+        return rows_from_status(result)
+    if method == "fetch":
+        return len(result)
+    return 0 if result is None else 1
+
+@asynccontextmanager
+async def unit_of_work(transaction: bool = False, pool: str | None = None):
+    """Run every db helper in the block on one connection. With transaction=True
+    the block commits or rolls back as a whole; nested units share the outer
+    connection and a nested transactional unit becomes a savepoint. Units
+    always use the primary, never the replica."""
+    conn = _unit_connection()
+    if conn is not None:
+        if transaction:
+            async with conn.transaction():
+                yield conn
+        else:
+            yield conn
+        return
+
+    async with _connection(pool=pool) as (conn, _):
+        token = _current_conn.set((conn, asyncio.current_task()))
+        try:
+            if transaction:
+                async with conn.transaction():
+                    yield conn
+            else:
+                yield conn
+        finally:
+            _current_conn.reset(token)
+
+def _unit_connection() -> asyncpg.Connection | None:
+    # Tasks spawned inside a unit inherit the context var but must not share
+    # its connection concurrently; only the task that opened the unit uses it
+    unit = _current_conn.get()
+    if unit is not None and unit[1] is asyncio.current_task():
+        return unit[0]
+    return None
+
+@asynccontextmanager
+async def _connection(method: str | None = None, pool: str | None = None):
+    """The unit-of-work connection if there is one, else one from the pool
+    for this workload. Yields (connection, seconds spent waiting for it)."""
+    conn = _unit_connection()
+    if conn is not None:
+        yield conn, 0.0
+        return
+    
+    name = pool or _workload.get()
+    if method in READ_METHODS and _replica_reads.get() and "replica" in _pools:
+        name = "replica"
+    connections = await get_pool(name)
+    pool_metrics.waiting(name, 1)
+    requested = time.perf_counter()
+    try:
+        conn = await connections.acquire()
+    finally:
+        pool_metrics.waiting(name, -1)
+    waited = time.perf_counter() - requested
+    pool_metrics.acquired(name, waited)
+    try:
+        yield conn, waited
+    finally:
+        await connections.release(conn)
+
+async def _run(method: str, query: str, args: tuple, caller: str):
+    """Run one statement, timing pool wait and execution apart."""
+    async with _connection(method) as (conn, waited):
+        started = time.perf_counter()
+        try:
+            result = await getattr(conn, method)(query, *args)
+        except Exception:
+            query_metrics.record(query, caller, waited, time.perf_counter() - started, 0, error=True)
+            raise
+        query_metrics.record(query, caller, waited, time.perf_counter() - started,
+                             len(args[0]) if method == "executemany" else _row_count(method, result))
+        return result
 
 async def execute(query: str, *args):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        return await conn.execute(query, *args)
+    return await _run("execute", query, args, _caller())
 
 async def fetch(query: str, *args):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        return await conn.fetch(query, *args)
+    return await _run("fetch", query, args, _caller())
 
 async def fetchrow(query: str, *args):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        return await conn.fetchrow(query, *args)
+    return await _run("fetchrow", query, args, _caller())
 
 async def fetchval(query: str, *args):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        return await conn.fetchval(query, *args)
+    return await _run("fetchval", query, args, _caller())
+
+async def executemany(query: str, records: list):
+    """Run a statement once per record, pipelined on one connection."""
+    if records:
+        await _run("executemany", query, (records,), _caller())
+
+async def copy_merge(staging: str, columns: list[tuple[str, str]], records: list, merge_sql: str, *args):
+    """Bulk-load records into a transaction-scoped staging table with COPY,
+    then run a single merge statement against it and return its rows."""
+    caller = _caller()
+    async with _connection(pool="bulk") as (conn, waited):
+        started = time.perf_counter()
+        async with conn.transaction():
+            column_defs = ", ".join(f"{name} {pg_type}" for name, pg_type in columns)
+            await conn.execute(f"CREATE TEMP TABLE {staging} ({column_defs}) ON COMMIT DROP")
+            await conn.copy_records_to_table(
+                staging, records=records, columns=[name for name, _ in columns]
+            )
+            copied = time.perf_counter()
+            query_metrics.record(f"COPY {staging}", caller, waited, copied - started, len(records))
+            rows = await conn.fetch(merge_sql, *args)
+            query_metrics.record(merge_sql, caller, 0, time.perf_counter() - copied, len(rows))
+            return rows
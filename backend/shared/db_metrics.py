@@ -0,0 +1,210 @@
+"""Per-query telemetry for shared/db.py.
+
+Every statement run through the db helpers is reduced to a fingerprint —
+literals replaced by `?`, whitespace collapsed — and timed in two parts:
+waiting for a pool connection, and executing on it. Counters, a latency
+histogram and row counts are kept per fingerprint, along with the functions
+that issued it, and statements slower than DB_SLOW_QUERY_MS are logged.
+
+PoolMetrics tracks the acquire side of each named pool: connections in use,
+callers queued for one and how long they waited.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+from typing import Literal, get_args
+
+logger = logging.getLogger(__name__)
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_CALLERS = 5
+# Per-fingerprint fields the snapshot can be ordered by
+SortField = Literal["total_exec_ms", "total_wait_ms", "mean_exec_ms", "max_exec_ms", "max_wait_ms",
+                    "p50_ms", "p95_ms", "p99_ms", "calls", "errors", "rows"]
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def fingerprint(query: str) -> tuple[str, str]:
+    """Return (fingerprint id, normalized statement)."""
+    normalized = _COMMENTS.sub(" ", query)
+    normalized = _STRINGS.sub("?", normalized)
+    normalized = _NUMBERS.sub("?", normalized)
+    normalized = _IN_LISTS.sub("(?)", normalized)
+    normalized = _SPACES.sub(" ", normalized).strip()
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest(), normalized
+
+def rows_from_status(status: str) -> int:
+    """Row count from a command tag such as 'UPDATE 3' or 'INSERT 0 1'."""
+    last = status.rsplit(" ", 1)[-1] if status else ""
+    return int(last) if last.isdigit() else 0
+
+class _QueryStats:
+    __slots__ = ("statement", "calls", "errors", "rows", "exec_ms", "wait_ms",
+                 "max_exec_ms", "max_wait_ms", "histogram", "callers")
+
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.exec_ms = 0.0
+        self.wait_ms = 0.0
+        self.max_exec_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.callers: set[str] = set()
+
+    def percentile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-th quantile (None if open-ended)."""
+        target = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target and count:
+                return HISTOGRAM_BOUNDS_MS[i] if i < len(HISTOGRAM_BOUNDS_MS) else None
+        return None
+
+    def as_dict(self, fp: str) -> dict:
+        return {
+            "fingerprint": fp,
+            "statement": self.statement[:300],
+            "callers": sorted(self.callers),
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_exec_ms": round(self.exec_ms, 1),
+            "total_wait_ms": round(self.wait_ms, 1),
+            "mean_exec_ms": round(self.exec_ms / self.calls, 2) if self.calls else 0,
+            "max_exec_ms": round(self.max_exec_ms, 1),
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "histogram": dict(zip([f"le_{b}" for b in HISTOGRAM_BOUNDS_MS] + ["inf"], self.histogram)),
+        }
+
+class QueryMetrics:
+    def __init__(self, slow_ms: float = DB_SLOW_QUERY_MS):
+        self.slow_ms = slow_ms
+        self.queries: dict[str, _QueryStats] = {}
+        self.slow: deque = deque(maxlen=50)
+        self.started_at = time.time()
+
+    def record(self, query: str, caller: str, wait_s: float, exec_s: float, rows: int, error: bool = False):
+        fp, statement = fingerprint(query)
+        stats = self.queries.get(fp)
+        if stats is None:
+            stats = self.queries[fp] = _QueryStats(statement)
+
+        wait_ms, exec_ms = wait_s * 1000, exec_s * 1000
+        stats.calls += 1
+        stats.errors += error
+        stats.rows += rows
+        stats.exec_ms += exec_ms
+        stats.wait_ms += wait_ms
+        stats.max_exec_ms = max(stats.max_exec_ms, exec_ms)
+        stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+        stats.histogram[bisect_left(HISTOGRAM_BOUNDS_MS, exec_ms)] += 1
+        if len(stats.callers) < MAX_CALLERS:
+            stats.callers.add(caller)
+
+        if exec_ms + wait_ms >= self.slow_ms:
+            self.slow.append({
+                "fingerprint": fp, "caller": caller, "exec_ms": round(exec_ms, 1),
+                "wait_ms": round(wait_ms, 1), "rows": rows, "at": time.time(),
+            })
+            logger.warning(
+                f"Slow query {fp} from {caller}: {exec_ms:.0f} ms exec + {wait_ms:.0f} ms pool wait, "
+                f"{rows} rows — {statement[:200]}"
+            )
+
+    def snapshot(self, top: int = 50, sort: SortField = "total_exec_ms") -> dict:
+        if sort not in get_args(SortField):
+            raise ValueError(f"cannot sort query metrics by {sort!r}")
+        queries = [s.as_dict(fp) for fp, s in self.queries.items()]
+        queries.sort(key=lambda q: q.get(sort) or 0, reverse=True)
+        return {
+            "since": self.started_at,
+            "slow_query_ms": self.slow_ms,
+            "fingerprints": len(queries),
+            "calls": sum(q["calls"] for q in queries),
+            "total_exec_ms": round(sum(q["total_exec_ms"] for q in queries), 1),
+            "total_wait_ms": round(sum(q["total_wait_ms"] for q in queries), 1),
+            "queries": queries[:top],
+            "slow_queries": list(self.slow),
+        }
+
+    def reset(self):
+        self.queries.clear()
+        self.slow.clear()
+        self.started_at = time.time()
+
+query_metrics = QueryMetrics()
+
+class PoolMetrics:
+    """Acquire-side saturation counters for each named pool."""
+    SLOW_ACQUIRE_MS = 100
+
+    def __init__(self):
+        self.pools: dict[str, dict] = {}
+
+    def _get(self, name: str) -> dict:
+        stats = self.pools.get(name)
+        if stats is None:
+            stats = self.pools[name] = {"acquires": 0, "waiting": 0, "peak_waiting": 0,
+                                        "total_wait_ms": 0.0, "max_wait_ms": 0.0, "slow_acquires": 0}
+        return stats
+
+    def waiting(self, name: str, delta: int):
+        stats = self._get(name)
+        stats["waiting"] += delta
+        stats["peak_waiting"] = max(stats["peak_waiting"], stats["waiting"])
+
+    def acquired(self, name: str, wait_s: float):
+        stats = self._get(name)
+        wait_ms = wait_s * 1000
+        stats["acquires"] += 1
+        stats["total_wait_ms"] += wait_ms
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], wait_ms)
+        stats["slow_acquires"] += wait_ms >= self.SLOW_ACQUIRE_MS
+
+    def snapshot(self, pools: dict) -> dict:
+        result = {}
+        for name, pool in pools.items():
+            stats = self._get(name)
+            size, idle, max_size = pool.get_size(), pool.get_idle_size(), pool.get_max_size()
+            in_use = size - idle
+            result[name] = {
+                "min_size": pool.get_min_size(),
+                "max_size": max_size,
+                "size": size,
+                "idle": idle,
+                "in_use": in_use,
+                "saturation": round(in_use / max_size, 2) if max_size else 0,
+                "waiting": stats["waiting"],
+                "peak_waiting": stats["peak_waiting"],
+                "acquires": stats["acquires"],
+                "mean_wait_ms": round(stats["total_wait_ms"] / stats["acquires"], 2) if stats["acquires"] else 0,
+                "max_wait_ms": round(stats["max_wait_ms"], 1),
+                "slow_acquires": stats["slow_acquires"],
+            }
+        return result
+
+    def reset(self):
+        for stats in self.pools.values():
+            waiting = stats["waiting"]
+            stats.update(acquires=0, peak_waiting=waiting, total_wait_ms=0.0, max_wait_ms=0.0, slow_acquires=0)
+
+pool_metrics = PoolMetrics()
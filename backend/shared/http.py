@@ -0,0 +1,20 @@
+"""Shared HTTP client — one long-lived pooled httpx.AsyncClient per process."""
+import httpx
+
+_client: httpx.AsyncClient | None = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            follow_redirects=True,
+        )
+    return _client
+
+async def close_http_client():
+    global _client
+    if _client:
+        await _client.aclose()
+        _client = None
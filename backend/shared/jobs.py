@@ -0,0 +1,284 @@
+"""Durable pipeline job queue.
+
+Jobs live in `pipeline_jobs`, so they survive restarts and are shared by every
+uvicorn worker. Each worker runs PIPELINE_WORKERS consumer tasks that claim the
+most urgent runnable job with SELECT … FOR UPDATE SKIP LOCKED: no two consumers
+run the same job and none waits on another's row lock.
+
+  dedupe    one queued or running job per (event_id, stage); enqueueing again
+            returns the existing job (partial unique index). A job done within
+            JOB_DONE_DEDUPE_S is returned too, unless the caller asks for a rerun
+  priority  red before orange before green, then larger affected_population,
+            then oldest first
+  retry     a failed attempt is requeued after JOB_RETRY_BASE_S * 2^(attempt-1),
+            capped and jittered, until the job's max_attempts
+  recovery  a running job whose heartbeat stops (worker crashed or was killed)
+            is requeued by whichever consumer notices first
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable
+from shared.db import execute, fetch, fetchrow, fetchval, pooled
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_S = float(os.getenv("JOB_RETRY_BASE_S", "30"))
+JOB_RETRY_MAX_S = 3600.0
+JOB_DONE_DEDUPE_S = float(os.getenv("JOB_DONE_DEDUPE_S", str(24 * 3600)))
+JOB_POLL_S = 5.0
+JOB_HEARTBEAT_S = 30.0
+JOB_STALE_S = 4 * JOB_HEARTBEAT_S
+JOB_RETENTION_DAYS = 7
+SEVERITY_PRIORITY = {"red": 2, "orange": 1}
+
+def job_priority(severity: str | None) -> int:
+    """Claim priority of a job for an event of this severity; higher runs first."""
+    return SEVERITY_PRIORITY.get(severity, 0)
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before retrying a job whose attempt number `attempts` failed."""
+    return min(JOB_RETRY_BASE_S * 2 ** (attempts - 1), JOB_RETRY_MAX_S) * random.uniform(0.8, 1.2)
+
+class JobQueue:
+    def __init__(self, workers: int = PIPELINE_WORKERS):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.workers = workers
+        self._handlers: dict[str, Callable[[dict], Awaitable]] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._wake = asyncio.Event()
+        self._running: dict[int, str] = {}
+        self._last_reap = 0.0
+        self._counters = {"claimed": 0, "succeeded": 0, "retried": 0, "failed": 0, "requeued_stale": 0}
+
+    def register(self, stage: str, handler: Callable[[dict], Awaitable]):
+        """handler(job) runs one job; raising marks the attempt failed."""
+        self._handlers[stage] = handler
+
+    # ── Producers ────────────────────────────────────────────
+
+    async def enqueue(self, stage: str, event_id: str, payload: dict | None = None,
+                      max_attempts: int = JOB_MAX_ATTEMPTS, rerun: bool = False) -> tuple[int | None, bool]:
+        """Queue a job unless one for (event_id, stage) is already queued or
+        running, or finished within JOB_DONE_DEDUPE_S. rerun skips the latter
+        check, for callers that mean to repeat finished work. Returns
+        (job id, created); (None, False) if the event is unknown."""
+        event = await fetchrow("SELECT severity, affected_population FROM events WHERE id = $1::uuid", event_id)
+        if event is None:
+            return None, False
+        done_within = None if rerun else JOB_DONE_DEDUPE_S
+        for _ in range(2):
+            job_id = await fetchval("""
+                INSERT INTO pipeline_jobs (stage, event_id, payload, priority, population, max_attempts)
+                SELECT $1, $2::uuid, $3, $4, $5, $6
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM pipeline_jobs d
+                    WHERE d.event_id = $2::uuid AND d.stage = $1 AND d.status = 'done'
+                      AND d.finished_at > now() - make_interval(secs => $7::float8)
+                )
+                ON CONFLICT (event_id, stage) WHERE status IN ('queued', 'running') DO NOTHING
+                RETURNING id
+            """, stage, event_id, payload or {}, job_priority(event["severity"]),
+                event["affected_population"] or 0, max_attempts, done_within)
+            if job_id is not None:
+                self._wake.set()
+                return job_id, True
+            existing = await fetchval("""
+                SELECT id FROM pipeline_jobs
+                WHERE event_id = $1::uuid AND stage = $2
+                  AND (status IN ('queued', 'running')
+                       OR (status = 'done' AND finished_at > now() - make_interval(secs => $3::float8)))
+                ORDER BY status = 'done', finished_at DESC
+                LIMIT 1
+            """, event_id, stage, done_within)
+            if existing is not None:
+                return existing, False
+            # The duplicate finished in between: insert again
+        return None, False
+
+    # ── Consumers ────────────────────────────────────────────
+
+    async def start(self):
+        if self._tasks or not self.workers:
+            return
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        logger.info(f"Job queue worker {self.worker_id}: {self.workers} consumers for {sorted(self._handlers)}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand interrupted jobs straight back rather than waiting for them to go stale
+        try:
+            await execute("""
+                UPDATE pipeline_jobs
+                SET status = 'queued', locked_by = NULL, run_after = now(), attempts = GREATEST(attempts - 1, 0)
+                WHERE status = 'running' AND locked_by = $1
+            """, self.worker_id)
+        except Exception as e:
+            logger.warning(f"Could not release running jobs of worker {self.worker_id}: {e}")
+
+    @pooled("background")
+    async def _consume(self):
+        while True:
+            try:
+                await self._reap_stale()
+                self._wake.clear()
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job queue claim failed: {e}")
+                await asyncio.sleep(JOB_POLL_S)
+                continue
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOB_POLL_S)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _claim(self) -> dict | None:
+        row = await fetchrow("""
+            UPDATE pipeline_jobs SET
+                status = 'running', attempts = attempts + 1, locked_by = $1,
+                started_at = now(), heartbeat_at = now(),
+                first_started_at = COALESCE(first_started_at, now())
+            WHERE id = (
+                SELECT id FROM pipeline_jobs
+                WHERE status = 'queued' AND run_after <= now() AND stage = ANY($2::text[])
+                ORDER BY priority DESC, population DESC, created_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        """, self.worker_id, list(self._handlers))
+        if row is not None:
+            self._counters["claimed"] += 1
+        return dict(row) if row else None
+
+    async def _run(self, job: dict):
+        job_id, stage = job["id"], job["stage"]
+        self._running[job_id] = stage
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        start = time.monotonic()
+        try:
+            await self._handlers[stage](job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._failed(job, e)
+        else:
+            await execute("""
+                UPDATE pipeline_jobs SET status = 'done', finished_at = now(), locked_by = NULL, last_error = NULL
+                WHERE id = $1
+            """, job_id)
+            self._counters["succeeded"] += 1
+            logger.info(f"Job {job_id} ({stage}, event {job['event_id']}) done in {time.monotonic() - start:.1f}s")
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+
+    async def _failed(self, job: dict, error: Exception):
+        attempts = job["attempts"]
+        if attempts >= job["max_attempts"]:
+            await execute("""
+                UPDATE pipeline_jobs SET status = 'failed', finished_at = now(), locked_by = NULL, last_error = $2
+                WHERE id = $1
+            """, job["id"], str(error))
+            self._counters["failed"] += 1
+            logger.error(f"Job {job['id']} ({job['stage']}) failed after {attempts} attempts: {error}")
+            return
+        delay = retry_delay(attempts)
+        await execute("""
+            UPDATE pipeline_jobs SET
+                status = 'queued', locked_by = NULL, last_error = $2,
+                run_after = now() + make_interval(secs => $3)
+            WHERE id = $1
+        """, job["id"], str(error), delay)
+        self._counters["retried"] += 1
+        logger.warning(f"Job {job['id']} ({job['stage']}) attempt {attempts} failed, retrying in {delay:.0f}s: {error}")
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_S)
+            try:
+                await execute("UPDATE pipeline_jobs SET heartbeat_at = now() WHERE id = $1", job_id)
+            except Exception as e:
+                logger.warning(f"Heartbeat for job {job_id} failed: {e}")
+
+    async def _reap_stale(self):
+        if time.monotonic() - self._last_reap < JOB_HEARTBEAT_S:
+            return
+        self._last_reap = time.monotonic()
+        rows = await fetch("""
+            UPDATE pipeline_jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+                locked_by = NULL, run_after = now(), last_error = 'worker stopped responding'
+            WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => $1)
+            RETURNING id
+        """, JOB_STALE_S)
+        if rows:
+            self._counters["requeued_stale"] += len(rows)
+            logger.warning(f"Recovered {len(rows)} jobs from unresponsive workers: {[r['id'] for r in rows]}")
+
+    # ── Maintenance and metrics ──────────────────────────────
+
+    async def prune(self):
+        await execute("""
+            DELETE FROM pipeline_jobs
+            WHERE status IN ('done', 'failed') AND finished_at < now() - make_interval(days => $1)
+        """, JOB_RETENTION_DAYS)
+
+    async def metrics(self) -> dict:
+        """Queue depth and age per stage, and wait/run times over the last hour."""
+        depth = await fetch("""
+            SELECT stage,
+                   count(*) FILTER (WHERE status = 'queued') AS queued,
+                   count(*) FILTER (WHERE status = 'queued' AND run_after > now()) AS backing_off,
+                   count(*) FILTER (WHERE status = 'running') AS running,
+                   EXTRACT(EPOCH FROM now() - min(created_at) FILTER (WHERE status = 'queued')) AS oldest_queued_s
+            FROM pipeline_jobs
+            WHERE status IN ('queued', 'running')
+            GROUP BY stage
+        """)
+        recent = await fetch("""
+            SELECT stage,
+                   count(*) FILTER (WHERE status = 'done') AS done,
+                   count(*) FILTER (WHERE status = 'failed') AS failed,
+                   avg(EXTRACT(EPOCH FROM first_started_at - created_at)) AS wait_mean_s,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM first_started_at - created_at)) AS wait_p95_s,
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM finished_at - started_at)) AS run_p95_s
+            FROM pipeline_jobs
+            WHERE finished_at > now() - INTERVAL '1 hour'
+            GROUP BY stage
+        """)
+        return {
+            "worker_id": self.worker_id,
+            "consumers": len(self._tasks),
+            "running_here": self._running,
+            "counters": self._counters,
+            "depth": {r["stage"]: {k: v for k, v in dict(r).items() if k != "stage"} for r in depth},
+            "last_hour": {r["stage"]: {k: v for k, v in dict(r).items() if k != "stage"} for r in recent},
+        }
+
+    async def list_jobs(self, status: str | None = None, limit: int = 100) -> list[dict]:
+        rows = await fetch("""
+            SELECT id, stage, event_id, status, priority, population, attempts, max_attempts,
+                   run_after, created_at, started_at, finished_at, last_error
+            FROM pipeline_jobs
+            WHERE $1::text IS NULL OR status = $1
+            ORDER BY created_at DESC
+            LIMIT $2
+        """, status, limit)
+        return [dict(r) for r in rows]
+
+job_queue = JobQueue()
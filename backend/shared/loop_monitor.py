@@ -0,0 +1,74 @@
+"""Event loop lag monitor.
+
+A task sleeps LOOP_MONITOR_INTERVAL_S at a time and records how much later
+than asked it woke up. That overshoot is how long every other coroutine —
+API routes, WebSocket sends — was kept waiting by whatever was running on
+the loop. Recent samples give percentiles; stalls over LOOP_LAG_WARN_MS are
+logged as they happen.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_INTERVAL_S = float(os.getenv("LOOP_MONITOR_INTERVAL_S", "0.1"))
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "250"))
+SAMPLES = 3000  # five minutes at the default interval
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL_S):
+        self.interval = interval
+        self._samples: deque[float] = deque(maxlen=SAMPLES)
+        self._task: asyncio.Task | None = None
+        self._max_ms = 0.0
+        self._stalls = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max((time.perf_counter() - start - self.interval) * 1000, 0.0)
+            self.record(lag_ms)
+
+    def record(self, lag_ms: float):
+        self._samples.append(lag_ms)
+        self._max_ms = max(self._max_ms, lag_ms)
+        if lag_ms > LOOP_LAG_WARN_MS:
+            self._stalls += 1
+            logger.warning(f"Event loop stalled for {lag_ms:.0f} ms")
+
+    def snapshot(self) -> dict:
+        samples = sorted(self._samples)
+
+        def pct(q: float) -> float | None:
+            return round(samples[min(int(q * len(samples)), len(samples) - 1)], 1) if samples else None
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(samples),
+            "p50_ms": pct(0.5),
+            "p99_ms": pct(0.99),
+            "recent_max_ms": round(samples[-1], 1) if samples else None,
+            "max_ms": round(self._max_ms, 1),
+            "stalls": self._stalls,
+        }
+
+    def reset(self):
+        self._samples.clear()
+        self._max_ms = 0.0
+        self._stalls = 0
+
+loop_monitor = LoopMonitor()
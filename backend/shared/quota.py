@@ -4,7 +4,7 @@ All limits tracked in the database to survive restarts.
 """
 import os
 from datetime import datetime, date
-from shared.db import fetchval, execute
+from shared.db import fetchval, fetchrow, execute
 
 # ── Sentinel Hub ──────────────────────────────────────────────
 SENTINEL_HUB_MONTHLY_LIMIT = 30_000
@@ -19,11 +19,24 @@ async def check_sentinel_quota() -> bool:
     )
     return (used or 0) < SENTINEL_HUB_SAFE_LIMIT
 
-async def record_sentinel_usage(units: int):
+async def sentinel_units_remaining() -> int:
+    """Processing units left under the safe limit this month."""
+    month_key = date.today().strftime("%Y-%m")
+    used = await fetchval(
+        "SELECT COALESCE(SUM(units_used), 0) FROM sentinel_quota_log WHERE month_key = $1",
+        month_key
+    )
+    return max(SENTINEL_HUB_SAFE_LIMIT - int(used or 0), 0)
+
+async def record_sentinel_usage(units: float, request_kind: str = "process", latency_ms: int | None = None,
+                                status_code: int | None = None, response_bytes: int | None = None,
+                                job_id: str | None = None):
     month_key = date.today().strftime("%Y-%m")
     await execute(
-        "INSERT INTO sentinel_quota_log (month_key, units_used, recorded_at) VALUES ($1, $2, now())",
-        month_key, units
+        """INSERT INTO sentinel_quota_log
+               (month_key, units_used, request_kind, latency_ms, status_code, response_bytes, job_id, recorded_at)
+           VALUES ($1, $2, $3, $4, $5, $6, $7, now())""",
+        month_key, units, request_kind, latency_ms, status_code, response_bytes, job_id
     )
 
 # ── Gemini Vision ─────────────────────────────────────────────
@@ -56,6 +69,16 @@ async def get_quota_status() -> dict:
         month_key
     ) or 0
     
+    sentinel_calls = await fetchrow(
+        """SELECT count(*) AS calls,
+                  count(*) FILTER (WHERE status_code IS DISTINCT FROM 200) AS errors,
+                  percentile_cont(0.5) WITHIN GROUP (ORDER BY latency_ms) AS p50_ms,
+                  percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_ms
+           FROM sentinel_quota_log
+           WHERE month_key = $1 AND request_kind = 'process'""",
+        month_key
+    )
+    
     gemini_used = await fetchval(
         "SELECT COALESCE(SUM(calls), 0) FROM gemini_quota_log WHERE day_key = $1",
         today
@@ -63,11 +86,15 @@ async def get_quota_status() -> dict:
     
     return {
         "sentinel_hub": {
-            "used": int(sentinel_used),
+            "used": round(float(sentinel_used), 2),
             "limit": SENTINEL_HUB_MONTHLY_LIMIT,
             "safe_limit": SENTINEL_HUB_SAFE_LIMIT,
-            "pct_used": round(sentinel_used / SENTINEL_HUB_MONTHLY_LIMIT * 100, 1),
-            "status": "ok" if sentinel_used < SENTINEL_HUB_SAFE_LIMIT else "quota_warning"
+            "pct_used": round(float(sentinel_used) / SENTINEL_HUB_MONTHLY_LIMIT * 100, 1),
+            "status": "ok" if sentinel_used < SENTINEL_HUB_SAFE_LIMIT else "quota_warning",
+            "calls": sentinel_calls["calls"],
+            "errors": sentinel_calls["errors"],
+            "p50_latency_ms": sentinel_calls["p50_ms"],
+            "p95_latency_ms": sentinel_calls["p95_ms"],
         },
         "gemini": {
             "used_today": int(gemini_used),
@@ -1,43 +1,293 @@
-"""WebSocket connection manager for real-time dashboard updates."""
+"""WebSocket connection manager for real-time dashboard updates.
+
+Each connection gets a bounded outgoing queue drained by its own writer task,
+so a broadcast only encodes the message once and enqueues it; one slow client
+can no longer hold up delivery to everyone else.
+
+Clients receive messages by topic. Every socket starts on the global
+`events` and `alerts` topics and can send
+    {"action": "subscribe" | "unsubscribe", "topics": ["event:<uuid>:buildings", ...]}
+to follow per-event updates without polling.
+
+Broadcasts are also handed to the bus (shared/bus.py) so clients connected to
+other workers receive them; messages arriving from the bus go out via deliver().
+"""
+import os
+import re
 import json
+import time
+import asyncio
 import logging
-from typing import List
+from collections import deque
+from typing import Awaitable, Callable, List
 from fastapi import WebSocket
+from shared.bus import LocalBus, create_bus
 
 logger = logging.getLogger(__name__)
 
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "32"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# keep_latest: drop superseded full snapshots and keep the newest one
+# disconnect:  close any client whose queue overflows
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "keep_latest")
+
+# Full-state payloads; an older one queued behind a newer one on the same
+# topic is worthless
+SNAPSHOT_TYPES = {"events_update", "alerts_update", "buildings_update"}
+
+DEFAULT_TOPICS = ("events", "alerts")
+MAX_TOPICS_PER_CLIENT = 64
+TOPIC_PATTERN = re.compile(
+    r"^(events|alerts(:(critical|warning|info))?"
+    r"|event:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    r":(buildings|ground_truth|recovery|analysis))$"
+)
+# Topic a global payload type is delivered on when no topic is given
+PAYLOAD_TOPICS = {"events_update": "events", "events_delta": "events", "alerts_update": "alerts"}
+
+class _Client:
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.pending: deque = deque()  # (payload_type, topic, message, enqueued_at)
+        self.wakeup = asyncio.Event()
+        self.writer: asyncio.Task | None = None
+        self.topics: set[str] = set()
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self.pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "connected_for_s": round(time.time() - self.connected_at),
+            "topics": len(self.topics),
+        }
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, queue_size: int = WS_QUEUE_SIZE, policy: str = WS_SLOW_CONSUMER_POLICY,
+                 send_timeout: float = WS_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.clients: dict[WebSocket, _Client] = {}
+        self.topics: dict[str, set[_Client]] = {}
+        self.slow_disconnects = 0
+        self.bus = create_bus()
+        # kind -> coroutine turning a by-reference broadcast back into data
+        self._ref_resolvers: dict[str, Callable[[dict], Awaitable[any]]] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"Client connected. Active clients: {len(self.active_connections)}")
+        client = _Client(websocket)
+        client.writer = asyncio.create_task(self._write_loop(client))
+        self.clients[websocket] = client
+        self.subscribe(websocket, DEFAULT_TOPICS)
+        logger.info(f"Client connected. Active clients: {len(self.clients)}")
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            logger.info(f"Client disconnected. Active clients: {len(self.active_connections)}")
+        client = self.clients.pop(websocket, None)
+        if client:
+            self._remove_from_topics(client, list(client.topics))
+            if client.writer and client.writer is not asyncio.current_task():
+                client.writer.cancel()
+            logger.info(f"Client disconnected. Active clients: {len(self.clients)}")
+
+    async def start_bus(self):
+        try:
+            await self.bus.start(self)
+        except Exception as e:
+            logger.warning(f"Broadcast bus unavailable ({e}) — broadcasting within this worker only")
+            self.bus = LocalBus()
+            await self.bus.start(self)
 
-    async def broadcast(self, payload_type: str, data: any):
-        """Broadcast JSON state to all connected clients."""
-        if not self.active_connections:
+    async def stop_bus(self):
+        await self.bus.stop()
+
+    def register_ref(self, kind: str, resolver: Callable[[dict], Awaitable[any]]):
+        """Register how receivers rebuild a broadcast sent by reference, e.g. a
+        snapshot version each worker can load from its own cache."""
+        self._ref_resolvers[kind] = resolver
+
+    async def broadcast(self, payload_type: str, data: any, topic: str | None = None,
+                        ref: dict | None = None):
+        """Broadcast JSON state to every subscriber of a topic, on every worker.
+        Without a topic, global payload types go to their default topic and
+        anything else to all. `ref` ({"kind": ..., ...}) has other workers
+        rebuild the payload from their own cache instead of receiving it."""
+        topic = topic or PAYLOAD_TOPICS.get(payload_type)
+        remote = self.bus.reaches_remote(topic)
+        if not self._targets(topic) and not remote:
             return  # No one listening, save CPU
 
-        message = json.dumps({"type": payload_type, "data": data}, default=str)
-        escaped_msg = json.dumps(message)  # ensure safe serialization for JSON strings
+        message = json.dumps({"type": payload_type, "topic": topic, "data": data}, default=str)
+        self.deliver(payload_type, topic, message)
+        if remote:
+            await self.bus.publish(payload_type, topic, message, ref)
+
+    def deliver(self, payload_type: str, topic: str | None, message: str):
+        """Queue an already-encoded message for this worker's subscribers."""
+        for client in list(self._targets(topic)):
+            self._enqueue(client, payload_type, topic, message)
+
+    async def deliver_ref(self, payload_type: str, topic: str | None, ref: dict):
+        resolver = self._ref_resolvers.get(ref.get("kind"))
+        if not resolver:
+            logger.warning(f"No resolver for broadcast reference {ref}")
+            return
+        data = await resolver(ref)
+        if data is not None:
+            message = json.dumps({"type": payload_type, "topic": topic, "data": data}, default=str)
+            self.deliver(payload_type, topic, message)
+
+    def has_subscribers(self, topic: str) -> bool:
+        """Lets publishers skip building payloads nobody asked for."""
+        return bool(self.topics.get(topic)) or self.bus.reaches_remote(topic)
+
+    def _targets(self, topic: str | None):
+        return self.topics.get(topic, ()) if topic else self.clients.values()
+
+    def subscribe(self, websocket: WebSocket, topics) -> list[str]:
+        client = self.clients.get(websocket)
+        if not client:
+            return []
+        added = []
+        for topic in topics:
+            if not TOPIC_PATTERN.match(topic) or len(client.topics) >= MAX_TOPICS_PER_CLIENT:
+                continue
+            if topic not in self.topics:
+                added.append(topic)
+            client.topics.add(topic)
+            self.topics.setdefault(topic, set()).add(client)
+        self.bus.topics_changed(added, [])
+        return sorted(client.topics)
+
+    def unsubscribe(self, websocket: WebSocket, topics) -> list[str]:
+        client = self.clients.get(websocket)
+        if not client:
+            return []
+        self._remove_from_topics(client, [t for t in topics if t in client.topics])
+        return sorted(client.topics)
+
+    async def handle_message(self, websocket: WebSocket, text: str):
+        """Handle a client control message (subscribe / unsubscribe / ping)."""
+        try:
+            msg = json.loads(text)
+            action = msg.get("action")
+            topics = msg.get("topics") or []
+        except (ValueError, AttributeError):
+            return  # plain keep-alive text
+        if isinstance(topics, str):
+            topics = [topics]
+        
+        if action == "subscribe":
+            await self.send(websocket, "subscriptions", self.subscribe(websocket, topics))
+        elif action == "unsubscribe":
+            await self.send(websocket, "subscriptions", self.unsubscribe(websocket, topics))
+        elif action == "ping":
+            await self.send(websocket, "pong", None)
+
+    def _remove_from_topics(self, client: _Client, topics: list[str]):
+        removed = []
+        for topic in topics:
+            client.topics.discard(topic)
+            subscribers = self.topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(client)
+                if not subscribers:
+                    del self.topics[topic]
+                    removed.append(topic)
+        self.bus.topics_changed([], removed)
+
+    async def send(self, websocket: WebSocket, payload_type: str, data: any, topic: str | None = None):
+        """Queue a message for a single client."""
+        if websocket in self.clients:
+            message = json.dumps({"type": payload_type, "topic": topic, "data": data}, default=str)
+            self.send_encoded(websocket, payload_type, message, topic)
+
+    def send_encoded(self, websocket: WebSocket, payload_type: str, message: str, topic: str | None = None):
+        """Queue an already-encoded message (e.g. a cached snapshot) for a single client."""
+        client = self.clients.get(websocket)
+        if client:
+            self._enqueue(client, payload_type, topic, message)
+
+    def stats(self) -> dict:
+        """Per-connection lag metrics for the admin endpoint."""
+        clients = [c.stats() for c in self.clients.values()]
+        return {
+            "active_clients": len(clients),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "slow_disconnects": self.slow_disconnects,
+            "bus": {"backend": type(self.bus).__name__, "worker_id": self.bus.worker_id},
+            "max_queued": max((c["queued"] for c in clients), default=0),
+            "max_lag_ms": max((c["max_lag_ms"] for c in clients), default=0),
+            "total_dropped": sum(c["dropped"] for c in clients),
+            "topics": {topic: len(subs) for topic, subs in self.topics.items()},
+            "clients": clients,
+        }
+
+    def _enqueue(self, client: _Client, payload_type: str, topic: str | None, message: str):
+        pending = client.pending
+        if len(pending) >= self.queue_size:
+            if self.policy == "disconnect":
+                self._drop_slow_client(client)
+                return
+            self._make_room(client, payload_type, topic)
+        pending.append((payload_type, topic, message, time.perf_counter()))
+        client.wakeup.set()
+
+    def _make_room(self, client: _Client, payload_type: str, topic: str | None):
+        """keep_latest: discard queued snapshots superseded by a newer one of the
+        same type. If none can go, losing incremental messages would corrupt the
+        client's state, so collapse the backlog into a single resync request."""
+        pending = client.pending
+        before = len(pending)
+        if payload_type in SNAPSHOT_TYPES:
+            kept = [m for m in pending if (m[0], m[1]) != (payload_type, topic)]
+            pending.clear()
+            pending.extend(kept)
+        if len(pending) >= self.queue_size:
+            pending.clear()
+            pending.append(("resync", None, json.dumps({"type": "resync", "data": None}), time.perf_counter()))
+        client.dropped += before - len(pending)
+
+    def _drop_slow_client(self, client: _Client):
+        self.slow_disconnects += 1
+        logger.warning(f"Disconnecting slow client: {len(client.pending)} messages queued")
+        self.disconnect(client.websocket)
+        asyncio.create_task(_close_quietly(client.websocket))
 
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.warning(f"Failed to send to client: {e}")
-                disconnected.append(connection)
+    async def _write_loop(self, client: _Client):
+        try:
+            while True:
+                await client.wakeup.wait()
+                while client.pending:
+                    _, _, message, enqueued_at = client.pending.popleft()
+                    await asyncio.wait_for(client.websocket.send_text(message), self.send_timeout)
+                    client.sent += 1
+                    client.last_lag_ms = (time.perf_counter() - enqueued_at) * 1000
+                    client.max_lag_ms = max(client.max_lag_ms, client.last_lag_ms)
+                client.wakeup.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to send to client: {e}")
+            self.disconnect(client.websocket)
 
-        # Cleanup dead sockets
-        for dead in disconnected:
-            self.disconnect(dead)
+async def _close_quietly(websocket: WebSocket):
+    try:
+        await websocket.close(code=1013)  # "try again later"
+    except Exception:
+        pass
 
 manager = ConnectionManager()
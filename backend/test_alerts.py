@@ -0,0 +1,38 @@
+"""Alert pushes: acknowledging an alert and the watchers logging new ones
+both send the full list and every subscribed severity slice."""
+import asyncio
+
+from shared.ws import manager
+from modules.alerts_engine import router, service, snapshot
+
+ALERTS = [{"id": "a1", "severity": "critical"}, {"id": "a2", "severity": "info"},
+          {"id": "a3", "severity": "critical"}]
+
+def _pushes(broadcasts) -> list[tuple]:
+    return [(kwargs.get("topic"), [a["id"] for a in data]) for _, data, kwargs in broadcasts]
+
+def _install(fake_db, monkeypatch):
+    monkeypatch.setattr(manager, "has_subscribers", lambda topic: topic in ("alerts:critical", "alerts:warning"))
+    db = fake_db(router, service, snapshot)
+    db.answers["fetch"] = lambda sql, *args: [dict(a) for a in ALERTS] if "SELECT al.*" in sql else []
+    return db
+
+EXPECTED = [(None, ["a1", "a2", "a3"]), ("alerts:critical", ["a1", "a3"]), ("alerts:warning", [])]
+
+def test_acknowledge_pushes_severity_slices(fake_db, broadcasts, monkeypatch):
+    _install(fake_db, monkeypatch)
+    assert asyncio.run(router.acknowledge_alert("a2")) == {"status": "acknowledged"}
+    assert _pushes(broadcasts) == EXPECTED
+    assert broadcasts[0][2]["ref"] == {"kind": "alerts"}
+
+def test_watchers_push_the_same_slices(fake_db, broadcasts, monkeypatch):
+    db = _install(fake_db, monkeypatch)
+    db.answers["fetchrow"] = [{"c": 1}, {"c": 3}]
+    asyncio.run(service.run_alert_watchers.__wrapped__())
+    assert _pushes(broadcasts) == EXPECTED
+
+def test_watchers_quiet_without_new_alerts(fake_db, broadcasts, monkeypatch):
+    db = _install(fake_db, monkeypatch)
+    db.answers["fetchrow"] = [{"c": 2}, {"c": 2}]
+    asyncio.run(service.run_alert_watchers.__wrapped__())
+    assert broadcasts == []
@@ -0,0 +1,116 @@
+"""Building and infrastructure classification through the polygon index,
+against the per-building ray cast it replaced, and ground-truth
+cross-validation against damage_zones candidates. No database needed."""
+import asyncio
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from modules.satellite_pipeline import raster, vectorize
+from modules.damage_intelligence import service
+from modules.ground_truth import service as ground_truth
+from modules.ground_truth.service import _point_in_geometry, _point_in_polygon
+
+BBOX = [-120.5, 38.5, -120.45, 38.55]
+
+def _damage_geojson(index: str, size: int = 192, seed: int = 3) -> dict:
+    rng = np.random.default_rng(seed)
+    delta = ndimage.gaussian_filter(rng.standard_normal((size, size)), 4).astype(np.float32)
+    delta = 0.9 * (delta - delta.min()) / np.ptp(delta)
+    valid = np.ones(delta.shape, dtype=bool)
+    return vectorize.vectorize(raster.classify(delta, valid, index), BBOX, delta, index)
+
+def _buildings(fc: dict, n: int = 3000, seed: int = 4) -> list[dict]:
+    """Random points, a third of them on polygon vertices and another third
+    just along the edge leaving one, where ray casting is most fragile."""
+    rng = np.random.default_rng(seed)
+    lon, lat = rng.uniform(BBOX[0], BBOX[2], n), rng.uniform(BBOX[1], BBOX[3], n)
+    vertices = np.array([v for f in fc["features"] for ring in f["geometry"]["coordinates"] for v in ring])
+    picks = vertices[rng.integers(0, len(vertices), n)]
+    kind = rng.integers(0, 3, n)
+    lon = np.where(kind == 0, lon, picks[:, 0] + np.where(kind == 2, rng.uniform(0, 1e-5, n), 0))
+    lat = np.where(kind == 0, lat, picks[:, 1])
+    return [{"osm_id": f"b{i}", "lat": float(y), "lon": float(x), "facility_type": "hospital"}
+            for i, (x, y) in enumerate(zip(lon, lat))]
+
+def _loop_classify(buildings: list[dict], fc: dict, contains=_point_in_geometry, change=None) -> list[tuple]:
+    """The per-building loop over damage_geojson that the index replaced."""
+    change = change or (lambda props: props.get("dnbr_mean", props.get("dndwi_mean", 0)))
+    records = []
+    for b in buildings:
+        best_class, confidence = 0, 0.7
+        for feature in fc["features"]:
+            props = feature["properties"]
+            if contains(b["lon"], b["lat"], feature["geometry"]):
+                cls = min(props.get("severity_class", 0) // 2, 3)
+                if cls > best_class:
+                    best_class, confidence = cls, 0.75 + change(props) * 0.1
+        records.append((best_class, round(min(confidence, 1.0), 3)))
+    return records
+
+def _loop_assess(infra: list[dict], fc: dict) -> list[tuple]:
+    records = []
+    for facility in infra:
+        risk, overlap = "low", 0
+        for feature in fc["features"]:
+            if _point_in_geometry(facility["lon"], facility["lat"], feature["geometry"]):
+                severity = feature["properties"]["severity_class"]
+                risk = "critical" if severity >= 4 else "high" if severity >= 3 else "moderate" if severity >= 2 else "low"
+                overlap = 100
+                break
+        records.append((risk, overlap))
+    return records
+
+@pytest.mark.parametrize("index", ["nbr", "ndwi"])
+def test_index_matches_per_building_loop(index):
+    fc = _damage_geojson(index)
+    assert any(len(f["geometry"]["coordinates"]) > 1 for f in fc["features"])
+    buildings = _buildings(fc)
+    records = service._classify_buildings(buildings, fc, "a1", "e1")
+    assert [(r["damage_class"], r["confidence"]) for r in records] == _loop_classify(buildings, fc)
+    assert len({r["damage_class"] for r in records}) > 2
+
+    infra = service._assess_infrastructure(buildings, fc, "a1", "e1")
+    assert [(r["risk_level"], r["overlap_pct"]) for r in infra] == _loop_assess(buildings, fc)
+
+def test_matches_original_loop_on_hole_free_nbr_zones():
+    # The original tested the outer ring only and read dnbr_mean only; on
+    # zones without holes, all the mock pipeline produced, that is the same answer
+    fc = _damage_geojson("nbr")
+    fc = {"features": [f for f in fc["features"] if len(f["geometry"]["coordinates"]) == 1]}
+    buildings = _buildings(fc)
+    original = _loop_classify(buildings, fc, lambda x, y, geom: _point_in_polygon(x, y, geom["coordinates"][0]),
+                              lambda props: props.get("dnbr_mean", 0))
+    records = service._classify_buildings(buildings, fc, "a1", "e1")
+    assert [(r["damage_class"], r["confidence"]) for r in records] == original
+
+def test_no_damage_geojson():
+    records = service._classify_buildings([{"osm_id": "b", "lat": 38.5, "lon": -120.5}], None, "a1", "e1")
+    assert (records[0]["damage_class"], records[0]["confidence"]) == (0, 0.7)
+    assert service._assess_infrastructure([], None, "a1", "e1") == []
+
+def _square(x0: float, y0: float, x1: float, y1: float) -> list:
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+# A class 4 zone with a hole, a class 2 island inside the hole, a class 5 zone
+ZONES = [
+    {"severity_class": 4, "geometry": {"type": "Polygon", "coordinates": [_square(0, 0, 10, 10), _square(3, 3, 7, 7)]}},
+    {"severity_class": 2, "geometry": {"type": "Polygon", "coordinates": [_square(4, 4, 6, 6)]}},
+    {"severity_class": 5, "geometry": {"type": "Polygon", "coordinates": [_square(5, 0, 15, 10)]}},
+]
+
+@pytest.mark.parametrize("lon, lat, expected", [
+    (1, 1, (2, True)),      # first containing zone wins over the class 5 one
+    (3.5, 3.5, None),       # in the hole
+    (5, 5, (1, True)),      # on the island, in order after the holed zone
+    (12, 5, (2, True)),
+    (50, 50, None),
+])
+def test_cross_validate_first_containing_zone(fake_db, lon, lat, expected):
+    db = fake_db(ground_truth)
+    # The database returns every zone whose bounding box holds the point
+    db.answers["fetch"] = lambda sql, event_id, y, x: [
+        z for z in ZONES if min(c[0] for c in z["geometry"]["coordinates"][0]) <= x
+        <= max(c[0] for c in z["geometry"]["coordinates"][0])]
+    result = asyncio.run(ground_truth._cross_validate("e1", lat, lon, 2))
+    assert result == (expected or (None, None))
@@ -0,0 +1,32 @@
+"""Query metrics: fingerprinting, snapshot ordering, and the admin endpoint
+refusing sort keys that are not numeric fields."""
+from typing import get_args
+import pytest
+from fastapi.testclient import TestClient
+
+from shared.db_metrics import QueryMetrics, SortField, fingerprint
+
+def test_fingerprint_ignores_literals():
+    assert fingerprint("SELECT * FROM events WHERE id = 7 AND title = 'a'")[0] == \
+        fingerprint("SELECT *  FROM events WHERE id = 12 AND title = 'b c'")[0]
+    assert fingerprint("SELECT 1 FROM events")[0] != fingerprint("SELECT 1 FROM analyses")[0]
+
+@pytest.mark.parametrize("sort", get_args(SortField))
+def test_snapshot_sorts_by_every_field(sort):
+    metrics = QueryMetrics(slow_ms=1e9)
+    for n, query in enumerate(["SELECT 1 FROM a", "SELECT 1 FROM b", "SELECT 1 FROM c"]):
+        for _ in range(n + 1):
+            metrics.record(query, "test", wait_s=0.001 * n, exec_s=0.01 * n, rows=n, error=n == 2)
+    queries = metrics.snapshot(sort=sort)["queries"]
+    assert [q[sort] or 0 for q in queries] == sorted((q[sort] or 0 for q in queries), reverse=True)
+
+def test_snapshot_rejects_other_keys():
+    with pytest.raises(ValueError):
+        QueryMetrics().snapshot(sort="histogram")
+
+@pytest.mark.parametrize("method", ["get", "delete"])
+def test_endpoint_rejects_unknown_sort(method):
+    from main import app
+    client = TestClient(app)
+    response = getattr(client, method)("/api/admin/db-metrics", params={"sort": "histogram"})
+    assert response.status_code == 422
@@ -0,0 +1,36 @@
+"""Cross-feed duplicate index, against the known pairs in fixtures/."""
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from modules.event_monitor.dedupe import EventIndex
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "duplicate_event_pairs.json")
+
+with open(CORPUS) as f:
+    PAIRS = json.load(f)
+
+@pytest.mark.parametrize("pair", PAIRS, ids=[p["name"] for p in PAIRS])
+def test_duplicate_pairs(pair):
+    index = EventIndex()
+    existing, incoming = pair["existing"], pair["incoming"]
+    index.add("existing", existing["event_type"], existing["lat"], existing["lon"],
+              datetime.fromisoformat(existing["event_date"]),
+              existing["gdacs_id"], existing.get("usgs_id"))
+    match = index.find_duplicate(incoming["source"], incoming["event_type"], incoming["lat"],
+                                 incoming["lon"], datetime.fromisoformat(incoming["event_date"]))
+    assert (match == "existing") == pair["duplicate"]
+
+def test_folded_feed_keys_are_aliases():
+    # A GDACS cyclone that already absorbed an EONET storm: the storm's next
+    # position is found by key, not matched again by location
+    index = EventIndex()
+    when = datetime.fromisoformat("2026-09-01T00:00:00+00:00")
+    index.add("cyclone", "TC", 15.0, 130.0, when, "1001234", eonet_id="eonet_EONET_6543")
+    assert index.owner("eonet_EONET_6543") == "cyclone" and index.owner("1001234") == "cyclone"
+    assert index.find_duplicate("eonet", "TC", 15.8, 129.1, when) is None
+    assert index.find_duplicate("usgs", "TC", 15.8, 129.1, when) == "cyclone"
+    index.remove("cyclone")
+    assert index.owner("eonet_EONET_6543") is None
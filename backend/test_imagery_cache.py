@@ -0,0 +1,64 @@
+"""Imagery cache keys and the on-disk store: what does and does not change a
+key, round-trips, LRU eviction and the disabled cache."""
+import os
+import time
+import numpy as np
+import pytest
+
+from modules.satellite_pipeline import imagery_cache
+
+BBOX = [-120.5, 38.5, -120.25, 38.75]
+TIME_RANGE = ("2026-07-01", "2026-07-20")
+
+def _key(**changes) -> str:
+    request = {"bbox": BBOX, "time_range": TIME_RANGE, "collection": "sentinel-2-l2a",
+               "evalscript": "return [B08, B12]", "width": 512, "height": 512, **changes}
+    return imagery_cache.cache_key(**request)
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    """An empty cache directory with a 1 GiB budget."""
+    monkeypatch.setattr(imagery_cache, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(imagery_cache, "CACHE_MAX_BYTES", 1 << 30)
+    return imagery_cache
+
+def test_key_ignores_float_noise():
+    # Tile bboxes derived two ways differ only in the last bits
+    assert _key(bbox=[v + 1e-12 for v in BBOX]) == _key()
+    assert _key(bbox=[v + 1e-6 for v in BBOX]) != _key()
+
+def test_key_covers_every_pixel_input():
+    keys = {_key(), _key(time_range=("2026-07-01", "2026-07-21")), _key(collection="sentinel-2-l1c"),
+            _key(evalscript="return [B04, B08]"), _key(width=256, height=1024), _key(height=256)}
+    assert len(keys) == 6
+
+def test_key_scoped_to_run():
+    assert _key(as_of=None) == _key()
+    assert _key(as_of="job-1") != _key() and _key(as_of="job-1") != _key(as_of="job-2")
+
+def test_round_trip(cache, encode_tiff):
+    array = np.arange(24, dtype=np.float32).reshape(3, 4, 2)
+    key = _key()
+    assert cache.get(key) is None
+    path = cache.put(key, encode_tiff(array), {"phase": "pre"})
+    assert cache.get(key) == path
+    cached = cache.open_array(path)
+    assert isinstance(cached, np.memmap) and np.array_equal(cached, array)
+    assert cache.usage()["entries"] == 1
+
+def test_evicts_least_recently_used(cache, encode_tiff):
+    array = np.zeros((64, 64, 2), dtype=np.float32)
+    keys = [_key(width=w) for w in (1, 2, 3)]
+    for age, key in enumerate(keys):
+        path = cache.put(key, encode_tiff(array), {})
+        os.utime(path, (time.time() - 100 + age, time.time() - 100 + age))
+    cache.get(keys[0])  # a hit makes the oldest entry the newest
+    cache.evict(2 * (cache.usage()["bytes"] // 3))
+    assert [cache.get(k) is not None for k in keys] == [True, False, True]
+    assert not os.path.exists(cache._path(keys[1])[:-4] + ".json")
+
+def test_disabled_cache_stores_nothing(cache, monkeypatch, encode_tiff):
+    monkeypatch.setattr(imagery_cache, "CACHE_MAX_BYTES", 0)
+    assert not cache.enabled()
+    assert cache.put(_key(), encode_tiff(np.zeros((2, 2, 2))), {}) is None
+    assert cache.get(_key()) is None and cache.usage()["entries"] == 0
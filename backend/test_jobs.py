@@ -0,0 +1,160 @@
+"""Pipeline job queue: retry backoff, claim priority and how enqueue dedupes,
+with the database replaced by canned answers; then the queue's SQL itself
+against a real database (the `database` fixture)."""
+import asyncio
+from collections import Counter
+import pytest
+
+from shared import jobs
+
+def test_retry_backoff_doubles_with_jitter_and_cap():
+    for attempts in range(1, 12):
+        base = min(jobs.JOB_RETRY_BASE_S * 2 ** (attempts - 1), jobs.JOB_RETRY_MAX_S)
+        delays = [jobs.retry_delay(attempts) for _ in range(200)]
+        assert all(0.8 * base <= d <= 1.2 * base for d in delays), attempts
+        # Jittered, so consumers retrying together spread out
+        assert len(set(delays)) > 100
+    assert jobs.retry_delay(1) < 1.2 * jobs.JOB_RETRY_BASE_S < 0.8 * jobs.retry_delay(3)
+    assert max(jobs.retry_delay(40) for _ in range(50)) <= 1.2 * jobs.JOB_RETRY_MAX_S
+
+def test_priority_orders_by_severity():
+    assert jobs.job_priority("red") > jobs.job_priority("orange") > jobs.job_priority("green")
+    assert jobs.job_priority("green") == jobs.job_priority(None) == 0
+
+@pytest.fixture
+def enqueue(fake_db):
+    """enqueue(event, results, **kwargs) -> (enqueue's result, db): the event
+    row, then the INSERT and lookup results in turn."""
+    def run(event: dict | None, results: list, **kwargs):
+        db = fake_db(jobs)
+        db.answers.update(fetchrow=event, fetchval=list(results))
+        return asyncio.run(jobs.JobQueue(workers=0).enqueue("satellite", "e1", **kwargs)), db
+    return run
+
+def _queries(db) -> list[tuple[str, tuple]]:
+    return [(statement, args) for method, statement, args in db.calls if method == "fetchval"]
+
+def test_enqueue_inserts_with_event_priority(enqueue):
+    result, db = enqueue({"severity": "red", "affected_population": None}, [41])
+    assert result == (41, True)
+    (statement, args), = _queries(db)
+    assert statement == "INSERT INTO" and args[3:] == (2, 0, jobs.JOB_MAX_ATTEMPTS, jobs.JOB_DONE_DEDUPE_S)
+
+def test_enqueue_returns_live_or_recently_done_job(enqueue):
+    result, db = enqueue({"severity": "orange", "affected_population": 1200}, [None, 7])
+    assert result == (7, False)
+    assert [args[-1] for _, args in _queries(db)] == [jobs.JOB_DONE_DEDUPE_S] * 2
+
+def test_rerun_ignores_done_jobs(enqueue):
+    result, db = enqueue({"severity": "green", "affected_population": 5}, [8], rerun=True)
+    assert result == (8, True)
+    assert _queries(db)[0][1][-1] is None
+
+def test_enqueue_retries_once_when_duplicate_finishes_in_between(enqueue):
+    result, db = enqueue({"severity": "green", "affected_population": 5}, [None, None, 9])
+    assert result == (9, True)
+    assert Counter(db.statements("fetchval")) == {"INSERT INTO": 2, "SELECT id": 1}
+
+def test_unknown_event(enqueue):
+    result, db = enqueue(None, [])
+    assert result == (None, False) and not _queries(db)
+
+# ── Against the database ─────────────────────────────────────
+
+async def _job(job_id: int) -> dict:
+    from shared.db import fetchrow
+    return dict(await fetchrow("SELECT * FROM pipeline_jobs WHERE id = $1", job_id))
+
+def test_enqueue_dedupes_in_database(database):
+    async def scenario():
+        queue = jobs.JobQueue(workers=0)
+        event = await database.add_event("orange", 500)
+        job_id, created = await queue.enqueue("satellite", event, {"analysis_id": "a1"})
+        assert created and await queue.enqueue("satellite", event) == (job_id, False)
+        assert (await queue.enqueue("assessment", event))[1]
+        job = await _job(job_id)
+        assert (job["priority"], job["population"], job["payload"]) == (1, 500, {"analysis_id": "a1"})
+
+        from shared.db import execute
+        await execute("UPDATE pipeline_jobs SET status = 'done', finished_at = now() WHERE id = $1", job_id)
+        assert await queue.enqueue("satellite", event) == (job_id, False)
+        rerun_id, created = await queue.enqueue("satellite", event, rerun=True)
+        assert created and rerun_id != job_id
+        assert await queue.enqueue("satellite", "00000000-0000-0000-0000-000000000000") == (None, False)
+    database.run(scenario)
+
+def test_claim_order_skips_locked_rows(database):
+    async def scenario():
+        queue = jobs.JobQueue(workers=0)
+        queue.register("satellite", None)
+        green = await queue.enqueue("satellite", await database.add_event("green", 10**6))
+        small = await queue.enqueue("satellite", await database.add_event("red", 10))
+        large = await queue.enqueue("satellite", await database.add_event("red", 5000))
+
+        from shared.db import get_pool
+        async with (await get_pool()).acquire() as conn, conn.transaction():
+            # Another consumer holds the most urgent job mid-claim
+            await conn.execute("SELECT 1 FROM pipeline_jobs WHERE id = $1 FOR UPDATE", large[0])
+            claimed = await asyncio.wait_for(queue._claim(), 5)
+        assert claimed["id"] == small[0] and claimed["status"] == "running" and claimed["attempts"] == 1
+        assert claimed["locked_by"] == queue.worker_id and claimed["first_started_at"] is not None
+        assert [(await queue._claim())["id"] for _ in range(2)] == [large[0], green[0]]
+        assert await queue._claim() is None
+    database.run(scenario)
+
+def test_failed_attempts_back_off_then_fail(database):
+    async def scenario():
+        queue = jobs.JobQueue(workers=0)
+        queue.register("satellite", None)
+        job_id, _ = await queue.enqueue("satellite", await database.add_event(), max_attempts=2)
+        await queue._failed(await queue._claim(), RuntimeError("timeout"))
+        job = await _job(job_id)
+        assert (job["status"], job["last_error"], job["locked_by"]) == ("queued", "timeout", None)
+        assert job["run_after"] > job["started_at"] and await queue._claim() is None
+
+        from shared.db import execute
+        await execute("UPDATE pipeline_jobs SET run_after = now() WHERE id = $1", job_id)
+        await queue._failed(await queue._claim(), RuntimeError("timeout again"))
+        job = await _job(job_id)
+        assert (job["status"], job["attempts"], job["last_error"]) == ("failed", 2, "timeout again")
+        assert job["finished_at"] is not None
+        # A failed job no longer blocks a new one for the event
+        assert (await queue.enqueue("satellite", str(job["event_id"])))[1]
+    database.run(scenario)
+
+def test_stale_and_released_jobs_requeue(database):
+    async def scenario():
+        from shared.db import execute
+        queue = jobs.JobQueue(workers=0)
+        queue.register("satellite", None)
+        stale, _ = await queue.enqueue("satellite", await database.add_event())
+        spent, _ = await queue.enqueue("satellite", await database.add_event(), max_attempts=1)
+        released, _ = await queue.enqueue("satellite", await database.add_event())
+        for _ in range(3):
+            await queue._claim()
+        await execute("UPDATE pipeline_jobs SET heartbeat_at = now() - interval '1 hour' WHERE id <> $1", released)
+        await queue._reap_stale()
+        assert [(await _job(i))["status"] for i in (stale, spent, released)] == ["queued", "failed", "running"]
+        assert queue._counters["requeued_stale"] == 2
+
+        await queue.stop()
+        job = await _job(released)
+        assert (job["status"], job["attempts"], job["locked_by"]) == ("queued", 0, None)
+    database.run(scenario)
+
+def test_metrics_and_listing(database):
+    async def scenario():
+        queue = jobs.JobQueue(workers=0)
+        queue.register("satellite", None)
+        job_id, _ = await queue.enqueue("satellite", await database.add_event())
+        await queue.enqueue("satellite", await database.add_event())
+        from shared.db import execute
+        await execute("UPDATE pipeline_jobs SET status = 'done', first_started_at = now(), started_at = now(), "
+                      "finished_at = now() WHERE id = $1", job_id)
+        metrics = await queue.metrics()
+        assert metrics["depth"]["satellite"]["queued"] == 1
+        assert metrics["last_hour"]["satellite"]["done"] == 1
+        assert [j["id"] for j in await queue.list_jobs("done")] == [job_id]
+        await queue.prune()
+        assert len(await queue.list_jobs()) == 2
+    database.run(scenario)
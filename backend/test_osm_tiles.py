@@ -0,0 +1,74 @@
+"""OSM tile cache SQL against a real database (the `database` fixture): a
+repeat lookup reads every tile back, an expired tile alone is refetched,
+and refresh_stale refetches tiles in use and drops abandoned ones."""
+import math
+import pytest
+
+from modules.damage_intelligence import osm, osm_tiles
+from shared.db import execute, fetch, fetchval
+
+BBOX = [-120.32, 38.68, -120.28, 38.72]
+SPACING = 0.002
+
+@pytest.fixture
+def overpass(monkeypatch) -> list:
+    """A building every SPACING degrees and a facility every 50th; returns the queried bboxes."""
+    queries = []
+
+    async def fetch_features(bbox):
+        queries.append(bbox)
+        west, south, east, north = bbox
+        buildings, facilities = [], []
+        for i in range(math.ceil(west / SPACING), math.floor(east / SPACING) + 1):
+            for j in range(math.ceil(south / SPACING), math.floor(north / SPACING) + 1):
+                buildings.append({"osm_id": f"way/{i}_{j}", "lat": j * SPACING, "lon": i * SPACING})
+                if (i + j) % 50 == 0:
+                    facilities.append({"osm_id": f"node/{i}_{j}", "facility_type": "school", "name": "School",
+                                       "lat": j * SPACING, "lon": i * SPACING})
+        return buildings, facilities
+
+    monkeypatch.setattr(osm, "fetch_features", fetch_features)
+    return queries
+
+def _ids(features: list[dict]) -> list[str]:
+    return sorted(f["osm_id"] for f in features)
+
+def test_lookups_reuse_stored_tiles(database, overpass):
+    async def scenario():
+        cache = osm_tiles.OsmTileCache()
+        buildings, facilities, n = await cache.features(BBOX)
+        assert n == await fetchval("SELECT count(*) FROM osm_tiles") and n > 4
+        assert len(overpass) == 1 and buildings and facilities
+
+        again = await cache.features(BBOX)
+        assert len(overpass) == 1 and (_ids(again[0]), _ids(again[1])) == (_ids(buildings), _ids(facilities))
+        assert await fetchval("SELECT count(*) FROM osm_tiles WHERE last_hit_at IS NOT NULL") == n
+
+        await execute("""
+            UPDATE osm_tiles SET expires_at = now() - interval '1 day'
+            WHERE quadkey = (SELECT min(quadkey) FROM osm_tiles)
+        """)
+        assert _ids((await cache.features(BBOX))[0]) == _ids(buildings)
+        assert len(overpass) == 2 and cache._counters["tiles_missed"] == n + 1
+
+        stats = await cache.stats()
+        # Tiles reach past the bbox, so they hold at least what the lookup returned
+        assert stats["stored"]["tiles"] == n and stats["stored"]["buildings"] >= len(buildings)
+        assert stats["hit_ratio"] == round((2 * n - 1) / (3 * n), 3)
+    database.run(scenario)
+
+def test_refresh_stale(database, overpass):
+    async def scenario():
+        cache = osm_tiles.OsmTileCache()
+        await cache.features(BBOX)
+        busy, idle, *_ = [r["quadkey"] for r in await fetch("SELECT quadkey FROM osm_tiles ORDER BY quadkey")]
+        await execute("UPDATE osm_tiles SET expires_at = now() + interval '1 hour' WHERE quadkey = $1", busy)
+        await execute("""
+            UPDATE osm_tiles SET expires_at = now() - interval '1 day', last_hit_at = now() - interval '60 days'
+            WHERE quadkey = $1
+        """, idle)
+
+        assert await cache.refresh_stale() == 1 and len(overpass) == 2
+        assert await fetchval("SELECT expires_at > now() + interval '1 day' FROM osm_tiles WHERE quadkey = $1", busy)
+        assert await fetchval("SELECT count(*) FROM osm_tiles WHERE quadkey = $1", idle) == 0
+    database.run(scenario)
@@ -0,0 +1,48 @@
+"""Raster engine: TIFF decoding, change index and classification thresholds."""
+import numpy as np
+import pytest
+
+from modules.satellite_pipeline import raster
+
+BBOX = [-120.5, 38.5, -120.0, 39.0]
+
+def _pixels(height: int = 7, width: int = 5) -> np.ndarray:
+    rng = np.random.default_rng(3)
+    return np.dstack((rng.uniform(-1, 1, (height, width)), rng.integers(0, 2, (height, width)))).astype(np.float32)
+
+def test_read_single_strip_without_copy(encode_tiff):
+    pixels = _pixels()
+    data = encode_tiff(pixels)
+    decoded = raster.read_tiff(data)
+    assert decoded.shape == (7, 5, 2) and np.array_equal(decoded, pixels)
+    assert not decoded.flags.owndata
+
+def test_read_deflated_strips(encode_tiff):
+    pixels = _pixels(height=10)
+    decoded = raster.read_tiff(encode_tiff(pixels, rows_per_strip=3, deflate=True))
+    assert np.array_equal(decoded, pixels)
+
+@pytest.mark.parametrize("kind", ["int16", "gif"])
+def test_rejects_other_sample_types(encode_tiff, kind):
+    data = encode_tiff(_pixels(), bits=16) if kind == "int16" else b"GIF89a" + bytes(16)
+    with pytest.raises(ValueError):
+        raster.read_tiff(data)
+
+def test_change_index_orientation_and_mask():
+    pre = np.array([[[0.6, 1], [0.2, 1], [np.nan, 1], [0.5, 0]]], dtype=np.float32)
+    post = np.array([[[0.1, 1], [0.4, 1], [0.3, 1], [0.1, 1]]], dtype=np.float32)
+    delta, valid = raster.change_index(pre, post, "nbr")
+    assert np.allclose(delta[0, :2], [0.5, -0.2])
+    assert valid.tolist() == [[True, True, False, False]]
+    delta, _ = raster.change_index(pre, post, "ndwi")
+    assert np.allclose(delta[0, :2], [-0.5, 0.2])
+
+@pytest.mark.parametrize("index", sorted(raster.THRESHOLDS))
+def test_classify_thresholds(index):
+    bounds = raster.THRESHOLDS[index]
+    below = [np.nextafter(np.float32(b), np.float32(-1)) for b in bounds]
+    delta = np.array([-1.0, *below, *bounds, 5.0, 5.0], dtype=np.float32)
+    valid = np.ones(delta.shape, dtype=bool)
+    valid[-1] = False
+    classes = raster.classify(delta, valid, index)
+    assert classes.tolist() == [0, 0, 2, 3, 4, 2, 3, 4, 5, 5, raster.NODATA_CLASS]
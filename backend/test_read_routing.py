@@ -0,0 +1,53 @@
+"""Which requests main.route_reads lets read from the replica: plain GETs do;
+job and analysis status, and a client that has just written, stay on the
+primary."""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from shared import db
+from modules.alerts_engine import router as alerts_router
+from modules.satellite_pipeline import router as satellite_router
+
+@pytest.fixture
+def client(monkeypatch) -> tuple[TestClient, list]:
+    """A client for the app, and whether each handler query was routed to the replica."""
+    routed = []
+
+    async def fetch(sql, *args):
+        routed.append(db._replica_reads.get())
+        return []
+
+    async def publish_alerts():
+        return []
+
+    async def execute(sql, *args):
+        routed.append(db._replica_reads.get())
+
+    for module in (alerts_router, satellite_router):
+        monkeypatch.setattr(module, "fetch", fetch)
+    monkeypatch.setattr(alerts_router, "execute", execute)
+    monkeypatch.setattr(alerts_router, "publish_alerts", publish_alerts)
+    monkeypatch.setattr(main, "pools", lambda: {"interactive": None, "replica": None})
+    return TestClient(main.app), routed
+
+def test_status_reads_stay_on_primary(client):
+    http, routed = client
+    http.get("/api/alerts/e1")
+    http.get("/api/satellite/analyses/e1")
+    assert routed == [True, False]
+
+def test_writer_reads_primary_for_a_while(client):
+    http, routed = client
+    response = http.post("/api/alerts/a1/acknowledge")
+    assert main.PRIMARY_COOKIE in response.cookies
+    assert f"Max-Age={main.READ_YOUR_WRITES_S}" in response.headers["set-cookie"]
+    http.get("/api/alerts/e1")
+    http.cookies.clear()
+    http.get("/api/alerts/e1")
+    assert routed == [False, False, True]
+
+def test_no_cookie_without_replica(client, monkeypatch):
+    http, _ = client
+    monkeypatch.setattr(main, "pools", lambda: {"interactive": None})
+    assert main.PRIMARY_COOKIE not in http.post("/api/alerts/a1/acknowledge").cookies
@@ -0,0 +1,50 @@
+"""migrations/001_schema.sql against a real database (the `database`
+fixture): it applies again over itself, leaves what check_db requires, and
+its backfills fill damage_zones and events.eonet_id once."""
+from check_db import missing_objects
+from shared.db import execute, fetch, fetchval, get_pool
+
+ZONES = {"type": "FeatureCollection", "features": [
+    {"type": "Feature", "properties": {"severity_class": 4, "dnbr_mean": 0.5},
+     "geometry": {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 0]]]}},
+    {"type": "Feature", "properties": {"severity_class": 2},
+     "geometry": {"type": "Point", "coordinates": [0, 0]}},
+    {"type": "Feature", "properties": {"severity_class": 3, "dndwi_mean": 0.25},
+     "geometry": {"type": "Polygon", "coordinates": [[[2, 2], [3, 2], [3, 3], [2, 2]]]}},
+]}
+
+def test_schema_reapplies_cleanly(database):
+    async def scenario():
+        await database.apply_schema()
+        async with (await get_pool()).acquire() as conn:
+            assert await missing_objects(conn) == []
+        # ADD COLUMN IF NOT EXISTS ... UNIQUE must not add an index per run
+        assert await fetchval("""
+            SELECT count(*) FROM pg_index
+            WHERE indrelid = 'events'::regclass AND indisunique AND indnatts = 1
+              AND indkey[0] = (SELECT attnum FROM pg_attribute
+                               WHERE attrelid = 'events'::regclass AND attname = 'eonet_id')
+        """) == 1
+        await execute("SELECT cleanup_expired_cache()")
+    database.run(scenario)
+
+def test_backfills_run_once(database):
+    async def scenario():
+        event_id = await database.add_event()
+        await execute("UPDATE events SET gdacs_id = 'eonet_EONET_1', eonet_id = NULL WHERE id = $1::uuid", event_id)
+        await execute("""
+            INSERT INTO analyses (job_id, event_id, status, damage_geojson)
+            VALUES ('backfill', $1::uuid, 'complete', $2)
+        """, event_id, ZONES)
+
+        for _ in range(2):
+            await database.apply_schema()
+            zones = await fetch("""
+                SELECT feature_index, severity_class, delta_mean, properties FROM damage_zones
+                ORDER BY feature_index
+            """)
+            assert [(z["feature_index"], z["severity_class"], z["delta_mean"]) for z in zones] == [
+                (0, 4, 0.5), (2, 3, 0.25)]
+            assert zones[1]["properties"] == ZONES["features"][2]["properties"]
+            assert await fetchval("SELECT eonet_id FROM events WHERE id = $1::uuid", event_id) == "eonet_EONET_1"
+    database.run(scenario)
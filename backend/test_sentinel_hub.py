@@ -0,0 +1,86 @@
+"""Sentinel Hub client against a mock transport: concurrent callers share one
+token exchange and one Process API call per identical request, and a revoked
+token is refreshed once."""
+import asyncio
+import httpx
+import pytest
+
+from modules.satellite_pipeline import sentinel_hub
+from shared import quota
+
+BBOX = [-120.5, 38.5, -120.25, 38.75]
+TIME_RANGE = ("2026-07-01", "2026-07-20")
+
+class MockHub:
+    """Token and Process endpoints that count requests and answer after a short delay."""
+
+    def __init__(self, revoked: int = 0):
+        self.exchanges = 0
+        self.calls = 0
+        self.revoked = revoked
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        if request.url.path.endswith("/token"):
+            self.exchanges += 1
+            return httpx.Response(200, json={"access_token": f"token-{self.exchanges}", "expires_in": 3600})
+        self.calls += 1
+        if self.revoked:
+            self.revoked -= 1
+            return httpx.Response(401)
+        return httpx.Response(200, content=request.headers["Authorization"].encode())
+
+@pytest.fixture
+def hub(monkeypatch, fake_db):
+    """hub(mock) -> a client whose HTTP goes to the mock; usage rows land in
+    the fake database instead of sentinel_quota_log."""
+    monkeypatch.setenv("SENTINEL_HUB_CLIENT_ID", "id")
+    monkeypatch.setenv("SENTINEL_HUB_CLIENT_SECRET", "secret")
+    fake_db(quota)
+
+    def make(mock: MockHub) -> sentinel_hub.SentinelHubClient:
+        client = sentinel_hub.SentinelHubClient()
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(mock.handle))
+        return client
+    return make
+
+def test_concurrent_callers_share_one_token_exchange(hub):
+    async def run():
+        mock = MockHub()
+        client = hub(mock)
+        tokens = await asyncio.gather(*(client.token() for _ in range(8)))
+        assert set(tokens) == {"token-1"} and mock.exchanges == 1
+        assert await client.token() == "token-1" and mock.exchanges == 1
+        assert await client.token(refresh=True) == "token-2" and mock.exchanges == 2
+        await client.close()
+    asyncio.run(run())
+
+def test_identical_requests_coalesce(hub):
+    async def run():
+        mock = MockHub()
+        client = hub(mock)
+        results = await asyncio.gather(
+            *(client.fetch_image(BBOX, TIME_RANGE, "return [B08]", 64, 64, cache=False) for _ in range(4)),
+            client.fetch_image(BBOX, TIME_RANGE, "return [B12]", 64, 64, cache=False))
+        assert mock.calls == 2 and mock.exchanges == 1
+        # Only the caller that reached Sentinel Hub is charged
+        assert sorted(units > 0 for _, units in results[:4]) == [False, False, False, True]
+        assert all(image == b"Bearer token-1" for image, _ in results)
+        assert client.stats()["coalesced"] == 3 and client.stats()["in_flight"] == 0
+        await client.close()
+    asyncio.run(run())
+
+def test_revoked_token_refreshed_once(hub):
+    async def run():
+        mock = MockHub(revoked=1)
+        client = hub(mock)
+        image, units = await client.fetch_image(BBOX, TIME_RANGE, "return [B08]", 64, 64, cache=False)
+        assert image == b"Bearer token-2" and units > 0
+        assert mock.exchanges == 2 and mock.calls == 2
+
+        mock.revoked = 2
+        with pytest.raises(httpx.HTTPStatusError) as raised:
+            await client.fetch_image(BBOX, TIME_RANGE, "return [B12]", 64, 64, cache=False)
+        assert raised.value.response.status_code == 401
+        await client.close()
+    asyncio.run(run())
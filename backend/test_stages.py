@@ -0,0 +1,169 @@
+"""Checkpointed stage machine: a resumed analysis runs only the stages after
+its last checkpoint, and a failing stage repeats on the next attempt without
+losing earlier timings. The last tests run the checkpoint SQL against a real
+database (the `database` fixture)."""
+import asyncio
+import pytest
+
+from modules.satellite_pipeline import stages
+
+def _row(status: str, stage_timings: dict | None = None) -> dict:
+    return {"id": "a1", "job_id": "q1", "event_id": "e1", "status": status,
+            "artefacts": {}, "stage_timings": stage_timings}
+
+@pytest.fixture
+def advance(fake_db, broadcasts, monkeypatch):
+    """advance(row, failing, final_attempt) runs stages.advance against one
+    analyses row, applying its UPDATEs to the row, with every handler
+    recorded; returns (end status, stages run)."""
+    def run(row: dict, failing: str | None = None, final_attempt: bool = True):
+        ran = []
+
+        def handler(stage):
+            async def handle(analysis_row, event):
+                ran.append(stage)
+                if stage == failing:
+                    raise RuntimeError("upstream timeout")
+                return {f"{stage}_done": True}, None
+            return handle
+
+        def update(sql, analysis_id, status, *args):
+            if "error_message = $3" in sql:
+                row["error_message"], timings, artefacts, _ = args
+            else:
+                artefacts, timings, _, _ = args
+            row.update(status=status, stage_timings=timings, artefacts={**row["artefacts"], **artefacts})
+
+        db = fake_db(stages)
+        db.answers["fetchrow"] = lambda sql, *args: dict(row) if "FROM analyses" in sql else {"id": "e1"}
+        db.answers["execute"] = update
+        monkeypatch.setattr(stages, "HANDLERS", {stage: handler(stage) for stage in stages.STAGES})
+        try:
+            status = asyncio.run(stages.advance("a1", final_attempt))
+        except RuntimeError:
+            status = None
+        return status, ran
+    return run
+
+def test_fresh_analysis_runs_every_stage(advance):
+    row = _row("queued")
+    assert advance(row) == ("complete", list(stages.STAGES))
+    assert set(row["stage_timings"]) == set(stages.STAGES)
+    assert all(t["attempts"] == 1 and "seconds" in t for t in row["stage_timings"].values())
+
+def test_resume_skips_checkpointed_stages(advance):
+    done = {"seconds": 12.0, "attempts": 1, "finished_at": "2026-10-01T00:00:00+00:00"}
+    row = _row("assessing_buildings", {"fetching_imagery": done, "running_detection": done})
+    assert advance(row) == ("complete", ["assessing_buildings", "generating_report"])
+    assert row["stage_timings"]["running_detection"] == done
+
+def test_failed_stage_repeats_on_next_attempt(advance):
+    row = _row("queued")
+    assert advance(row, failing="running_detection", final_attempt=False) == (
+        None, ["fetching_imagery", "running_detection"])
+    assert row["status"] == "running_detection"
+    assert row["artefacts"]["failed_stage"] == "running_detection"
+
+    assert advance(row) == ("complete", ["running_detection", "assessing_buildings", "generating_report"])
+    timings = row["stage_timings"]
+    assert timings["fetching_imagery"]["attempts"] == 1 and timings["running_detection"]["attempts"] == 2
+    assert "failed_seconds" in timings["running_detection"]
+
+def test_final_attempt_marks_error(advance):
+    row = _row("generating_report")
+    assert advance(row, failing="generating_report") == (None, ["generating_report"])
+    assert row["status"] == "error" and row["error_message"].startswith("generating_report:")
+
+@pytest.mark.parametrize("status", sorted(stages.TERMINAL))
+def test_terminal_analysis_runs_nothing(advance, status):
+    assert advance(_row(status)) == (status, [])
+
+# ── Against the database ─────────────────────────────────────
+
+def _stage_handlers(monkeypatch, failing: set, ends: dict | None = None):
+    """Handlers leaving {stage: True} as their artefact; stages in `failing` raise
+    once, and `ends` maps a stage to the (artefacts, status) it ends the run with."""
+    def handler(stage):
+        async def handle(analysis, event):
+            if stage in failing:
+                failing.discard(stage)
+                raise RuntimeError("upstream timeout")
+            return (ends or {}).get(stage, ({stage: True}, None))
+        return handle
+
+    monkeypatch.setattr(stages, "HANDLERS", {stage: handler(stage) for stage in stages.STAGES})
+
+async def _analysis(database, status: str = "queued", **columns) -> tuple[str, str]:
+    """Insert an analysis for a new event; returns (analysis id, event id)."""
+    from shared.db import fetchval
+    event_id = await database.add_event()
+    analysis_id = await fetchval("""
+        INSERT INTO analyses (job_id, event_id, status, damage_geojson)
+        VALUES ($1, $2::uuid, $3::analysis_status_enum, $4) RETURNING id
+    """, f"t{event_id}", event_id, status, columns.get("damage_geojson"))
+    return analysis_id, event_id
+
+async def _stored(analysis_id: str) -> dict:
+    from shared.db import fetchrow
+    return dict(await fetchrow("""
+        SELECT status, artefacts, stage_timings, processing_time_seconds, error_message
+        FROM analyses WHERE id = $1::uuid
+    """, analysis_id))
+
+def test_checkpoints_persist_across_attempts(database, broadcasts, monkeypatch):
+    _stage_handlers(monkeypatch, {"running_detection"})
+
+    async def scenario():
+        analysis_id, event_id = await _analysis(database)
+        with pytest.raises(RuntimeError):
+            await stages.advance(analysis_id, final_attempt=False)
+        row = await _stored(analysis_id)
+        assert row["status"] == "running_detection"
+        assert row["error_message"] == "running_detection: upstream timeout"
+        assert row["artefacts"] == {"fetching_imagery": True, "failed_stage": "running_detection"}
+        assert row["stage_timings"]["running_detection"]["attempts"] == 1
+
+        assert await stages.advance(analysis_id) == "complete"
+        row = await _stored(analysis_id)
+        assert row["error_message"] is None and isinstance(row["processing_time_seconds"], int)
+        assert {k: v for k, v in row["artefacts"].items() if k != "failed_stage"} == dict.fromkeys(stages.STAGES, True)
+        assert [row["stage_timings"][s]["attempts"] for s in stages.STAGES] == [1, 2, 1, 1]
+        assert [b[2]["topic"] for b in broadcasts] == [f"event:{event_id}:analysis"] * 4
+    database.run(scenario)
+
+def test_final_attempt_and_early_end(database, broadcasts, monkeypatch):
+    _stage_handlers(monkeypatch, {"generating_report"},
+                    {"fetching_imagery": ({"reason": "no cloud-free pass"}, "imagery_unavailable")})
+
+    async def scenario():
+        failing, _ = await _analysis(database, "generating_report")
+        with pytest.raises(RuntimeError):
+            await stages.advance(failing)
+        assert (await _stored(failing))["status"] == "error"
+
+        unavailable, _ = await _analysis(database)
+        assert await stages.advance(unavailable) == "imagery_unavailable"
+        row = await _stored(unavailable)
+        assert row["error_message"] == "no cloud-free pass" and row["artefacts"]["reason"] == "no cloud-free pass"
+    database.run(scenario)
+
+def test_resume_and_rerun_in_database(database, broadcasts, monkeypatch):
+    _stage_handlers(monkeypatch, set())
+
+    async def scenario():
+        from shared.jobs import JobQueue
+        queue = JobQueue(workers=0)
+        interrupted, _ = await _analysis(database, "running_detection")
+        await _analysis(database, "complete")
+        assert await stages.resume_interrupted(queue) == 1
+        # Its job is now live, so a second pass queues nothing
+        assert await stages.resume_interrupted(queue) == 0
+        job, = await queue.list_jobs("queued")
+        assert job["stage"] == "satellite"
+
+        done, _ = await _analysis(database, "complete", damage_geojson={"type": "FeatureCollection", "features": []})
+        await stages.rerun_assessment_job({"payload": {"analysis_id": done}, "attempts": 1, "max_attempts": 3})
+        row = await _stored(done)
+        assert row["status"] == "complete" and set(row["stage_timings"]) == {"assessing_buildings", "generating_report"}
+        assert await stages.advance(interrupted) == "complete"
+    database.run(scenario)
@@ -0,0 +1,85 @@
+"""Tile planning, tile stats merging to whole-raster stats, and a tiled multi-process assessment matching whole-raster
+classification and vectorization exactly."""
+import asyncio
+import numpy as np
+from scipy import ndimage
+
+from modules.satellite_pipeline import raster, tiling, vectorize
+
+BBOX = [-120.5, 38.5, -120.48, 38.515]
+
+def test_plan_tiles_cover_grid_once():
+    grid = tiling.plan(BBOX, 10)
+    covered = np.zeros((grid["height"], grid["width"]), dtype=int)
+    for tile in grid["tiles"]:
+        x0, y0, x1, y1 = tile["core"]
+        covered[y0:y1, x0:x1] += 1
+        wx0, wy0, wx1, wy1 = tile["window"]
+        assert wx0 == max(x0 - tiling.TILE_OVERLAP, 0) and wy1 == min(y1 + tiling.TILE_OVERLAP, grid["height"])
+    assert (covered == 1).all()
+    assert grid["width"] > 100 and grid["height"] > 100
+
+def test_affordable_plan_coarsens_to_fit():
+    fine = tiling.plan(BBOX, tiling.RESOLUTION_M)
+    coarse = tiling.affordable_plan(BBOX, fine["units"] / 2)
+    assert coarse["resolution_m"] > fine["resolution_m"] and coarse["units"] <= fine["units"] / 2
+    assert tiling.affordable_plan(BBOX, 0) is None
+
+def test_tile_stats_merge_to_whole_raster():
+    rng = np.random.default_rng(5)
+    delta = rng.normal(0.3, 0.3, (60, 80)).astype(np.float32)
+    valid = rng.random((60, 80)) > 0.1
+    classes = raster.classify(delta, valid, "nbr")
+    whole = raster.compute_stats(delta, valid, classes, BBOX, "nbr")
+
+    row_area = raster.pixel_row_areas_km2(BBOX, 60, 80)
+    parts = [raster.partial_stats(delta[y:y + 25, x:x + 30], valid[y:y + 25, x:x + 30],
+                                  classes[y:y + 25, x:x + 30], row_area[y:y + 25])
+             for y in range(0, 60, 25) for x in range(0, 80, 30)]
+    assert raster.merge_stats(parts, "nbr") == whole
+    assert whole["pixels"] == 4800 and whole["mean_dndwi"] is None
+    assert abs(whole["mean_dnbr"] - round(float(delta[valid].mean()), 3)) <= 0.001
+
+def test_stats_without_valid_pixels():
+    delta = np.zeros((4, 4), dtype=np.float32)
+    valid = np.zeros((4, 4), dtype=bool)
+    stats = raster.compute_stats(delta, valid, raster.classify(delta, valid, "ndwi"), BBOX, "ndwi")
+    assert stats["assessed_km2"] == 0 and stats["mean_dndwi"] is None and stats["valid_pixel_pct"] == 0.0
+
+def _aoi(grid: dict) -> tuple[np.ndarray, np.ndarray]:
+    """Pre/post [index, valid] rasters whose change has burn-scar-like structure."""
+    h, w = grid["height"], grid["width"]
+    rng = np.random.default_rng(2)
+    delta = ndimage.gaussian_filter(rng.standard_normal((h, w)), 3).astype(np.float32)
+    delta = (delta - delta.min()) / np.ptp(delta)
+    pre = np.empty((h, w, 2), dtype=np.float32)
+    pre[..., 0], pre[..., 1] = 0.9, 1
+    post = pre.copy()
+    post[..., 0] -= delta
+    post[20:30, 40:55, 1] = 0  # cloud
+    return pre, post
+
+def test_tiled_assessment_matches_whole_raster(monkeypatch, encode_tiff):
+    monkeypatch.setattr(tiling, "TILE_SIZE", 64)
+    monkeypatch.setattr(tiling, "TILE_OVERLAP", 24)
+    monkeypatch.setattr(tiling, "PIPELINE_PROCESSES", 1)
+    grid = tiling.plan(BBOX, 10)
+    assert len(grid["tiles"]) >= 4
+    pre, post = _aoi(grid)
+    west, south, east, north = grid["bbox"]
+    dx, dy = (east - west) / grid["width"], (north - south) / grid["height"]
+
+    async def fetch(bbox, width, height, phase):
+        x0, y0 = round((bbox[0] - west) / dx), round((north - bbox[3]) / dy)
+        return encode_tiff((post if phase == "post" else pre)[y0:y0 + height, x0:x0 + width])
+
+    try:
+        collection, stats = asyncio.run(tiling.assess_tiled(grid, fetch, "nbr"))
+    finally:
+        tiling.shutdown_process_pool()
+
+    delta, valid = raster.change_index(pre, post, "nbr")
+    classes = raster.classify(delta, valid, "nbr")
+    assert collection == vectorize.vectorize(classes, grid["bbox"], delta, "nbr")
+    assert stats == raster.compute_stats(delta, valid, classes, grid["bbox"], "nbr")
+    assert collection["features"] and stats["area_km2"] > 0
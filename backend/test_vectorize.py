@@ -0,0 +1,127 @@
+"""Raster-to-polygon vectorizer: valid polygons, no overlaps, exact areas
+without simplification, and the vertex cap."""
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from modules.satellite_pipeline import vectorize
+
+SIZE = 64
+
+def _classes(seed: int, sigma: float = 2.0, size: int = SIZE) -> np.ndarray:
+    """Smooth random field cut into classes 0 and 2-5, with regions meeting diagonally."""
+    rng = np.random.default_rng(seed)
+    field = ndimage.gaussian_filter(rng.standard_normal((size, size)), sigma)
+    levels = np.quantile(field, [0.3, 0.45, 0.6, 0.75])
+    return np.array([0, 2, 3, 4, 5], dtype=np.uint8)[np.digitize(field, levels)]
+
+def _polygons(classes: np.ndarray, **kwargs) -> list[list[np.ndarray]]:
+    """Rings of each polygon in pixel units (x right, y up), outer ring first."""
+    h, w = classes.shape
+    collection = vectorize.vectorize(classes, [0, 0, w, h], **kwargs)
+    return [[np.array(ring, dtype=float) for ring in f["geometry"]["coordinates"]] for f in collection["features"]]
+
+def _area(ring: np.ndarray) -> float:
+    x, y = ring[:, 0], ring[:, 1]
+    return float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]) / 2)
+
+def _inside(ring: np.ndarray, px: np.ndarray, py: np.ndarray) -> np.ndarray:
+    """Even-odd test of points against a closed ring."""
+    inside = np.zeros(len(px), dtype=bool)
+    for (ax, ay), (bx, by) in zip(ring[:-1], ring[1:]):
+        spans = (ay > py) != (by > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = ax + (py - ay) * (bx - ax) / (by - ay)
+        inside ^= spans & (px < x)
+    return inside
+
+def _bad_pairs(segments: np.ndarray, polygon: np.ndarray) -> int:
+    """Segment pairs meeting anywhere but a shared end vertex. Identical
+    segments are allowed between neighbouring polygons only."""
+    ax, ay, bx, by = (segments[:, k][:, None] for k in range(4))
+    cx, cy, dx, dy = (segments[:, k][None, :] for k in range(4))
+
+    def orient(px, py, qx, qy, rx, ry):
+        return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+    def touches(px, py, qx, qy, rx, ry, side):
+        return ((side == 0) & (np.minimum(px, qx) <= rx) & (rx <= np.maximum(px, qx))
+                & (np.minimum(py, qy) <= ry) & (ry <= np.maximum(py, qy))
+                & ~((rx == px) & (ry == py)) & ~((rx == qx) & (ry == qy)))
+
+    d1, d2 = orient(ax, ay, bx, by, cx, cy), orient(ax, ay, bx, by, dx, dy)
+    d3, d4 = orient(cx, cy, dx, dy, ax, ay), orient(cx, cy, dx, dy, bx, by)
+    same = (((ax == cx) & (ay == cy) & (bx == dx) & (by == dy))
+            | ((ax == dx) & (ay == dy) & (bx == cx) & (by == cy)))
+    hit = (((d1 * d2 < 0) & (d3 * d4 < 0))
+           | touches(ax, ay, bx, by, cx, cy, d1) | touches(ax, ay, bx, by, dx, dy, d2)
+           | touches(cx, cy, dx, dy, ax, ay, d3) | touches(cx, cy, dx, dy, bx, by, d4)
+           | (same & (polygon[:, None] == polygon[None, :])))
+    return int(np.count_nonzero(np.triu(hit, 1)))
+
+def _check_valid(polygons: list[list[np.ndarray]], shape: tuple):
+    segments, owner = [], []
+    for p, rings in enumerate(polygons):
+        outer, holes = rings[0], rings[1:]
+        assert _area(outer) > 0, "outer ring not counter-clockwise"
+        for ring in rings:
+            assert len(ring) >= 4 and (ring[0] == ring[-1]).all(), "ring not closed"
+            assert len({tuple(v) for v in ring[:-1]}) == len(ring) - 1, "ring touches itself"
+            segments.append(np.hstack((ring[:-1], ring[1:])))
+            owner += [p] * (len(ring) - 1)
+        for hole in holes:
+            assert _area(hole) < 0, "hole not clockwise"
+            free = ~(hole[:-1, None, :] == outer[None, :-1, :]).all(axis=2).any(axis=1)
+            assert _inside(outer, *hole[:-1][free].T).all(), "hole outside its shell"
+    assert _bad_pairs(np.vstack(segments), np.array(owner)) == 0, "segments cross or overlap"
+
+    # No pixel is covered by two polygons
+    h, w = shape
+    ys, xs = np.mgrid[0:h, 0:w]
+    px, py = xs.ravel() + 0.5, h - ys.ravel() - 0.5
+    cover = np.zeros(len(px), dtype=int)
+    for rings in polygons:
+        inside = _inside(rings[0], px, py)
+        for hole in rings[1:]:
+            inside &= ~_inside(hole, px, py)
+        cover += inside
+    assert cover.max() <= 1, "polygons overlap"
+    return cover.reshape(shape)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_exact_without_simplification(seed):
+    classes = _classes(seed, sigma=1.5)
+    polygons = _polygons(classes, tolerance_px=0.0, min_pixels=1)
+    cover = _check_valid(polygons, classes.shape)
+    emitted = vectorize.emitted(classes) > 0
+    assert (cover.astype(bool) == emitted).all()
+    total = sum(_area(rings[0]) + sum(_area(h) for h in rings[1:]) for rings in polygons)
+    assert total == np.count_nonzero(emitted)
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("tolerance", [1.0, 3.0, 8.0])
+def test_valid_when_simplified(seed, tolerance):
+    classes = _classes(seed)
+    _check_valid(_polygons(classes, tolerance_px=tolerance, min_pixels=4), classes.shape)
+
+def test_pinch_split_into_hole():
+    # Class 3 encloses an unburned pixel whose corner meets the outside,
+    # where the class 3 pixels themselves only touch diagonally
+    classes = np.zeros((6, 6), dtype=np.uint8)
+    classes[1:4, 1:4] = 3
+    classes[3, 3] = 0
+    classes[3:5, 4] = classes[4, 2:5] = 3
+    classes[2, 4] = 0
+    polygons = _polygons(classes, tolerance_px=0.0, min_pixels=1)
+    _check_valid(polygons, classes.shape)
+    assert len(polygons) == 1 and len(polygons[0]) == 2
+    outer, hole = polygons[0]
+    shared = {tuple(v) for v in outer[:-1]} & {tuple(v) for v in hole[:-1]}
+    assert len(shared) == 1
+
+@pytest.mark.parametrize("cap", [400, 1500, 5000])
+def test_vertex_cap(cap):
+    classes = _classes(7, sigma=1.5, size=96)
+    polygons = _polygons(classes, tolerance_px=0.5, min_pixels=1, max_vertices=cap)
+    assert sum(len(ring) for rings in polygons for ring in rings) <= cap
+    _check_valid(polygons, classes.shape)
@@ -8,10 +8,12 @@ export const useStore = create((set) => ({
 
     // Data caches
     events: MOCK_EVENTS,          // ← pre-seeded with realistic past events
+    eventsVersion: null,          // version of the last live snapshot/delta applied
     alerts: [],
     activeEventDetails: null,
     analysisData: null,
     wsConnected: false,
+    ws: null,
 
     // UI State
     timelineBaselinePassId: null,
@@ -24,11 +26,23 @@ export const useStore = create((set) => ({
     setActiveEventId: (id) => {
         // Resolve event details from the already-loaded events list
         const eventDetails = MOCK_EVENTS.find(e => e.id === id) || null;
+        const previousId = useStore.getState().activeEventId;
         set({ activeEventId: id, analysisData: null, activeEventDetails: eventDetails });
+        // Follow building damage for the selected event over the socket instead of polling
+        if (previousId && previousId !== id) {
+            useStore.getState().sendWs({ action: 'unsubscribe', topics: [`event:${previousId}:buildings`] });
+        }
         if (id) {
+            useStore.getState().sendWs({ action: 'subscribe', topics: [`event:${id}:buildings`] });
             useStore.getState().fetchIntelligenceData(id);
         }
     },
+    sendWs: (message) => {
+        const ws = useStore.getState().ws;
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify(message));
+        }
+    },
     setAnalyzing: (status) => set({ isAnalyzing: status }),
     setEvents: (events) => set({ events }),
     setActiveEventDetails: (details) => set({ activeEventDetails: details }),
@@ -41,11 +55,17 @@ export const useStore = create((set) => ({
     // WebSocket Client — merges live events ON TOP of mock seed
     connectWebSocket: () => {
         const wsUrl = import.meta.env.VITE_WS_URL || 'ws://localhost:8000/api/ws';
-        const ws = new WebSocket(wsUrl);
+        // Resume from the last version we applied so the server only sends what changed
+        const { eventsVersion } = useStore.getState();
+        const ws = new WebSocket(eventsVersion != null ? `${wsUrl}?since=${eventsVersion}` : wsUrl);
 
         ws.onopen = () => {
             console.log("WebSocket Connected");
-            set({ wsConnected: true });
+            set({ wsConnected: true, ws });
+            const activeEventId = useStore.getState().activeEventId;
+            if (activeEventId) {
+                useStore.getState().sendWs({ action: 'subscribe', topics: [`event:${activeEventId}:buildings`] });
+            }
         };
 
         ws.onmessage = (event) => {
@@ -56,9 +76,26 @@ export const useStore = create((set) => ({
                     // Merge: live events first, then mock events not already in live feed
                     const liveIds = new Set(liveEvents.map(e => e.id));
                     const merged = [...liveEvents, ...MOCK_EVENTS.filter(e => !liveIds.has(e.id))];
-                    set({ events: merged });
-                } else if (payload.type === 'alerts_update') {
+                    set({ events: merged, eventsVersion: payload.data.version ?? null });
+                } else if (payload.type === 'events_delta') {
+                    // Apply added/updated/removed features on top of the live events we hold
+                    const { added = [], updated = [], order = [], version } = payload.data;
+                    const byId = new Map(useStore.getState().events.map(e => [e.id, e]));
+                    [...added, ...updated].forEach(f => byId.set(f.id, f));
+                    const liveEvents = order.map(id => byId.get(id)).filter(Boolean);
+                    const liveIds = new Set(order);
+                    const merged = [...liveEvents, ...MOCK_EVENTS.filter(e => !liveIds.has(e.id))];
+                    set({ events: merged, eventsVersion: version });
+                } else if (payload.type === 'alerts_update' && payload.topic === 'alerts') {
                     set({ alerts: payload.data });
+                } else if (payload.type === 'buildings_update') {
+                    const { activeEventId, analysisData } = useStore.getState();
+                    if (analysisData && payload.topic === `event:${activeEventId}:buildings`) {
+                        set({ analysisData: { ...analysisData, buildings_geojson: payload.data } });
+                    }
+                } else if (payload.type === 'resync') {
+                    // Server dropped messages we were too slow to receive — reload every topic we follow
+                    useStore.getState().resync();
                 }
             } catch (err) {
                 console.error("Failed to parse WS message", err);
@@ -67,7 +104,7 @@ export const useStore = create((set) => ({
 
         ws.onclose = () => {
             console.log("WebSocket Disconnected. Reconnecting in 5s...");
-            set({ wsConnected: false });
+            set({ wsConnected: false, ws: null });
             setTimeout(() => {
                 useStore.getState().connectWebSocket();
             }, 5000);
@@ -79,6 +116,56 @@ export const useStore = create((set) => ({
         };
     },
 
+    resync: () => {
+        const { resyncEvents, resyncAlerts, resyncBuildings } = useStore.getState();
+        return Promise.all([resyncEvents(), resyncAlerts(), resyncBuildings()]);
+    },
+
+    resyncEvents: async () => {
+        try {
+            const url = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+            const res = await fetch(`${url}/events`);
+            if (!res.ok) return;
+            const data = await res.json();
+            const liveIds = new Set(data.features.map(e => e.id));
+            set({
+                events: [...data.features, ...MOCK_EVENTS.filter(e => !liveIds.has(e.id))],
+                eventsVersion: data.version ?? null,
+            });
+        } catch (err) {
+            console.error("Failed to resync events", err);
+        }
+    },
+
+    resyncAlerts: async () => {
+        try {
+            const url = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+            const res = await fetch(`${url}/alerts`);
+            if (!res.ok) return;
+            set({ alerts: await res.json() });
+        } catch (err) {
+            console.error("Failed to resync alerts", err);
+        }
+    },
+
+    resyncBuildings: async () => {
+        // Only the active event's buildings topic is subscribed; nothing to do without loaded analysis
+        const eventId = useStore.getState().activeEventId;
+        if (!eventId || !useStore.getState().analysisData) return;
+        try {
+            const url = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+            const res = await fetch(`${url}/intelligence/buildings/${eventId}`);
+            if (!res.ok) return;
+            const buildings = await res.json();
+            const { activeEventId, analysisData } = useStore.getState();
+            if (activeEventId === eventId && analysisData) {
+                set({ analysisData: { ...analysisData, buildings_geojson: buildings } });
+            }
+        } catch (err) {
+            console.error("Failed to resync buildings", err);
+        }
+    },
+
     // REST API Actions — falls back to mock analysis when API is unavailable
     fetchIntelligenceData: async (eventId) => {
         // Always show mock data immediately while (possibly) fetching real data
@@ -97,6 +184,9 @@ export const useStore = create((set) => ({
 
             const latestAnalysis = analyses[0];
 
+            // The initial building list still comes over REST: the server pushes
+            // buildings_update on event:<id>:buildings only when an assessment
+            // finishes, not on subscribe, so the socket only carries later changes.
             const [intelRes, bldRes] = await Promise.all([
                 fetch(`${url}/intelligence/${latestAnalysis.id}`),
                 fetch(`${url}/intelligence/buildings/${eventId}`),